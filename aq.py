@@ -17,7 +17,8 @@ class AQ(object):
         self._n_dir = (sn_ord+2) * sn_ord / 2
         # dictionary for containing angular quandrature directions and weights
         self._aq_data = {'omega':{},'wt':{},'dir_prods':{},'wt_tensor':{},
-                         'bd_angle':{},'bd_vec_n':{},'refl_dir':{},'n_dir':self._n_dir}
+                         'bd_angle':{},'bd_vec_n':{},'refl_dir':{},'rev_dir':{},
+                         'n_dir':self._n_dir}
         # make aq data
         self._quad2d()
         # store the outward normal vectors on boundaries
@@ -26,6 +27,8 @@ class AQ(object):
         'ymin':np.array([0,-1.]),'ymax':np.array([0,1.])}
         # get incident and reflective directions
         self._boundary_info()
+        # get reversed directions used by adjoint calculations
+        self._reverse_dirs()
 
     def _quad2d(self):
         '''@brief Internal function used to calculate aq data
@@ -82,6 +85,16 @@ class AQ(object):
                             self._aq_data['refl_dir'][(bd,i)] = ind
                             break
 
+    def _reverse_dirs(self):
+        '''@brief Internal function used to map every direction to its opposite
+        '''
+        for i in xrange(self._n_dir):
+            for ind,omega in self._aq_data['omega'].items():
+                if np.allclose(-self._aq_data['omega'][i],omega,rtol=1.0e-10,atol=1.0e-10):
+                    self._aq_data['rev_dir'][i] = ind
+                    break
+        assert len(self._aq_data['rev_dir'])==self._n_dir, 'Quadrature must be symmetric'
+
     def get_aq_data(self):
         '''@brief Interface function to get aq_data
 
@@ -89,3 +102,18 @@ class AQ(object):
         @return aq_data dictionary
         '''
         return self._aq_data
+
+# aq data per Sn order shared by all equation instances in the process
+_aq_data = {}
+
+def get_aq_data(sn_ord):
+    '''@brief Function used to get aq data, constructed once per Sn order
+
+    Aq data is read only, so it is shared by all callers, and by forked worker
+    processes if constructed before forking.
+    @param sn_ord Sn angular quadrature order
+    @return aq_data dictionary
+    '''
+    if sn_ord not in _aq_data:
+        _aq_data[sn_ord] = AQ(sn_ord).get_aq_data()
+    return _aq_data[sn_ord]
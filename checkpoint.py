@@ -0,0 +1,136 @@
+import os
+import threading
+import Queue
+import numpy as np
+
+'''
+class used to write snapshots of eigenvalue iterations from a background thread
+'''
+class Checkpoint(object):
+    def __init__(self, filename, every=1):
+        '''@brief Constructor of checkpoint writer
+
+        @param filename Snapshot file. It is overwritten by every snapshot such
+        that it always holds the latest one
+        @param every Number of outer iterations between snapshots
+        '''
+        assert every>0, 'Checkpoint cadence has to be positive'
+        self._filename = filename
+        self._every = every
+        self._queue = Queue.Queue()
+        # latest write error, raised from flush
+        self._error = None
+        # writer thread is started by the first snapshot after a stop
+        self._writer = None
+
+    def due(self, iteration):
+        '''@brief Function used to check if a snapshot is due at outer iteration
+
+        @param iteration Outer iteration count
+        '''
+        return iteration%self._every==0
+
+    def save(self, state):
+        '''@brief Function used to queue a snapshot without waiting for disk
+
+        @param state Dictionary of arrays and scalars. Arrays are copied so that
+        iterations can go on modifying them
+        '''
+        if self._writer is None or not self._writer.is_alive():
+            self._writer = threading.Thread(target=self._write_loop)
+            self._writer.daemon = True
+            self._writer.start()
+        self._queue.put({k:np.array(v) for k,v in state.items()})
+
+    def flush(self):
+        '''@brief Function used to wait until all queued snapshots are written
+
+        Errors of the writer thread since the last flush are raised here.
+        '''
+        self._queue.join()
+        error,self._error = self._error,None
+        if error is not None:
+            raise error
+
+    def stop(self):
+        '''@brief Function used to write queued snapshots and stop the writer
+        thread
+        '''
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        self.flush()
+
+    def _write_loop(self):
+        '''@brief Internal function run by the writer thread
+
+        Only the latest of queued snapshots is written. Snapshots are written to
+        a temporary file first and renamed, so that the snapshot file is never
+        partially written. Write errors are kept for flush and do not stop the
+        thread. A None item stops it.
+        '''
+        stop = False
+        while not stop:
+            items = [self._queue.get()]
+            while not self._queue.empty():
+                items.append(self._queue.get())
+            stop = None in items
+            states = [item for item in items if item is not None]
+            try:
+                if states:
+                    tmp = self._filename + '.tmp'
+                    with open(tmp, 'wb') as f:
+                        np.savez_compressed(f, **states[-1])
+                    os.rename(tmp, self._filename)
+            except Exception as e:
+                self._error = e
+            finally:
+                for i in xrange(len(items)):
+                    self._queue.task_done()
+
+def load(filename):
+    '''@brief Function used to load a snapshot
+
+    @param filename Snapshot file
+    @return Dictionary of snapshot data
+    '''
+    with np.load(filename) as data:
+        return unpack({k:data[k] for k in data.files})
+
+def unpack(data):
+    '''@brief Function used to convert stored snapshot arrays back to the types
+    returned by snapshot
+
+    @param data Dictionary of arrays, e.g. loaded from an npz file
+    @return Dictionary in snapshot format
+    '''
+    state = {}
+    for k,v in data.items():
+        if k=='keff':
+            state[k] = float(v)
+        elif k=='iteration':
+            state[k] = int(v)
+        elif k=='currents':
+            state[k] = [tuple(cur) for cur in v]
+        else:
+            state[k] = list(v)
+    return state
+
+def snapshot(equ_cls, iteration=0):
+    '''@brief Function used to collect the solution state of an equation class
+
+    @param equ_cls Equation class instance
+    @param iteration Outer iteration count
+    @return Dictionary with keff, iteration count and scalar fluxes. For SAAF,
+    angular fluxes per group and currents are included so that a restart can
+    change the Sn order
+    '''
+    n_grp = equ_cls.n_grp()
+    state = {'keff':float(equ_cls.get_keff()), 'iteration':iteration,
+             'sflxes':[equ_cls.get_sflxes(g) for g in xrange(n_grp)]}
+    if equ_cls.name()=='saaf':
+        for g in xrange(n_grp):
+            aflxes = equ_cls.get_group_state(g)['aflxes']
+            state['aflxes_%d' % g] = [aflxes[d] for d in xrange(len(aflxes))]
+        state['currents'] = [equ_cls.calculate_currents(g) for g in xrange(n_grp)]
+    return state
@@ -0,0 +1,227 @@
+import numpy as np
+from scipy import sparse as sps
+from scipy.sparse import linalg as sla
+from numpy.linalg import norm
+
+'''
+class used to perform coarse mesh finite difference acceleration on the coarse
+grid defined by the material layout
+'''
+class CMFD(object):
+    def __init__(self, mat_cls, mesh_cls, map_cls):
+        '''@brief Constructor of CMFD class
+
+        @param mat_cls Material library
+        @param mesh_cls Fine mesh
+        @param map_cls Material map. The layout defines the coarse grid, e.g. one
+        coarse cell per pin
+        '''
+        self._name = 'cmfd'
+        # coarse grid: layout is square and mesh cells is a multiple of its size
+        self._n_crs = len(map_cls.layout)
+        self._n_fine = mesh_cls.x_cell()
+        assert self._n_fine%self._n_crs==0, 'Mesh must be a refinement of layout'
+        self._ratio = self._n_fine / self._n_crs
+        self._n_crs_cell = self._n_crs**2
+        self._h_crs = mesh_cls.cell_length()*self._ratio
+        self._x_node = mesh_cls.x_node()
+        self._n_dof = mesh_cls.n_node()
+        # material data, not per steradian
+        self._n_grp = mat_cls.get('n_grps')
+        mids = mat_cls.ids()
+        get = lambda prop: np.array([mat_cls.get(prop)[mid] for mid in mids])
+        self._sigts = get('sig_t')
+        self._dcoefs = get('diff_coef')
+        self._sigses = get('sig_s')
+        fiss_xsecs = mat_cls.get('chi_nu_sig_f')
+        zero = np.zeros((self._n_grp,self._n_grp))
+        self._fiss_xsecs = np.array([fiss_xsecs.get(mid,zero) for mid in mids])
+        # fine cell data: vertex indices, material and coarse cell indices
+        cells = mesh_cls.cells()
+        self._cell_idx = np.array([cell.global_idx() for cell in cells])
+        self._cell_mid_idx = np.array([mids.index(cell.get('id')) for cell in cells])
+        self._cell_crs = np.array([(i/self._ratio)*self._n_crs + j/self._ratio
+                                   for i,j in (cell.index() for cell in cells)])
+        # coarse cells sharing each node, used in prolongation
+        self._node_crs = sps.csr_matrix(
+        (np.ones(self._cell_idx.size),
+         (self._cell_idx.ravel(), np.repeat(self._cell_crs,4))),
+        shape=(self._n_dof,self._n_crs_cell))
+        self._node_crs.data[:] = 1.0
+        n_share = np.asarray(self._node_crs.sum(axis=1)).ravel()
+        self._node_crs = sps.diags(1.0/n_share).dot(self._node_crs)
+        # eigenvalue iteration tolerances on the coarse grid
+        self._tol = 1.0e-8
+        self._max_iter = 500
+
+    def name(self):
+        return self._name
+
+    def accelerate(self, ho_cls, keff, sflxes_prev, keff_prev):
+        '''@brief Function used to accelerate HO iteration with a coarse mesh
+        eigenvalue solve
+
+        Fluxes and cross sections are homogenized onto the coarse grid, and
+        coarse currents from HO angular fluxes define the nonlinear coupling
+        coefficients. As continuous finite elements do not conserve particles
+        cell by cell, the coarse balance defect of the latest HO solve is added
+        to removal, such that converged HO solutions solve the coarse problem.
+        HO fluxes are rescaled by the ratio of new to old coarse fluxes.
+        @param ho_cls HO class instance providing fluxes and currents
+        @param keff Current keff estimate
+        @param sflxes_prev Scalar fluxes generating the fission source of the
+        latest HO solve
+        @param keff_prev keff scaling that fission source
+        @return Coarse mesh keff
+        '''
+        sflxes = np.array([ho_cls.get_sflxes(g) for g in xrange(self._n_grp)])
+        # flux averaged over fine cells: (n_grp,n_cell)
+        cell_sflxes = sflxes[:,self._cell_idx].mean(axis=2)
+        crs_sflxes = self._restrict(cell_sflxes)
+        xs = self._homogenize(cell_sflxes, crs_sflxes)
+        currents = [ho_cls.calculate_currents(g) for g in xrange(self._n_grp)]
+        loss,fiss = self._assemble(xs, crs_sflxes, currents)
+        defect = loss.dot(crs_sflxes.ravel()) - self._fission_source(sflxes_prev)/keff_prev
+        loss = sps.csc_matrix(loss - sps.diags(defect/crs_sflxes.ravel()))
+        crs_sflxes_new,keff = self._power_iterations(loss, fiss, crs_sflxes, keff)
+        # preserve the total flux, then prolong ratios to HO vertices
+        crs_sflxes_new *= crs_sflxes.sum()/crs_sflxes_new.sum()
+        for g in xrange(self._n_grp):
+            ratio = crs_sflxes_new[g]/crs_sflxes[g]
+            ho_cls.scale_fluxes(g, self._node_crs.dot(ratio))
+        return keff
+
+    def _fission_source(self, sflxes):
+        '''@brief Internal function used to integrate the fission source of
+        scalar fluxes over coarse cells
+
+        @param sflxes Dictionary of scalar fluxes of all groups
+        @return Coarse fission source stacked group by group
+        '''
+        cell_sflxes = np.array([sflxes[g] for g in xrange(self._n_grp)]
+                              )[:,self._cell_idx].mean(axis=2)
+        cell_src = np.einsum('cgh,hc->gc', self._fiss_xsecs[self._cell_mid_idx], cell_sflxes)
+        return self._restrict(cell_src).ravel()*self._h_crs**2
+
+    def _restrict(self, cell_vals):
+        '''@brief Internal function used to average fine cell values over coarse
+        cells
+
+        @param cell_vals Array of shape (n_grp,n_cell)
+        @return Array of shape (n_grp,n_crs_cell)
+        '''
+        return np.array([np.bincount(self._cell_crs, weights=vals,
+                                     minlength=self._n_crs_cell)
+                         for vals in cell_vals])/self._ratio**2
+
+    def _homogenize(self, cell_sflxes, crs_sflxes):
+        '''@brief Internal function used to generate flux-weighted coarse cross
+        sections
+
+        @return Dictionary of coarse sig_t, diff_coef with shape (n_grp,n_crs_cell)
+        and sig_s, chi_nu_sig_f with shape (n_crs_cell,n_grp,n_grp)
+        '''
+        mid_idx = self._cell_mid_idx
+        weighted = lambda xs: self._restrict(xs*cell_sflxes)/crs_sflxes
+        xs = {'sig_t':weighted(self._sigts[mid_idx].T),
+              'diff_coef':weighted(self._dcoefs[mid_idx].T)}
+        for key,mats in [('sig_s',self._sigses),('chi_nu_sig_f',self._fiss_xsecs)]:
+            # (g,gi) entry is weighted by flux of gi: (n_cell,n_grp,n_grp)
+            cell_mats = mats[mid_idx]*cell_sflxes.T[:,np.newaxis,:]
+            xs[key] = np.array([[self._restrict(cell_mats[:,g,:].T)[gi]
+                                 for gi in xrange(self._n_grp)]
+                                for g in xrange(self._n_grp)]).transpose(2,0,1)
+            xs[key] /= crs_sflxes.T[:,np.newaxis,:]
+        return xs
+
+    def _face_currents(self, currents):
+        '''@brief Internal function used to average HO currents over coarse faces
+
+        @param currents List over groups of (jx,jy) vertex current vectors
+        @return Arrays of x-currents on vertical faces with shape
+        (n_grp,n_crs,n_crs+1) and y-currents on horizontal faces with shape
+        (n_grp,n_crs+1,n_crs)
+        '''
+        n,r = self._n_crs,self._ratio
+        # trapezoidal weights of the fine vertices along one coarse face
+        wts = np.ones(r+1)
+        wts[[0,-1]] = 0.5
+        wts /= r
+        jx_faces = np.zeros((self._n_grp,n,n+1))
+        jy_faces = np.zeros((self._n_grp,n+1,n))
+        for g,(jx,jy) in enumerate(currents):
+            # vertex values on the (row,col) node grid
+            jx = jx.reshape(self._x_node,self._x_node)
+            jy = jy.reshape(self._x_node,self._x_node)
+            for k in xrange(n):
+                seg = slice(k*r,(k+1)*r+1)
+                jx_faces[g,k,:] = np.dot(wts, jx[seg,::r])
+                jy_faces[g,:,k] = np.dot(jy[::r,seg], wts)
+        return jx_faces,jy_faces
+
+    def _assemble(self, xs, crs_sflxes, currents):
+        '''@brief Internal function used to assemble coarse loss and fission
+        matrices with nonlinear current coupling coefficients
+
+        @return Tuple of csc loss matrix and csr fission matrix, acting on coarse
+        fluxes stacked group by group
+        '''
+        n,n_crs_cell,h = self._n_crs,self._n_crs_cell,self._h_crs
+        jx_faces,jy_faces = self._face_currents(currents)
+        rows,cols,vals = [],[],[]
+        def add(i,j,v):
+            rows.append(i)
+            cols.append(j)
+            vals.append(v)
+        for g in xrange(self._n_grp):
+            dcoef,sflx,ofs = xs['diff_coef'][g],crs_sflxes[g],g*n_crs_cell
+            for k in xrange(n_crs_cell):
+                i,j = k/n,k%n
+                # removal
+                add(ofs+k, ofs+k, (xs['sig_t'][g,k]-xs['sig_s'][k,g,g])*h*h)
+                # faces: (neighbor or None, outward current)
+                faces = [(k-1 if j>0 else None, -jx_faces[g,i,j]),
+                         (k+1 if j<n-1 else None, jx_faces[g,i,j+1]),
+                         (k-n if i>0 else None, -jy_faces[g,i,j]),
+                         (k+n if i<n-1 else None, jy_faces[g,i+1,j])]
+                for nb,j_out in faces:
+                    if nb is None:
+                        # boundary: outgoing current proportional to flux
+                        add(ofs+k, ofs+k, j_out/sflx[k]*h)
+                        continue
+                    # J_out = -dtil*(phi_nb-phi_k) + dhat*(phi_nb+phi_k)
+                    dtil = 2.0*dcoef[k]*dcoef[nb]/(h*(dcoef[k]+dcoef[nb]))
+                    dhat = (j_out+dtil*(sflx[nb]-sflx[k]))/(sflx[nb]+sflx[k])
+                    add(ofs+k, ofs+k, (dtil+dhat)*h)
+                    add(ofs+k, ofs+nb, (dhat-dtil)*h)
+                # inscattering
+                for gi in filter(lambda x: x!=g, xrange(self._n_grp)):
+                    if xs['sig_s'][k,g,gi]>1.0e-14:
+                        add(ofs+k, gi*n_crs_cell+k, -xs['sig_s'][k,g,gi]*h*h)
+        n_tot = self._n_grp*n_crs_cell
+        loss = sps.csc_matrix((vals,(rows,cols)), shape=(n_tot,n_tot))
+        # fission production
+        k_idx = np.arange(n_crs_cell)
+        fiss = sps.lil_matrix((n_tot,n_tot))
+        for g in xrange(self._n_grp):
+            for gi in xrange(self._n_grp):
+                fiss[g*n_crs_cell+k_idx, gi*n_crs_cell+k_idx] = xs['chi_nu_sig_f'][:,g,gi]*h*h
+        return loss,sps.csr_matrix(fiss)
+
+    def _power_iterations(self, loss, fiss, crs_sflxes, keff):
+        '''@brief Internal function used to solve the coarse eigenvalue problem
+
+        @return Tuple of coarse fluxes with shape (n_grp,n_crs_cell) and keff
+        '''
+        lu = sla.splu(loss)
+        sflx = crs_sflxes.ravel()
+        fiss_src = fiss.dot(sflx)
+        for i in xrange(self._max_iter):
+            sflx_new = lu.solve(fiss_src/keff)
+            fiss_src_new = fiss.dot(sflx_new)
+            keff_new = keff*fiss_src_new.sum()/fiss_src.sum()
+            e = norm(sflx_new/norm(sflx_new,1)-sflx/norm(sflx,1),1)
+            sflx,fiss_src,keff_prev,keff = sflx_new,fiss_src_new,keff,keff_new
+            if e<self._tol and abs(keff-keff_prev)<self._tol*keff:
+                break
+        return sflx.reshape(self._n_grp,self._n_crs_cell),keff
@@ -1,10 +1,17 @@
 import numpy as np
+from scipy.sparse import linalg as sla
+from numpy.linalg import norm
 from mg_iterations import MG
+from inexact import InexactTol
+from outer_accel import OuterAccel
+from checkpoint import Checkpoint, snapshot
 '''
 class used to perform eigenvalue calculations
 '''
 class Eigen(object):
-    def __init__(self):
+    def __init__(self, prob_dict=None):
+        if prob_dict is None:
+            prob_dict = {}
         # basic data
         self._keff = 1.0
         self._keff_prev = 1.0
@@ -12,26 +19,49 @@ class Eigen(object):
         self._tol = 1e-5
         self._k_tol = 1e-5
         # multigroup class
-        self._mg = MG()
+        self._mg = MG(prob_dict)
+        # inexact iterations: mg tolerance follows eigen iteration residuals
+        self._inexact = prob_dict.get('inexact', False)
+        # wielandt shifted inverse iteration: k_s = keff + delta
+        self._wielandt = prob_dict.get('wielandt', False)
+        self._wielandt_delta = prob_dict.get('wielandt_delta', 0.1)
+        assert self._wielandt_delta>0, 'Wielandt shift has to be positive'
+        # eigen solver: power iterations or implicitly restarted arnoldi
+        self._eigen_solver = prob_dict.get('eigen_solver', 'power')
+        assert self._eigen_solver in ('power','arnoldi'), 'Unknown eigen_solver'
+        self._n_modes = prob_dict.get('n_modes', 1)
+        self._modes = []
+        # outer iterations, or operator applications in arnoldi, of all solves
+        self._n_iter = 0
+        # extrapolation of the fission source iterate
+        self._accel = None
+        if prob_dict.get('outer_accel'):
+            self._accel = OuterAccel(prob_dict)
+        # snapshots of eigen iterations written in background
+        self._ckpt = None
+        if prob_dict.get('checkpoint_file'):
+            self._ckpt = Checkpoint(prob_dict['checkpoint_file'],
+                                    every=prob_dict.get('checkpoint_every', 1))
 
-    def do_iterations(self, ho_cls, nda_cls=None):
+    def do_iterations(self, ho_cls, nda_cls=None, cmfd_cls=None):
         '''@brief Function to be called outside for eigenvalue problems
 
         @param ho_cls The HO class instance
         @param nda_cls NDA instance
+        @param cmfd_cls CMFD instance used to accelerate HO eigen iterations
         '''
         n_dof,n_grp = ho_cls.n_dof(),ho_cls.n_grp()
         if not nda_cls:
             # assemble bilinear forms
             ho_cls.assemble_bilinear_forms()
             # NDA is not used in this calse
-            self.eigen_iterations(ho_cls)
+            self.eigen_iterations(ho_cls, cmfd_cls=cmfd_cls)
         else:
             assert nda_cls is not None, 'NDA class has to be provided for HOLO calculations'
             # initialize scalar fluxes from previous finished NDA solve
             sflxes_eig_prev_nda = {g:np.ones(n_dof) for g in xrange(n_grp)}
             # we assemble and solve with diffusion first (namely, no correction)
-            nda_cls.assemble_bilinear_forms(nda_cls=None, correction=False)
+            nda_cls.assemble_bilinear_forms(correction=False)
             self.eigen_iterations(nda_cls)
             e_k,e_p = 1.,1.
             # get k
@@ -56,25 +86,164 @@ class Eigen(object):
                 e_k = abs((keff_nda-keff_prev_nda)/keff_nda)
                 e_p = max(nda_cls.calculate_sflx_diff(sflxes_eig_prev_nda,g)
                           for g in xrange(n_grp))
+        if self._ckpt:
+            # all snapshots of the solve are on disk
+            self._ckpt.stop()
 
-    def eigen_iterations(self, equ_cls):
+    def warm_start(self, ho_cls, nda_cls):
+        '''@brief Function used to initialize HO solution with a multigroup
+        diffusion eigenvalue solve
+
+        @param ho_cls The HO class instance
+        @param nda_cls NDA instance used without HO correction
+        '''
+        nda_cls.assemble_bilinear_forms(correction=False)
+        self.eigen_iterations(nda_cls)
+        ho_cls.set_initial_guess({g:nda_cls.get_sflxes(g) for g in xrange(nda_cls.n_grp())},
+                                 nda_cls.get_keff())
+
+    def eigen_iterations(self, equ_cls, cmfd_cls=None):
         '''@brief Function to be called in do_iterations
+
+        @param equ_cls Equation class instance
+        @param cmfd_cls CMFD instance. If given, fluxes and keff are updated with
+        a coarse mesh solve after each transport outer iteration
         '''
+        assert not (self._wielandt and equ_cls.name()!='nda'), \
+            'Wielandt iterations are only available for NDA'
+        if self._eigen_solver=='arnoldi':
+            # cmfd and outer extrapolations only apply to power iterations
+            self.arnoldi_iterations(equ_cls, self._n_modes)
+            if self._ckpt:
+                self._ckpt.save(snapshot(equ_cls, 0))
+                self._ckpt.flush()
+            return
         n_dof,n_grp = equ_cls.n_dof(),equ_cls.n_grp()
         # initialize scalar fluxes from previous eigen iteration
         sflxes_eig_prev = {g:np.ones(n_dof) for g in xrange(n_grp)}
-        ep,ek,keff, = 1.0,1.0,1.0
-        while ep>self._tol and ek>self._k_tol:
+        ep,ek,keff, = 1.0,1.0,equ_cls.get_keff()
+        it = 0
+        if self._inexact:
+            # iterations are not finished until mg is solved with its own tol
+            mg_tols = InexactTol(tol_min=self._mg.get_tol())
+        if self._accel:
+            self._accel.reset()
+        while ep>self._tol or ek>self._k_tol or \
+              (self._inexact and not mg_tols.at_floor()):
+            if self._inexact:
+                # residuals are the changes from the latest transport application
+                self._mg.set_tol(mg_tols.update(max(ep,ek)))
             # update scalar flux from previous iteration
-            for g in xrange(self._n_grp):
+            for g in xrange(n_grp):
                 equ_cls.update_sflxes(sflxes_eig_prev,g)
-            # assemble for the fission source
-            equ_cls.assemble_fixed_linear_forms(sflxes_prev=sflxes_eig_prev)
-            # perform multigroup iteration to convergence
-            self.mg.mg_iterations(equ_cls=equ_cls)
-            # update keff
-            keff_prev,keff = keff,equ_cls.calculate_keff()
+            if self._wielandt:
+                # shifted inverse iteration replaces the multigroup solve and
+                # the shift follows the latest keff estimate
+                keff_prev,keff = keff,equ_cls.solve_wielandt(
+                equ_cls.get_keff()+self._wielandt_delta)
+            else:
+                # assemble for the fission source
+                equ_cls.assemble_fixed_linear_forms(sflxes_prev=sflxes_eig_prev)
+                # perform multigroup iteration to convergence
+                self._mg.mg_iterations(equ_cls=equ_cls)
+                if self._accel:
+                    # extrapolate fluxes before they define the new fission source
+                    self._accel.accelerate(equ_cls, sflxes_eig_prev)
+                # update keff
+                keff_prev,keff = keff,equ_cls.calculate_keff()
+                if cmfd_cls:
+                    # rescale fluxes and update keff with coarse mesh solve
+                    keff = cmfd_cls.accelerate(equ_cls, keff, sflxes_eig_prev, keff_prev)
+                    equ_cls.set_keff(keff)
             # calculate keff error
             ek = abs((keff-keff_prev)/keff)
             # calculate error of scalar flux in eigen iterations
-            ep = max(equ_cls.calculate_sflx_diff(g) for g in xrange(self._n_grp))
+            ep = max(equ_cls.calculate_sflx_diff(sflxes_eig_prev,g)
+                     for g in xrange(n_grp))
+            it += 1
+            self._n_iter += 1
+            if self._ckpt and self._ckpt.due(it):
+                self._ckpt.save(snapshot(equ_cls, it))
+        if self._ckpt:
+            # converged solution is always kept
+            self._ckpt.save(snapshot(equ_cls, it))
+            self._ckpt.flush()
+
+    def arnoldi_iterations(self, equ_cls, n_modes=1):
+        '''@brief Function used to solve the eigenvalue problem with implicitly
+        restarted Arnoldi method
+
+        One application of the operator is one fission source generation with
+        unit keff followed by the solve of all groups, mapping stacked scalar
+        fluxes of all groups to new ones. Its dominant eigenvalues are keffs of
+        the fundamental and higher modes. The operator has to be linear, so NDA
+        applies L^-1*F with a direct solve. Other equations iterate every group
+        coupled by upscattering, which may start above the first thermal group
+        of the materials, and multigroup tolerance is tightened such that the
+        operator is accurate enough for the Krylov method.
+        @param equ_cls Equation class instance
+        @param n_modes Number of modes to be computed
+        @return keff of the fundamental mode
+        '''
+        n_dof,n_grp = equ_cls.n_dof(),equ_cls.n_grp()
+        if equ_cls.name()=='nda':
+            generation = equ_cls.solve_generation
+        else:
+            # first group receiving upscattering
+            coupling = equ_cls.scatter_coupling()
+            g_thr = min([equ_cls.g_thr()] +
+                        [g for g in xrange(n_grp) if np.any(coupling[g,g+1:]>0)])
+            def generation(sflx):
+                sflxes = {g:sflx[g*n_dof:(g+1)*n_dof] for g in xrange(n_grp)}
+                equ_cls.assemble_fixed_linear_forms(sflxes_prev=sflxes, keff=1.0)
+                self._mg.mg_iterations(equ_cls=equ_cls, g_thr=g_thr)
+                return np.concatenate([equ_cls.get_sflxes(g) for g in xrange(n_grp)])
+        def transport(sflx):
+            self._n_iter += 1
+            return generation(sflx)
+        n_tot = n_dof*n_grp
+        op = sla.LinearOperator((n_tot,n_tot), matvec=transport, dtype=float)
+        mg_tol,mg_tol_min = self._mg.get_tol(),self._mg.get_tol_min()
+        self._mg.set_tol_min(min(mg_tol_min, 1.0e-3*self._k_tol))
+        v0 = np.concatenate([equ_cls.get_sflxes(g) for g in xrange(n_grp)])
+        keffs,modes = sla.eigs(op, k=n_modes, which='LM', v0=v0, tol=self._k_tol)
+        # modes sorted by keff in decreasing order
+        order = np.argsort(-np.abs(keffs))
+        keffs,modes = keffs[order].real,modes[:,order].real
+        # fundamental mode has unit flux sum. Higher modes change sign and may
+        # sum to zero, so they have unit norm with the largest entry positive
+        modes[:,0] /= np.sum(modes[:,0])
+        for i in xrange(1,n_modes):
+            modes[:,i] /= norm(modes[:,i])*np.sign(modes[np.argmax(np.abs(modes[:,i])),i])
+        self._modes = [(keffs[i],{g:modes[g*n_dof:(g+1)*n_dof,i] for g in xrange(n_grp)})
+                       for i in xrange(n_modes)]
+        # fundamental mode is the solution of equ_cls
+        if equ_cls.name()=='nda':
+            for g in xrange(n_grp):
+                equ_cls.set_sflxes(g, self._modes[0][1][g])
+        else:
+            # angular fluxes are left from the latest operator application, so
+            # one more generation from the fundamental mode makes them consistent
+            transport(modes[:,0])
+            for g in xrange(n_grp):
+                equ_cls.scale_fluxes(g, 1.0/keffs[0])
+        self._mg.set_tol_min(mg_tol_min)
+        self._mg.set_tol(mg_tol)
+        equ_cls.set_keff(keffs[0])
+        return keffs[0]
+
+    def get_modes(self):
+        '''@brief Function used to retrieve modes from Arnoldi method
+
+        @return List of tuples of keff and dictionary of group scalar fluxes, the
+        fundamental mode first
+        '''
+        return self._modes
+
+    def n_iterations(self):
+        '''@brief Function used to retrieve the number of outer iterations
+
+        @return Number of outer iterations, or operator applications in Arnoldi
+        method, summed over all eigenvalue solves of this instance
+        '''
+        return self._n_iter
@@ -274,7 +274,10 @@ class Elem(object):
                            np.array([self._df2(x,y)[1] for x,y in self._qps]),
                            np.array([self._df3(x,y)[1] for x,y in self._qps])]
 
-        self._dotprod =lambda K, L:reduce(lambda z1, z2: z1+z2, map(lambda x: reduce(lambda x1, x2: x1*x2, x), zip(K, L)))
+        # basis values and gradients at quadrature points: (n_qp,4) matrices
+        self._interp_mat = np.transpose(self._interps)
+        self._dx_interp_mat = np.transpose(self._dx_interp)
+        self._dy_interp_mat = np.transpose(self._dy_interp)
         self._qps_1d = [1.1270166537925830e-01*self._cell_length,
                         0.5*self._cell_length,
                         8.8729833462074170e-01*self._cell_length]
@@ -315,6 +318,21 @@ class Elem(object):
     def bdmt(self):
         return self._bdmt
 
+    def basis_at_qps(self):
+        '''@brief Function used to return basis function values at quadrature points
+
+        @return Matrix of shape (n_qp,4). Row i applied to solutions at vertices
+        gives interpolated solution at quadrature point i
+        '''
+        return self._interp_mat
+
+    def grad_basis_at_qps(self):
+        '''@brief Function used to return basis function gradients at quadrature points
+
+        @return Tuple of x and y derivative matrices, each of shape (n_qp,4)
+        '''
+        return self._dx_interp_mat,self._dy_interp_mat
+
     def get_sol_at_qps(self,sol_at_vertices):
         '''@brief Function used to return interpolated values at 3x3 Gauss quadrature points
 
@@ -322,7 +340,7 @@ class Elem(object):
         left-bottom, right-bottom, left-up, right-up. List and Numpy arrays are both usable
         @return Interpolated solutions at quadrature points defined in self._qps (list of tuples)
         '''
-        interp_vals = self._dotprod(sol_at_vertices, self._interps)
+        interp_vals = np.dot(self._interp_mat, sol_at_vertices)
         return {i:interp_vals[i] for i in xrange(len(self._qps))}
 
     def get_grad_at_qps(self,sol_at_vertices):
@@ -332,10 +350,25 @@ class Elem(object):
         left-bottom, right-bottom, left-up, right-up. List and Numpy arrays are both usable
         @return Interpolated gradients(list of tuples) at quadrature points defined in self._qps (list of tuples)
         '''
-        dxs = self._dotprod(sol_at_vertices, self._dx_interp)
-        dys = self._dotprod(sol_at_vertices, self._dy_interp)
+        dxs = np.dot(self._dx_interp_mat, sol_at_vertices)
+        dys = np.dot(self._dy_interp_mat, sol_at_vertices)
         return {i:np.array([dx,dy]) for i,dx,dy in zip(xrange(len(self._qps)),dxs, dys)}
 
     def get_sol_at_bd_qps(self,sol_at_bd):
         assert len(sol_at_bd)==2, "Per boundary side, there are only two nodal values"
         return [sol_at_bd[0]*self._b0(x)+sol_at_bd[1]*self._b1(x) for x in self._qps_1d]
+
+# elements per cell length shared by all equation instances in the process
+_elems = {}
+
+def get_elem(cell_length):
+    '''@brief Function used to get the element, constructed once per cell length
+
+    Elements are read only, so they are shared by all callers, and by forked
+    worker processes if constructed before forking.
+    @param cell_length Cell length
+    @return Elem instance
+    '''
+    if cell_length not in _elems:
+        _elems[cell_length] = Elem(cell_length)
+    return _elems[cell_length]
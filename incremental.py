@@ -0,0 +1,85 @@
+import numpy as np
+from scipy import sparse as sps
+from scipy import linalg
+
+def diff_materials(mids_old, mids_new):
+    '''@brief Function used to find cells whose material changed
+
+    @param mids_old Material ids per cell before the change
+    @param mids_new Material ids per cell after the change
+    @return Array of indices of changed cells
+    '''
+    assert len(mids_old)==len(mids_new), 'Meshes must have the same cells'
+    return np.flatnonzero(np.asarray(mids_old)!=np.asarray(mids_new))
+
+def cell_delta_matrix(cell_idx, cell_mats, n_dof):
+    '''@brief Function used to sum elementary matrices of a few cells into a
+    global sparse matrix
+
+    @param cell_idx Global vertex indices of the cells: (n_cell,4)
+    @param cell_mats Elementary matrices of the cells: (n_cell,4,4)
+    @param n_dof Number of global dofs
+    @return csc_matrix
+    '''
+    rows = np.repeat(cell_idx, 4, axis=1).ravel()
+    cols = np.tile(cell_idx, (1,4)).ravel()
+    return sps.csc_matrix((np.ravel(cell_mats), (rows,cols)), shape=(n_dof,n_dof))
+
+def touched_dofs(delta):
+    '''@brief Function used to find dofs in nonzero rows or columns of a change
+
+    @param delta Sparse matrix of the change
+    @return Sorted array of dof indices
+    '''
+    coo = sps.coo_matrix(delta)
+    nonzero = coo.data!=0
+    return np.union1d(coo.row[nonzero], coo.col[nonzero])
+
+'''
+class used to solve with the factorization of a matrix A after a localized
+change A+dA without refactorizing A
+'''
+class LowRankLU(object):
+    def __init__(self, lu, delta):
+        '''@brief Constructor of Woodbury-corrected factorization
+
+        dA is nonzero only in rows and columns of a few dofs S, such that
+        A+dA = A+U*C*U^T with U the columns of identity on S and C = dA[S,S].
+        Solutions are x-Z*(I+C*Z[S])^{-1}*C*x[S], where x solves A and Z = A^{-1}U,
+        which costs len(S) solves with A once.
+        @param lu Factorization of A with a solve method
+        @param delta Sparse matrix of the change dA
+        '''
+        self._lu = lu
+        self._delta = sps.csc_matrix(delta)
+        self._dofs = touched_dofs(self._delta)
+        n_dof,n_low = self._delta.shape[0],len(self._dofs)
+        self._cap = None
+        if n_low:
+            self._c = self._delta[self._dofs,:][:,self._dofs].toarray()
+            u = np.zeros((n_dof,n_low))
+            u[self._dofs,np.arange(n_low)] = 1.0
+            self._z = self._lu.solve(u)
+            self._cap = linalg.lu_factor(np.eye(n_low) + self._c.dot(self._z[self._dofs]))
+
+    def solve(self, rhs):
+        x = self._lu.solve(rhs)
+        if self._cap is None:
+            return x
+        return x - self._z.dot(linalg.lu_solve(self._cap, self._c.dot(x[self._dofs])))
+
+def update_factorization(lu, delta, max_rank):
+    '''@brief Function used to update the factorization of a matrix after a
+    localized change
+
+    @param lu Factorization of the matrix before the change
+    @param delta Sparse matrix of the change
+    @param max_rank Largest correction rank, beyond which refactorizing is cheaper
+    @return LowRankLU, or None if the matrix has to be refactorized
+    '''
+    if isinstance(lu, LowRankLU):
+        # rank is counted over all changes since the last factorization
+        lu,delta = lu._lu,lu._delta+delta
+    if len(touched_dofs(delta))>max_rank:
+        return None
+    return LowRankLU(lu, delta)
@@ -0,0 +1,39 @@
+'''
+class used to set inner iteration tolerances from outer iteration residuals
+'''
+class InexactTol(object):
+    def __init__(self, tol_min, tol_max=1.0e-2, factor=1.0e-1):
+        '''@brief Constructor of the inexact tolerance policy
+
+        @param tol_min Tolerance used once outer iterations are converged
+        @param tol_max Loosest tolerance allowed for inner iterations
+        @param factor Ratio between inner tolerance and outer residual
+        '''
+        assert 0<tol_min<=tol_max, 'Tolerance bounds are wrong'
+        self._tol_min = tol_min
+        self._tol_max = tol_max
+        self._factor = factor
+        self._tol = tol_max
+
+    def update(self, e_outer):
+        '''@brief Function used to update inner tolerance from outer residual
+
+        The tolerance is bounded by tol_min and tol_max and is never loosened
+        once tightened, such that outer iterations can not stagnate.
+        @param e_outer Current residual of the outer iteration
+        @return Inner tolerance to be used
+        '''
+        tol = min(max(self._factor*e_outer, self._tol_min), self._tol_max)
+        self._tol = min(self._tol, tol)
+        return self._tol
+
+    def tol(self):
+        return self._tol
+
+    def at_floor(self):
+        '''@brief Function used to check if inner iterations are solved with the
+        tightest tolerance
+
+        Outer iterations must not be stopped before this is true.
+        '''
+        return self._tol<=self._tol_min
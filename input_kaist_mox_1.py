@@ -33,8 +33,37 @@ layout_dict={'43': 'mox_43',
 
 problem = {
     "sn_order": 6,              # REQ: SN angular quadrature order
+    "sn_orders": None,          # OP:  per-group SN orders overriding sn_order
     "do_nda": False,            # REQ: to determine whether or not to use NDA
-    "do_ua": False,            # REQ: to determine use UA for NDA or not
+    "do_ua": False,            # REQ: to determine use UA for MG iterations or not
+    "do_dsa": False,            # OP:  use DSA in SAAF source iterations
+    "do_amg": False,            # OP:  use angular multigrid in SAAF SI instead
+    "amg_sn_order": 2,          # OP:  coarse SN order for angular multigrid
+    "inexact": False,           # OP:  inner tolerances follow outer residuals
+    "mg_selective": False,      # OP:  skip thermal groups with unchanged sources
+    "mg_mode": "gauss_seidel",  # OP:  thermal iteration: gauss_seidel/jacobi/gmres
+    "n_workers": 4,             # OP:  processes used in jacobi mode
+    "nda_block_thermal": False, # OP:  solve NDA thermal groups as one system
+    "nda_block_solver": "direct", # OP: block solver for NDA: direct/gmres
+    "do_cmfd": False,           # OP:  CMFD acceleration on layout coarse mesh for SAAF
+    "warm_start": False,        # OP:  initialize SAAF with a diffusion eigen solve
+    "mesh_levels": 1,           # OP:  nested meshes solved from coarse to fine for SAAF
+    "sn_levels": 1,             # OP:  Sn orders solved from low to high for SAAF
+    "checkpoint_file": None,    # OP:  npz file keeping the latest eigen snapshot
+    "checkpoint_every": 1,      # OP:  outer iterations between snapshots
+    "restart_file": None,       # OP:  snapshot used to initialize standalone SAAF
+    "cache_dir": None,          # OP:  directory of cached results of solved problems
+    "cache_size": 2**30,        # OP:  bytes of cached results kept on disk
+    "woodbury_max_rank": 32,    # OP:  dofs touched by material updates before refactorizing
+    "outer_accel": None,        # OP:  outer extrapolation: None/anderson/aitken/chebyshev
+    "anderson_depth": 3,        # OP:  history depth for anderson mixing
+    "wielandt": False,          # OP:  wielandt shifted iterations for NDA eigen solves
+    "wielandt_delta": 0.1,      # OP:  wielandt shift added to current keff
+    "eigen_solver": "power",    # OP:  eigen solver: power/arnoldi
+    "n_modes": 1,               # OP:  number of modes computed by arnoldi
+    "adjoint": False,           # OP:  solve the adjoint problem, e.g. for perturbation
+    "rom_tol": 2.0e-2,          # OP:  ROM residual beyond which queries are solved fully
+    "rom_pod_tol": 1.0e-8,      # OP:  snapshot energy fraction discarded in ROM basis
     "mesh_cells": 34,           # REQ: number of cells per side
     "groups": 7,                # REQ: number of energy groups
     "domain_upper": 10,         # REQ: domain size
@@ -1,12 +1,82 @@
+import logging
+import multiprocessing
 import numpy as np
+from scipy.sparse import linalg as sla
+from inexact import InexactTol
+
+logger = logging.getLogger(__name__)
+
+# equation instance owned by worker processes in Jacobi-in-energy mode
+_jacobi_equ = None
+
+def _init_jacobi_worker(equ_cls):
+    '''@brief Function used to initialize worker processes with the equation
+    instance inherited from the parent process
+    '''
+    global _jacobi_equ
+    _jacobi_equ = equ_cls
+
+def _jacobi_solve(args):
+    '''@brief Function used in worker processes to solve one group from scalar
+    fluxes of the previous multigroup sweep
+
+    @param args Tuple of group index, dictionary of thermal scalar fluxes and
+    previous solution state of the group
+    @return Tuple of group index and new solution state of the group
+    '''
+    g,sflxes,state = args
+    for gi,sflx in sflxes.items():
+        _jacobi_equ.set_sflxes(gi, sflx)
+    _jacobi_equ.set_group_state(g, state)
+    _jacobi_equ.solve_in_group(g)
+    return g,_jacobi_equ.get_group_state(g)
 
 '''
 class used to perform multigroup calculations
 '''
 class MG(object):
-    def __init__(self):
+    def __init__(self, prob_dict=None):
+        if prob_dict is None:
+            prob_dict = {}
         # iteration tol
         self._tol = 1e-5
+        self._tol_min = self._tol
+        # inexact iterations: inner tolerances follow multigroup residuals
+        self._inexact = prob_dict.get('inexact', False)
+        # ratio between source iteration tol and mg tol
+        self._si_factor = 1.0e-2
+        # selective thermal group updates driven by incoming source changes
+        self._selective = prob_dict.get('mg_selective', False)
+        # groups are skipped if estimated source change is below this times tol
+        self._skip_factor = 1.0e-1
+        # thermal iteration mode: gauss_seidel, jacobi or gmres
+        self._mg_mode = prob_dict.get('mg_mode', 'gauss_seidel')
+        assert self._mg_mode in ('gauss_seidel','jacobi','gmres'), 'Unknown mg_mode'
+        # thermal groups are solved concurrently in Jacobi-in-energy mode
+        self._jacobi = self._mg_mode=='jacobi'
+        self._n_workers = prob_dict.get('n_workers', multiprocessing.cpu_count())
+
+    def set_tol(self, tol):
+        '''@brief Function used to set multigroup tolerance from outer iterations
+
+        @param tol Tolerance. It is not allowed to be tighter than default
+        '''
+        self._tol = max(tol, self._tol_min)
+
+    def get_tol(self):
+        return self._tol
+
+    def set_tol_min(self, tol_min):
+        '''@brief Function used to set the tightest multigroup tolerance, e.g.
+        when multigroup solves are used as operator applications in Krylov
+        methods
+
+        @param tol_min Tolerance floor. Current tolerance is set to it as well
+        '''
+        self._tol = self._tol_min = tol_min
+
+    def get_tol_min(self):
+        return self._tol_min
 
     def do_iterations(self, ho_cls, nda_cls=None):
         '''@brief Function to be called in fixed source problems
@@ -27,35 +97,157 @@ class MG(object):
             # TODO: add NDA for fixed source problem without fission source
             raise NotImplementedError
 
-    def mg_iterations(self, equ_cls):
+    def do_fixed_sources(self, equ_cls, sources, with_fission=False):
+        '''@brief Function to be called in fixed source problems with many
+        sources on the same geometry, e.g. for response matrices
+
+        Multigroup iterations are replaced by one direct solve of all groups,
+        whose factorization is shared by all sources.
+        @param equ_cls Equation class instance. Only NDA is supported as SAAF
+        matrices are not assembled for all groups and directions at once
+        @param sources Source densities at vertices: (n_src,n_grp,n_dof)
+        @param with_fission Boolean to include fission with keff=1
+        @return Scalar fluxes: (n_src,n_grp,n_dof)
+        '''
+        assert equ_cls.name()=='nda', \
+        'Batched fixed sources are only available for NDA, not for %s' % equ_cls.name()
+        return equ_cls.solve_fixed_sources(sources, with_fission=with_fission)
+
+    def mg_iterations(self, equ_cls, g_thr=None):
         '''@brief Function used to do multigroup iterations
 
         @param equ_cls Equation class instance. Could be NDA or HO depending on
         problem definition.
+        @param g_thr First group of iterated groups. The first thermal group of
+        equ_cls is used if not given
         Only to be called by self._do_iterations or in eigenvalue iterations
         '''
         # get number of groups and first thermal group
-        n_dof,n_grp,g_thr = equ_cls.n_dof(),equ_cls.n_grp(),equ_cls.g_thr()
+        n_dof,n_grp = equ_cls.n_dof(),equ_cls.n_grp()
+        if g_thr is None:
+            g_thr = equ_cls.g_thr()
         # sflxes from previous MG iteration
         sflxes_mg_prev = {g:np.ones(n_dof) for g in xrange(g_thr,n_grp)}
+        # inexact source iterations for SAAF
+        inexact = self._inexact and equ_cls.name()=='saaf'
+        if inexact:
+            si_tols = InexactTol(tol_min=self._si_factor*self._tol,
+                                 factor=self._si_factor)
+            equ_cls.set_tol(self._si_factor*self._tol)
         # Solve for fast and epithermal groups
         for g in xrange(0,g_thr):
             equ_cls.solve_in_group(g)
-            equ_cls.generate_sflx(g)
+        # Solve thermal groups at once in a coupled block system
+        if equ_cls.name()=='nda' and equ_cls.do_block_thermal():
+            equ_cls.solve_thermal_block()
+            return
         # Solve for thermal groups
-        e = 1.0
-        while e>self._tol:
-            for g in xrange(g_thr, n_grp):
-                # update old mg flux
-                equ_cls.update_sflxes(sflxes_mg_prev,g)
-                # assemble linear form and solve in group
+        thr_grps = range(g_thr, n_grp)
+        if self._mg_mode=='gmres':
+            self._gmres_thermal(equ_cls, thr_grps)
+            return
+        if self._selective:
+            # coupling strength between groups and latest change per group
+            coupling = equ_cls.scatter_coupling()
+            sflx_diffs = {g:1.0 for g in thr_grps}
+            n_solve,n_skip = 0,0
+        pool = None
+        if self._jacobi:
+            # factorize before forking such that workers inherit factorizations
+            for g in thr_grps:
+                equ_cls.factorize_group(g)
+            pool = multiprocessing.Pool(processes=min(self._n_workers,len(thr_grps)),
+                                        initializer=_init_jacobi_worker,
+                                        initargs=(equ_cls,))
+        try:
+            e,grps = 1.0,thr_grps
+            while e>self._tol:
+                if inexact:
+                    equ_cls.set_tol(si_tols.update(e))
+                for g in thr_grps:
+                    # update old mg flux
+                    equ_cls.update_sflxes(sflxes_mg_prev,g)
+                if pool:
+                    self._jacobi_sweep(equ_cls, pool, grps, thr_grps)
+                else:
+                    for g in grps:
+                        # assemble linear form and solve in group
+                        equ_cls.solve_in_group(g)
+                if equ_cls.do_ua():
+                    # solve ua equation with the latest upscattering residual
+                    equ_cls.solve_ua(sflxes_mg_prev)
+                    # update sflx after upscattering acceleration
+                    equ_cls.update_ua()
+                # calculate iteration errors in multigroup iterations
+                e = max(equ_cls.calculate_sflx_diff(sflxes_mg_prev,g)
+                        for g in thr_grps)
+                if self._selective:
+                    n_solve += len(grps)
+                    grps = self._schedule_groups(equ_cls, coupling, sflx_diffs,
+                                                 sflxes_mg_prev, thr_grps)
+                    n_skip += len(thr_grps)-len(grps)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+        if self._selective:
+            logger.info('thermal group solves: %d, skipped: %d', n_solve, n_skip)
+
+    def _gmres_thermal(self, equ_cls, thr_grps):
+        '''@brief Internal function used to solve thermal groups with GMRES
+
+        One Gauss-Seidel sweep over thermal groups is an affine map T(x)=Bx+c of
+        stacked thermal scalar fluxes x. Instead of iterating it to a fixed
+        point, (I-B)x=c is solved with GMRES, one sweep per operator application.
+        @param thr_grps List of thermal groups
+        '''
+        n_dof = equ_cls.n_dof()
+        def sweep(sflxes):
+            for i,g in enumerate(thr_grps):
+                equ_cls.set_sflxes(g, sflxes[i*n_dof:(i+1)*n_dof])
+            for g in thr_grps:
                 equ_cls.solve_in_group(g)
-                # calculate mg iteration error for group g
-            if equ_cls.name()=='nda' and equ_cls.do_ua():
-                # solve ua equation
-                equ_cls.solve_ua()
-                # update nda sflx after upscattering acceleration
-                equ_cls.update_ua()
-            # calculate iteration errors in multigroup iterations
-            e = max(equ_cls.calculate_sflx_diff(sflxes_mg_prev,g)
-                    for g in xrange(g_thr, n_grp))
+            return np.concatenate([equ_cls.get_sflxes(g) for g in thr_grps])
+        x0 = np.concatenate([equ_cls.get_sflxes(g) for g in thr_grps])
+        # constant part of the sweep
+        c = sweep(np.zeros_like(x0))
+        op = sla.LinearOperator((len(x0),len(x0)), matvec=lambda x: x-sweep(x)+c)
+        sol,info = sla.gmres(op, c, x0=x0, tol=self._tol)
+        if info>0:
+            logger.warning('GMRES in thermal groups not converged in %d iterations', info)
+        # final sweep makes all group solutions consistent with the solution
+        sweep(sol)
+
+    def _jacobi_sweep(self, equ_cls, pool, grps, thr_grps):
+        '''@brief Internal function used to solve groups concurrently with
+        scalar fluxes of the previous sweep
+
+        @param pool Worker pool initialized with equ_cls
+        @param grps Groups to be solved in this sweep
+        @param thr_grps All thermal groups
+        '''
+        sflxes = {g:equ_cls.get_sflxes(g) for g in thr_grps}
+        tasks = [(g,sflxes,equ_cls.get_group_state(g)) for g in grps]
+        for g,state in pool.map(_jacobi_solve, tasks):
+            equ_cls.set_group_state(g, state)
+
+    def _schedule_groups(self, equ_cls, coupling, sflx_diffs, sflxes_mg_prev,
+                         thr_grps):
+        '''@brief Internal function used to select thermal groups to be solved in
+        the next multigroup sweep
+
+        The change of the incoming scattering source of each group is estimated
+        from latest changes of other groups weighted by scattering coupling.
+        Groups with negligible change are skipped and the rest are ordered by
+        estimated change in decreasing order.
+        @param coupling Array of scattering coupling strength between groups
+        @param sflx_diffs Dictionary of latest relative change per group. Updated
+        in place
+        @return List of groups to be solved
+        '''
+        for g in thr_grps:
+            sflx_diffs[g] = equ_cls.calculate_sflx_diff(sflxes_mg_prev,g)
+        src_diffs = {g:sum(coupling[g,gi]*sflx_diffs[gi] for gi in thr_grps if gi!=g)
+                     for g in thr_grps}
+        grps = filter(lambda g: src_diffs[g]>self._skip_factor*self._tol, thr_grps)
+        return sorted(grps, key=lambda g: -src_diffs[g])
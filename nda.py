@@ -1,9 +1,29 @@
+import logging
 import numpy as np
 from scipy import sparse as sps
 from scipy.sparse import linalg as sla
 from itertools import product as pd
 from numpy.linalg import norm
-from elem import Elem
+from elem import get_elem
+import incremental
+
+logger = logging.getLogger(__name__)
+
+class _PermutedLU(object):
+    def __init__(self, lu, perm_c):
+        '''@brief Wrapper of the factorization of a matrix with columns reordered
+        by perm_c
+
+        @param lu SuperLU object of the column-permuted matrix
+        @param perm_c Column permutation
+        '''
+        self._lu = lu
+        self._perm_c = perm_c
+
+    def solve(self, rhs):
+        sol = np.empty_like(rhs, dtype=float)
+        sol[self._perm_c] = self._lu.solve(rhs)
+        return sol
 
 class NDA(object):
     def __init__(self, mat_cls, mesh_cls, prob_dict):
@@ -16,16 +36,23 @@ class NDA(object):
         self._keff = 1.0
         self._keff_prev = 1.0
         # preassembly-interpolation data
-        self._elem = Elem(self._cell_length)
+        self._elem = get_elem(self._cell_length)
         # material ids and group info
-        self._mids = mat_cls.get('ids')
+        self._mids = mat_cls.ids()
         self._n_grp = mat_cls.get('n_grps')
-        self._g_thr = mat_cls.get('g_thermal')
-        # mesh
-        self._mesh = msh_cls
+        # first thermal group over all materials
+        self._g_thr = int(min(mat_cls.get('g_thermal').values()))
+        # number of dofs
+        self._n_dof = mesh_cls.n_node()
+        # total number of components: keep consistency with HO
+        self._n_tot = self._n_grp
         # problem type
-        self._is_eigen = prob_dict['is_eigen_problem']
+        self._is_eigen = prob_dict.get('is_eigen_problem', True)
         self._do_ua = prob_dict['do_ua']
+        # solve thermal groups as one coupled block system
+        self._block_thermal = prob_dict.get('nda_block_thermal', False)
+        self._block_solver = prob_dict.get('nda_block_solver', 'direct')
+        self._block_tol = 1.0e-8
         # linear algebra objects
         self._sys_mats = {}
         self._sys_rhses = {k:np.ones(self._n_dof) for k in xrange(self._n_tot)}
@@ -33,22 +60,44 @@ class NDA(object):
         self._sflxes = {k:np.ones(self._n_dof) for k in xrange(self._n_grp)}
         # linear solver objects
         self._lu = {}
-        # total number of components: keep consistency with HO
-        self._n_tot = self._n_grp
+        # largest low-rank correction of factorizations in material updates
+        self._max_rank = prob_dict.get('woodbury_max_rank', 32)
+        # sparsity pattern, elementary entry to data map and cached ordering
+        self._scatter = None
+        self._perm_c = None
+        # global scattering and fission matrices
+        self._scat_mats = {}
+        self._fiss_mats = {}
+        # global mass matrix used for fixed sources
+        self._mass_mat = None
         # all material
         self._dcoefs = mat_cls.get('diff_coef')
         self._sigts = mat_cls.get('sig_t')
+        self._isigts = mat_cls.get('inv_sig_t')
         self._sigses = mat_cls.get('sig_s')
         self._sigrs = mat_cls.get('sig_r')
         self._fiss_xsecs = mat_cls.get('chi_nu_sig_f')
+        self._nu_sigfs = mat_cls.get('nu_sig_f')
+        # adjoint problem: scattering and fission matrices are transposed, which
+        # couples every group to lower energy groups so all groups are iterated
+        self._adjoint = prob_dict.get('adjoint', False)
+        if self._adjoint:
+            self._fiss_xsecs,self._sigses = [
+            {mid:np.transpose(v) for mid,v in xs.items()}
+            for xs in (self._fiss_xsecs,self._sigses)]
+            self._g_thr = 0
+        assert not (self._adjoint and self._do_ua), 'UA is not available for adjoint problems'
         # derived material properties
         self._sigrs_ua = mat_cls.get('sig_r_ua')
         self._dcoefs_ua = mat_cls.get('diff_coef_ua')
+        self._ksi_ua = mat_cls.get('ksi_ua')
+        # ksi_ua at vertices, built when first used
+        self._ksi_ua_vtx = None
         # fission source
         self._global_fiss_src = self._calculate_fiss_src()
         self._global_fiss_src_prev = self._global_fiss_src
         # assistance object
-        self._local_dof_pairs = pd(xrange(4),xrange(4))
+        self._local_dof_pairs = list(pd(xrange(4),xrange(4)))
 
     def name(self):
         return self._name
@@ -57,6 +106,10 @@ class NDA(object):
         '''@brief A function used to assemble bilinear forms of NDA for current
         iterations
 
+        The sparsity pattern does not change between iterations. It is built once
+        with a map from elementary matrix entries to CSC data slots, after which
+        matrix values are updated in place. Factorizations of previous matrices
+        are cleared while the column ordering is kept for refactorization.
         @param correction A boolean used to determine if correction terms are
         assembled. By default, it's not. In this case, the bilinear form is typical
         diffusion
@@ -65,142 +118,433 @@ class NDA(object):
         streaming,mass = self._elem.streaming(),self._elem.mass()
         if correction:
             assert ho_cls is not None, 'ho_cls has to be filled in for NDA correction'
-        # basic diffusion Elementary matrices
-        diff_mats = {}
-        # Elementary correction matrices
-        corx,cory,sigt,dcoef = self._elem.corx(),self._elem.cory(),0,0
+        if self._scatter is None:
+            self._build_pattern()
+        if correction:
+            # drift vectors for all cells, groups and quadrature points at once
+            corrs = ho_cls.calculate_nda_corrections(do_ua=self._do_ua)
+            # stacked elementary correction matrices: (n_qp,4,4)
+            corx = np.array([self._elem.corx()[i] for i in xrange(len(self._elem.corx()))])
+            cory = np.array([self._elem.cory()[i] for i in xrange(len(self._elem.cory()))])
         for g in xrange(self._n_grp):
-            self._sys_mats[g] = sps.lil_matrix((self._mesh.n_node(),self._mesh.n_node()))
-            for mid in self._mids:
-                sigt,sigr,dcoef = self._sigts[mid][g],self._sigrs[mid][g],self._dcoefs[mid][g]
-                diff_mats[(g,mid)] = (dcoef*streaming + sigr*mass)
-        # preassembled matrices for upscattering acceleration
-        if self._do_ua:
-            self._sys_mats['ua'] = sps.lil_matrix((self._mesh.n_node(),self._mesh.n_node()))
-            for mid in self._mids:
-                dcoef_ua,sigr_ua = self._dcoefs_ua[mid],self._sigrs_ua[mid]
-                # basic elementary diffusion matrices for upscattering acceleration
-                diff_mats[('ua',mid)] = (dcoef_ua*streaming + sigr_ua*mass)
-
-        # loop over cells for assembly
-        for cell in self._mesh.cells():
-            # get global dof index and mat id
-            idx,mid = cell.id(),cell.global_idx()
-            # corrections for all groups in current cell and ua
-            corr_vecs = {}
+            # basic diffusion elementary matrices per cell: (n_cell,4,4)
+            dcoefs = np.array([self._dcoefs[mid][g] for mid in self._mids])[self._cell_mid_idx]
+            sigrs = np.array([self._sigrs[mid][g] for mid in self._mids])[self._cell_mid_idx]
+            cell_mats = (dcoefs[:,np.newaxis,np.newaxis]*streaming +
+                         sigrs[:,np.newaxis,np.newaxis]*mass)
+            # if correction is asked
             if correction:
-                corr_vecs = ho_cls.calculate_nda_cell_correction(mat_id=mid,idx=idx)
-            for g in xrange(self._n_grp):
-                # if correction is asked
-                cor_mat = np.zeros((4,4))
-                if correction:
-                    # calculate NDA correction in HO class
-                    corr_vecs[g]=ho_cls.calculate_nda_cell_correction(
-                    g=g, mat_id=mid, idx=idx)
-                    # TODO: fixed the "9"
-                    for i in xrange(9):
-                        # x-component
-                        cor_mat += corr_vecs['x_comp'][g][i]*corx[i]
-                        # y-component
-                        cor_mat += corr_vecs['x_comp'][g][i]*cory[i]
-                    diff_mats[(g,mid)] += cor_mat
-                # assemble global system
-                for ci,cj in self._local_dof_pairs:
-                    self._sys_mats[g][idx[ci],idx[cj]]+=diff_mats[(g,mid)][ci,cj]
-
-            # if we do upscattering acceleration
-            if self._do_ua:
-                # assemble global system of ua matrix without correction
-                for ci,cj in self._local_dof_pairs:
-                    self._sys_mats['ua'][idx[ci],idx[cj]]+=diff_mats[('ua',mid)][ci,cj]
-
-                # correction matrix for upscattering acceleration
-                cor_mat_ua = np.zeros((4,4))
-                if correction:
-                    for i in xrange(len(corr_vecs[0])):
-                        cor_mat_ua+=(corr_vecs['x_ua'][i]*corx[i]+
-                                     corr_vecs['y_ua'][i]*cory[i])
-                        diff_mats[('ua',mid)] += cor_mat_ua[ci,cj]
-                # mapping UA matrix to global
-                for ci,cj in self._local_dof_pairs:
-                    self._sys_mats['ua'][idx[ci],idx[cj]]+=diff_mats[('ua',mid)][ci,cj]
-
-        # Transform system matrices to CSC format
-        for g in xrange(self._n_grp):
-            self._sys_mats[g] = sps.csc_matrix(self._sys_mats[g])
+                cell_mats += (np.einsum('cq,qab->cab', corrs['x_comp'][:,g], corx) +
+                              np.einsum('cq,qab->cab', corrs['y_comp'][:,g], cory))
+            self._update_sys_mat(g, cell_mats)
+        # matrix for upscattering acceleration
         if self._do_ua:
-            self._sys_mats['ua'] = sps.csc_matrix(self._sys_mats['ua'])
+            dcoefs = np.array([self._dcoefs_ua[mid] for mid in self._mids])[self._cell_mid_idx]
+            sigrs = np.array([self._sigrs_ua[mid] for mid in self._mids])[self._cell_mid_idx]
+            cell_mats = (dcoefs[:,np.newaxis,np.newaxis]*streaming +
+                         sigrs[:,np.newaxis,np.newaxis]*mass)
+            # correction matrix for upscattering acceleration
+            if correction:
+                cell_mats += (np.einsum('cq,qab->cab', corrs['x_ua'], corx) +
+                              np.einsum('cq,qab->cab', corrs['y_ua'], cory))
+            self._update_sys_mat('ua', cell_mats)
+        # previous factorizations are no longer valid
+        self.clear_factorization()
+
+    def _build_pattern(self):
+        '''@brief Internal function used to build the CSC sparsity pattern shared
+        by all NDA matrices and the map from elementary entries to data slots
+        '''
+        n = self._n_dof
+        cells = self._mesh.cells()
+        cell_idx = np.array([cell.global_idx() for cell in cells])
+        self._cell_mid_idx = np.array([self._mids.index(cell.get('id')) for cell in cells])
+        # global row and column per elementary entry in (cell,ci,cj) order
+        rows = np.repeat(cell_idx, 4, axis=1)
+        cols = np.tile(cell_idx, (1,4))
+        # column-major keys sorted uniquely give CSC ordering
+        keys,self._scatter = np.unique((cols*n+rows).ravel(), return_inverse=True)
+        self._csc_indices = keys % n
+        self._csc_indptr = np.concatenate(([0],np.cumsum(np.bincount(keys//n, minlength=n))))
+
+    def update_materials(self, mesh_cls):
+        '''@brief Function used to change materials of a few cells, e.g. to insert
+        a control rod, without reassembling and refactorizing everything
+
+        Diffusion contributions of changed cells are replaced in system matrices
+        in place, keeping HO corrections of the latest assembly. Group and
+        upscattering acceleration factorizations are corrected with low-rank
+        updates up to 'woodbury_max_rank' touched dofs, beyond which they are
+        refactorized. Scattering and fission matrices and the thermal block
+        factorization are rebuilt when next used.
+        @param mesh_cls Mesh with the same cells and changed materials
+        '''
+        self._mesh = mesh_cls
+        self._ksi_ua_vtx = None
+        if self._scatter is None:
+            # nothing assembled yet
+            self._global_fiss_src = self._calculate_fiss_src()
+            return
+        cells = mesh_cls.cells()
+        cell_mid_idx = np.array([self._mids.index(cell.get('id')) for cell in cells])
+        changed = incremental.diff_materials(self._cell_mid_idx, cell_mid_idx)
+        old_idx,new_idx = self._cell_mid_idx[changed],cell_mid_idx[changed]
+        self._cell_mid_idx = cell_mid_idx
+        if len(changed):
+            streaming,mass = self._elem.streaming(),self._elem.mass()
+            # data slots of the entries of changed cells
+            slots = self._scatter.reshape(-1,16)[changed].ravel()
+            for key in self._sys_mats.keys():
+                if key=='ua':
+                    dcoefs = np.array([self._dcoefs_ua[mid] for mid in self._mids])
+                    sigrs = np.array([self._sigrs_ua[mid] for mid in self._mids])
+                else:
+                    dcoefs = np.array([self._dcoefs[mid][key] for mid in self._mids])
+                    sigrs = np.array([self._sigrs[mid][key] for mid in self._mids])
+                ddcoefs,dsigrs = dcoefs[new_idx]-dcoefs[old_idx],sigrs[new_idx]-sigrs[old_idx]
+                cell_mats = (ddcoefs[:,np.newaxis,np.newaxis]*streaming +
+                             dsigrs[:,np.newaxis,np.newaxis]*mass)
+                data = np.bincount(slots, weights=cell_mats.ravel(),
+                                   minlength=len(self._csc_indices))
+                self._sys_mats[key].data += data
+                if key in self._lu:
+                    delta = sps.csc_matrix((data,self._csc_indices,self._csc_indptr),
+                                           shape=(self._n_dof,self._n_dof))
+                    lu = incremental.update_factorization(self._lu[key], delta,
+                                                          self._max_rank)
+                    if lu is None:
+                        del self._lu[key]
+                    else:
+                        self._lu[key] = lu
+            for key in ('thermal','fixed','fixed_fission'):
+                self._lu.pop(key, None)
+            self._scat_mats.clear()
+            self._fiss_mats.clear()
+        # fission source is consistent with new materials for keff updates
+        self._global_fiss_src = self._calculate_fiss_src()
+
+    def _update_sys_mat(self, key, cell_mats):
+        '''@brief Internal function used to sum elementary matrices into the
+        data of system matrix key in place
+
+        @param key Group index or 'ua'
+        @param cell_mats Elementary matrices of all cells: (n_cell,4,4)
+        '''
+        if key in self._sys_mats:
+            self._sys_mats[key].data[:] = np.bincount(
+            self._scatter, weights=cell_mats.ravel(), minlength=len(self._csc_indices))
+        else:
+            self._sys_mats[key] = self._pattern_matrix(cell_mats)
+
+    def _pattern_matrix(self, cell_mats):
+        '''@brief Internal function used to sum elementary matrices of all cells
+        into a new global matrix with the NDA sparsity pattern
+
+        @param cell_mats Elementary matrices of all cells: (n_cell,4,4)
+        @return csc_matrix
+        '''
+        data = np.bincount(self._scatter, weights=cell_mats.ravel(),
+                           minlength=len(self._csc_indices))
+        return sps.csc_matrix((data, self._csc_indices.copy(), self._csc_indptr.copy()),
+                              shape=(self._n_dof,self._n_dof))
+
+    def _scattering_matrix(self, g, gi):
+        '''@brief Internal function used to get the global mass matrix weighted by
+        scattering xsec from Group gi to Group g
+
+        @return csc_matrix, or None if there is no scattering from gi to g
+        '''
+        if (g,gi) not in self._scat_mats:
+            sigs = np.array([self._sigses[mid][g,gi] for mid in self._mids])
+            self._scat_mats[(g,gi)] = None
+            if np.any(sigs>1.0e-14):
+                self._scat_mats[(g,gi)] = self._pattern_matrix(
+                sigs[self._cell_mid_idx,np.newaxis,np.newaxis]*self._elem.mass())
+        return self._scat_mats[(g,gi)]
+
+    def _assemble_block_matrix(self, grps):
+        '''@brief Internal function used to assemble groups in grps into one
+        block system coupled by scattering
+
+        @param grps List of group indices
+        @return csc_matrix with group matrices on diagonal blocks and scattering
+        couplings on off-diagonal blocks
+        '''
+        blocks = [[None]*len(grps) for g in grps]
+        for i,g in enumerate(grps):
+            for j,gi in enumerate(grps):
+                if g==gi:
+                    blocks[i][j] = self._sys_mats[g]
+                elif self._scattering_matrix(g, gi) is not None:
+                    blocks[i][j] = -self._scattering_matrix(g, gi)
+        return sps.bmat(blocks, format='csc')
+
+    def solve_thermal_block(self):
+        '''@brief A function used to solve all thermal groups at once
+
+        Upscattering couplings are included in one block system, which is solved
+        directly or with GMRES preconditioned by per-group factorizations. This
+        replaces thermal multigroup iterations.
+        '''
+        thr_grps = range(self._g_thr, self._n_grp)
+        # fixed source and scattering from fast groups
+        rhs = []
+        for g in thr_grps:
+            rhs_g = np.array(self._fixed_rhses[g], dtype=float)
+            for gi in xrange(self._g_thr):
+                if self._scattering_matrix(g, gi) is not None:
+                    rhs_g += self._scattering_matrix(g, gi).dot(self._sflxes[gi])
+            rhs.append(rhs_g)
+        rhs = np.concatenate(rhs)
+        if self._block_solver=='gmres':
+            sol = self._gmres_thermal_block(thr_grps, rhs)
+        else:
+            if 'thermal' not in self._lu:
+                self._lu['thermal'] = sla.splu(self._assemble_block_matrix(thr_grps))
+            sol = self._lu['thermal'].solve(rhs)
+        for i,g in enumerate(thr_grps):
+            self._sflxes[g] = sol[i*self._n_dof:(i+1)*self._n_dof]
+
+    def _gmres_thermal_block(self, thr_grps, rhs):
+        '''@brief Internal function used to solve thermal block system with GMRES
+        and block-Jacobi preconditioner made of per-group factorizations
+        '''
+        n_dof = self._n_dof
+        for g in thr_grps:
+            self.factorize_group(g)
+        def precond(vec):
+            return np.concatenate([self._lu[g].solve(vec[i*n_dof:(i+1)*n_dof])
+                                   for i,g in enumerate(thr_grps)])
+        prec = sla.LinearOperator((len(rhs),len(rhs)), matvec=precond)
+        x0 = np.concatenate([self._sflxes[g] for g in thr_grps])
+        sol,info = sla.gmres(self._assemble_block_matrix(thr_grps), rhs, x0=x0,
+                             tol=self._block_tol, M=prec)
+        assert info>=0, 'GMRES breakdown in thermal block solve'
+        if info>0:
+            logger.warning('GMRES in thermal block not converged in %d iterations', info)
+        return sol
+
+    def _fission_matrix(self, g, gi):
+        '''@brief Internal function used to get the global mass matrix weighted by
+        chi*nu*sig_f from Group gi to Group g
+
+        @return csc_matrix, or None if there is no fission from gi to g
+        '''
+        if (g,gi) not in self._fiss_mats:
+            xsecs = np.array([self._fiss_xsecs[mid][g,gi] if mid in self._fiss_xsecs
+                              else 0.0 for mid in self._mids])
+            self._fiss_mats[(g,gi)] = None
+            if np.any(xsecs>1.0e-14):
+                self._fiss_mats[(g,gi)] = self._pattern_matrix(
+                xsecs[self._cell_mid_idx,np.newaxis,np.newaxis]*self._elem.mass())
+        return self._fiss_mats[(g,gi)]
+
+    def _fission_block_matrix(self):
+        '''@brief Internal function used to get the fission operator coupling all
+        groups
+
+        @return csc_matrix with fission matrices from Group gi to Group g on
+        block (g,gi)
+        '''
+        if 'all' not in self._fiss_mats:
+            grps = range(self._n_grp)
+            blocks = [[self._fission_matrix(g,gi) for gi in grps] for g in grps]
+            # empty diagonal blocks keep the shape for groups without chi
+            for g in grps:
+                if blocks[g][g] is None:
+                    blocks[g][g] = sps.csc_matrix((self._n_dof,self._n_dof))
+            self._fiss_mats['all'] = sps.bmat(blocks, format='csc')
+        return self._fiss_mats['all']
+
+    def block_matrices(self):
+        '''@brief Function used to get the operators of all groups with the
+        latest assembled bilinear forms
+
+        @return Tuple of csc_matrix of the loss operator L, made of group
+        matrices and scattering couplings, and the fission operator F, such that
+        L*phi = F*phi/keff for fluxes of all groups stacked
+        '''
+        return self._assemble_block_matrix(range(self._n_grp)),self._fission_block_matrix()
+
+    def solve_fixed_sources(self, sources, with_fission=False):
+        '''@brief A function used to solve fixed source problems for many sources
+        on the same geometry at once
+
+        The operator of all groups, coupled by scattering, is factorized once
+        and the factorization is shared by all sources and later calls until
+        bilinear forms or materials change. All sources are solved together
+        with multi-RHS triangular solves.
+        @param sources Source densities at vertices: (n_src,n_grp,n_dof)
+        @param with_fission Boolean to include fission with keff=1 in the
+        operator, i.e. subcritical multiplication. By default, fission is not
+        included
+        @return Scalar fluxes: (n_src,n_grp,n_dof)
+        '''
+        if self._scatter is None:
+            self.assemble_bilinear_forms(correction=False)
+        key = 'fixed_fission' if with_fission else 'fixed'
+        if key not in self._lu:
+            loss,fiss = self.block_matrices()
+            self._lu[key] = sla.splu(sps.csc_matrix(loss-fiss if with_fission else loss))
+        if self._mass_mat is None:
+            n_cell = len(self._cell_mid_idx)
+            self._mass_mat = self._pattern_matrix(np.tile(self._elem.mass(), (n_cell,1,1)))
+        sources = np.asarray(sources, dtype=float)
+        n_src = sources.shape[0]
+        # rhs of all groups stacked with one column per source
+        rhs = np.concatenate([self._mass_mat.dot(sources[:,g,:].T)
+                              for g in xrange(self._n_grp)])
+        sflxes = self._lu[key].solve(rhs)
+        return sflxes.T.reshape(n_src,self._n_grp,self._n_dof)
+
+    def solve_generation(self, sflx):
+        '''@brief A function used to solve the scalar fluxes generated by the
+        fission source of sflx with unit keff, i.e. to apply L^-1*F
 
-    def assemble_fixed_linear_forms(self, sflxes_prev=None):
+        The operator of all groups is solved directly, such that the result is
+        exact and linear in sflx. The factorization is shared with fixed source
+        solves without fission.
+        @param sflx Scalar fluxes of all groups stacked
+        @return Generated scalar fluxes of all groups stacked
+        '''
+        if 'fixed' not in self._lu:
+            self._lu['fixed'] = sla.splu(sps.csc_matrix(self.block_matrices()[0]))
+        return self._lu['fixed'].solve(self._fission_block_matrix().dot(sflx))
+
+    def solve_wielandt(self, keff_shift):
+        '''@brief A function used to perform one Wielandt shifted inverse
+        iteration over all groups
+
+        The shifted system (L-F/k_s)phi_new = (1/k-1/k_s)F phi is solved
+        directly, L being the NDA operator with scattering couplings and F the
+        fission operator. The eigenvalue estimate is updated with
+        1/k_new = 1/k_s + (1/k-1/k_s)*<F phi>/<F phi_new>.
+        @param keff_shift Shift k_s, which has to be larger than current keff
+        @return Updated keff
+        '''
+        assert keff_shift>self._keff, 'Wielandt shift must exceed keff'
+        grps = range(self._n_grp)
+        fiss = self._fission_block_matrix()
+        sflx = np.concatenate([self._sflxes[g] for g in grps])
+        fiss_src = fiss.dot(sflx)
+        lam = 1./self._keff - 1./keff_shift
+        # shift changes every outer iteration, so the system is refactorized
+        lu = sla.splu(sps.csc_matrix(self._assemble_block_matrix(grps) - fiss/keff_shift))
+        sflx = lu.solve(lam*fiss_src)
+        lam *= fiss_src.sum() / fiss.dot(sflx).sum()
+        self._keff_prev,self._keff = self._keff,1./(1./keff_shift + lam)
+        for g in grps:
+            self._sflxes[g] = sflx[g*self._n_dof:(g+1)*self._n_dof]
+        return self._keff
+
+
+    def _factorize(self, key):
+        '''@brief Internal function used to factorize system matrix key
+
+        The column ordering of the first factorization is cached and reused for
+        later factorizations, as it only depends on the sparsity pattern.
+        @param key Group index or 'ua'
+        @return Factorization object with a solve method
+        '''
+        if self._perm_c is None:
+            lu = sla.splu(self._sys_mats[key])
+            self._perm_c = lu.perm_c
+            # data permutation used to reorder columns of matrices in place
+            starts,ends = self._csc_indptr[:-1],self._csc_indptr[1:]
+            self._perm_data = np.concatenate([np.arange(starts[j],ends[j])
+                                              for j in self._perm_c])
+            self._perm_indices = self._csc_indices[self._perm_data]
+            self._perm_indptr = np.concatenate(([0],np.cumsum((ends-starts)[self._perm_c])))
+            return lu
+        mat = sps.csc_matrix((self._sys_mats[key].data[self._perm_data],
+                              self._perm_indices,self._perm_indptr),
+                             shape=(self._n_dof,self._n_dof))
+        return _PermutedLU(sla.splu(mat, permc_spec='NATURAL'), self._perm_c)
+
+    def assemble_fixed_linear_forms(self, sflxes_prev=None, keff=None):
         '''@brief  function used to assemble linear form for fixed source or fission
         source
+
+        @param sflxes_prev Scalar fluxes generating the fission source. Current
+        scalar fluxes are used if not given
+        @param keff keff used to scale fission source. Current keff is used if not
+        given
         '''
-        # scale the fission xsec by keff
-        scaled_fiss_xsec = {k:v/self._keff for k,v in self._fiss_xsecs}
+        keff = keff or self._keff
+        sflxes = sflxes_prev or self._sflxes
         for g in xrange(self._n_grp):
-            fixed_rhses[g] = np.array(self._mesh.n_node())
-            for cell in self._mesh.cells():
-                idx,mid,fiss_src = cell.global_idx(),cell.id(),np.zeros(4)
-                for gi in filter(lambda: scaled_fiss_xsec[mid][g,x]>1.0e-14,xrange(self._n_grp)):
-                    sflx_vtx = self._sflxes[g][idx] if not sflxes_prev else \
-                               sflxes_prev[g][idx]
-                    fiss_src += scaled_fiss_xsec[mid][g,gi]*np.dot(mass,sflx_vtx)
-                self._fixed_rhses[g][idx] += fiss_src
+            self._fixed_rhses[g] = np.zeros(self._n_dof)
+            for gi in xrange(self._n_grp):
+                if self._fission_matrix(g, gi) is not None:
+                    self._fixed_rhses[g] += self._fission_matrix(g, gi).dot(sflxes[gi])/keff
 
     def _assemble_group_linear_forms(self, g):
-        '''@brief A function used to assemble linear form for upscattering acceleration
+        '''@brief A function used to assemble linear form for Group g with fixed
+        source and scattering source from other groups
         '''
         # NOTE: due to pass-by-reference feature in Python, we have to make
         # deep copy of fixed rhs instead of using "="
         np.copyto(self._sys_rhses[g], self._fixed_rhses[g])
-        # get mass matrix
-        mass = self._elem.mass()
-        for cell in mesh.cells:
-            idx,mid = cell.global_idx(),cell.id()
-            sigs = self._sigses[mid][g,:]
-            scat_src = np.zeros(4)
-            for gi in filter(lambda x: sigs[x]>1.0e-14 and x!=g,xrange(self._n_grp)):
-                sflx_vtx = self._sflxes[gi][idx]
-                scat_src += sigs[gi] * np.dot(mass, sflx_vtx)
-            self._sys_rhses[g][idx] += scat_src
+        for gi in filter(lambda x: x!=g, xrange(self._n_grp)):
+            if self._scattering_matrix(g, gi) is not None:
+                self._sys_rhses[g] += self._scattering_matrix(g, gi).dot(self._sflxes[gi])
 
     def _assemble_ua_linear_form(self, sflxes_old):
         '''@brief A function used to assemble linear form for upscattering acceleration
         '''
-        assert len(sflxes_old)==self._n_grp, \
-        'old scalar fluxes should have the same number of groups as current scalar fluxes'
+        assert all(g in sflxes_old for g in xrange(self._g_thr,self._n_grp)), \
+        'old scalar fluxes should be provided for all thermal groups'
         mass = self._elem.mass()
-        self._sys_rhses['ua'] *= 0.0
+        self._sys_rhses['ua'] = np.zeros(self._n_dof)
         for cell in self._mesh.cells():
-            idx,mid,scat_src_ua = cell.global_idx(),cell.id(),np.zeros(4)
+            idx,mid,scat_src_ua = cell.global_idx(),cell.get('id'),np.zeros(4)
             for g in xrange(self._g_thr,self._n_grp-1):
                 for gi in xrange(g+1,self._n_grp):
                     sigs = self._sigses[mid][g,gi]
                     if sigs>1.0e-14:
-                        dsflx_vtx = self._sflxes[gi][idx]-sflxes_old[g][idx]
+                        dsflx_vtx = self._sflxes[gi][idx]-sflxes_old[gi][idx]
                         scat_src_ua += sigs*np.dot(mass,dsflx_vtx)
             self._sys_rhses['ua'][idx] += scat_src_ua
 
     def solve_in_group(self,g):
         assert 0<=g<self._n_grp, 'Group index out of range'
         self._assemble_group_linear_forms(g)
-        if g not in self._lu:
-            # factorize it if not yet
-            self._lu[g] = sla.splu(self._sys_mats[g])
+        self.factorize_group(g)
         # direct solve
         self._sflxes[g] = self._lu[g].solve(self._sys_rhses[g])
 
+    def factorize_group(self, g):
+        '''@brief A function used to factorize the matrix of Group g if not yet
+
+        @param g Group index
+        '''
+        if g not in self._lu:
+            self._lu[g] = self._factorize(g)
+
     #NOTE: this function has to be removed if abstract class is implemented
     def calculate_keff(self):
-        assert not self._is_eigen, 'only be called in eigenvalue problems'
+        assert self._is_eigen, 'only be called in eigenvalue problems'
         # update the previous fission source and previous keff
         self._global_fiss_src_prev,self._keff_prev = self._global_fiss_src,self._keff
         # calculate the new fission source
-        self._calculate_fiss_src()
+        self._global_fiss_src = self._calculate_fiss_src()
         # calculate the new keff
         self._keff = self._keff_prev * self._global_fiss_src / self._global_fiss_src_prev
         return self._keff
 
+    def _calculate_fiss_src(self):
+        # loop over cells and groups and calculate nu_sig_f*phi
+        # NOTE: mid-point rule is used for integration as in SAAF
+        global_fiss_src = 0
+        for cell in self._mesh.cells():
+            idx,mid = cell.global_idx(),cell.get('id')
+            if mid not in self._nu_sigfs:
+                continue
+            nusigf = self._nu_sigfs[mid]
+            for g in filter(lambda x: nusigf[x]>1.0e-14, xrange(self._n_grp)):
+                global_fiss_src += nusigf[g]*sum(self._sflxes[g][idx])
+        return global_fiss_src
+
     #NOTE: this function has to be removed if abstract class is implemented
     def calculate_sflx_diff(self, sflxes_old, g):
         '''@brief function used to generate ho scalar flux for Group g using
@@ -225,9 +569,27 @@ class NDA(object):
     def update_ua(self):
         '''@brief A function used to update the scalar fluxes after upscattering
         acceleration
+
+        The error is distributed over thermal groups with ksi_ua at vertices,
+        consistently with the spectrum used to collapse the ua equation.
         '''
-        for g in xrange(self.g_thr,self._n_grp):
-            self._sflxes[g] += self._sflxes['ua']
+        if self._ksi_ua_vtx is None:
+            self._ksi_ua_vtx = self._vertex_ksi_ua()
+        for g in xrange(self._g_thr,self._n_grp):
+            self._sflxes[g] += self._ksi_ua_vtx[g-self._g_thr]*self._sflxes['ua']
+
+    def _vertex_ksi_ua(self):
+        '''@brief Internal function used to map ksi_ua to vertices
+
+        Vertex values are averaged over cells sharing the vertex.
+        @return Array of shape (n_thermal_grp,n_dof)
+        '''
+        cell_idx = np.array([cell.global_idx() for cell in self._mesh.cells()]).ravel()
+        ksi = np.array([self._ksi_ua[cell.get('id')] for cell in self._mesh.cells()])
+        ct = np.bincount(cell_idx, minlength=self._n_dof)
+        return np.array([np.bincount(cell_idx, weights=np.repeat(ksi[:,i],4),
+                                     minlength=self._n_dof)/ct
+                         for i in xrange(ksi.shape[1])])
 
     def clear_factorization(self):
         '''@brief A function used to clear all the factorizations after NDA is dictionaries
@@ -238,15 +600,56 @@ class NDA(object):
         '''
         self._lu.clear()
 
-    def solve_ua(self):
+    def solve_ua(self, sflxes_old):
+        '''@brief A function used to solve upscattering acceleration equation
+
+        @param sflxes_old Thermal scalar fluxes before the latest thermal sweep
+        '''
         # assemble ua
-        self._assemble_ua_linear_form()
+        self._assemble_ua_linear_form(sflxes_old)
         if 'ua' not in self._lu:
             # factorize it if not yet
-            self._lu['ua'] = sla.splu(self._sys_mats['ua'])
+            self._lu['ua'] = self._factorize('ua')
         # direct solve
         self._sflxes['ua'] = self._lu['ua'].solve(self._sys_rhses['ua'])
 
+    def scatter_coupling(self):
+        '''@brief A function used to estimate scattering coupling between groups
+
+        @return Array with entry (g,gi) being the maximum of sig_s(gi->g)/sig_t(g)
+        over all materials
+        '''
+        return np.amax([self._sigses[mid]*self._isigts[mid][:,np.newaxis]
+                        for mid in self._mids], axis=0)
+
+    def is_adjoint(self):
+        return self._adjoint
+
+    def set_sflxes(self, g, sflx):
+        '''@brief Function used to overwrite the scalar flux of Group g
+
+        @param g Target group number
+        @param sflx Scalar flux values
+        '''
+        np.copyto(self._sflxes[g], sflx)
+
+    def get_group_state(self, g):
+        '''@brief Function used to retrieve the solution of Group g, e.g. to pass
+        it between processes
+
+        @param g Target group number
+        @return Dictionary containing scalar flux of Group g
+        '''
+        return {'sflx':self._sflxes[g]}
+
+    def set_group_state(self, g, state):
+        '''@brief Function used to overwrite the solution of Group g
+
+        @param g Target group number
+        @param state Dictionary in the format returned by get_group_state
+        '''
+        np.copyto(self._sflxes[g], state['sflx'])
+
     def get_sflxes(self, g):
         '''@brief Function called outside to retrieve the scalar flux value for Group g
 
@@ -264,11 +667,26 @@ class NDA(object):
         '''
         return self._keff
 
+    def set_keff(self, keff):
+        '''@brief Function used to overwrite keff and to update the fission
+        source accordingly
+
+        @param keff Target keff
+        '''
+        self._keff = keff
+        self._global_fiss_src = self._calculate_fiss_src()
+
     def do_ua(self):
         return self._do_ua
 
+    def do_block_thermal(self):
+        return self._block_thermal
+
     def n_dof(self):
         return self._mesh.n_node()
 
     def n_grp(self):
         return self._n_grp
+
+    def g_thr(self):
+        return self._g_thr
@@ -0,0 +1,130 @@
+import numpy as np
+from numpy.linalg import norm
+
+'''
+class used to accelerate the fission source iterate of eigenvalue iterations
+'''
+class OuterAccel(object):
+    def __init__(self, prob_dict):
+        '''@brief Constructor of outer iteration accelerator
+
+        @param prob_dict Problem dictionary. 'outer_accel' selects anderson,
+        aitken or chebyshev, 'anderson_depth' sets the Anderson history depth
+        '''
+        self._method = prob_dict.get('outer_accel')
+        assert self._method in ('anderson','aitken','chebyshev'),\
+        'Outer acceleration method is not supported'
+        self._depth = prob_dict.get('anderson_depth', 3)
+        assert self._depth>0, 'Anderson depth has to be positive'
+        # number of chebyshev extrapolations before the ratio is re-estimated
+        self._cycle = 8
+        self.reset()
+
+    def reset(self):
+        '''@brief Function used to clear iteration history, e.g. before a new
+        eigenvalue solve
+        '''
+        # fixed point inputs and outputs of previous outer iterations
+        self._xs,self._gs = [],[]
+        # chebyshev cycle data
+        self._p,self._res_prev,self._sigma = 0,None,None
+
+    def accelerate(self, equ_cls, sflxes_prev):
+        '''@brief Function used to extrapolate scalar fluxes after one outer
+        iteration
+
+        The iterate is the normalized scalar flux over all groups. If the
+        accelerated flux is negative anywhere, the plain iterate is kept and
+        the history is cleared.
+        @param equ_cls Equation class instance, SAAF or NDA
+        @param sflxes_prev Dictionary of scalar fluxes before the outer iteration
+        @return Boolean to tell if accelerated fluxes are set in equ_cls
+        '''
+        n_grp = equ_cls.n_grp()
+        x = np.concatenate([sflxes_prev[g] for g in xrange(n_grp)])
+        gx = np.concatenate([equ_cls.get_sflxes(g) for g in xrange(n_grp)])
+        scale = norm(gx,1)
+        x,gx = x/norm(x,1),gx/scale
+        self._xs.append(x)
+        self._gs.append(gx)
+        if self._method=='anderson':
+            sflx = self._anderson()
+        elif self._method=='aitken':
+            sflx = self._aitken()
+        else:
+            sflx = self._chebyshev()
+        if sflx is None:
+            return False
+        if sflx.min()<0:
+            self.reset()
+            return False
+        # keep the magnitude of the plain iterate for keff update
+        sflx *= scale/norm(sflx,1)
+        n_dof = equ_cls.n_dof()
+        for g in xrange(n_grp):
+            equ_cls.set_sflxes(g, sflx[g*n_dof:(g+1)*n_dof])
+        return True
+
+    def _anderson(self):
+        '''@brief Internal function used to generate Anderson mixing iterate
+
+        @return Accelerated iterate or None if history is too short
+        '''
+        del self._xs[:-(self._depth+1)],self._gs[:-(self._depth+1)]
+        if len(self._xs)<2:
+            return None
+        fs = [gx-x for x,gx in zip(self._xs,self._gs)]
+        dfs = np.array([fs[i+1]-fs[i] for i in xrange(len(fs)-1)]).T
+        dgs = np.array([self._gs[i+1]-self._gs[i] for i in xrange(len(fs)-1)]).T
+        gamma = np.linalg.lstsq(dfs, fs[-1], rcond=None)[0]
+        return self._gs[-1] - np.dot(dgs, gamma)
+
+    def _aitken(self):
+        '''@brief Internal function used to generate Aitken extrapolation from
+        the latest three iterates
+
+        The error ratio is estimated from successive differences over all
+        components and the dominant error mode is removed.
+        @return Accelerated iterate or None if history is too short
+        '''
+        del self._xs[:-2],self._gs[:-2]
+        if len(self._gs)<2:
+            return None
+        x0,x1,x2 = self._xs[0],self._gs[0],self._gs[1]
+        d1,d2 = x1-x0,x2-x1
+        sigma = np.dot(d2,d1)/np.dot(d1,d1)
+        # three fresh iterates are needed before the next extrapolation
+        self._xs,self._gs = [],[]
+        if not 0.0<sigma<1.0:
+            return None
+        return x2 + sigma/(1.-sigma)*d2
+
+    def _chebyshev(self):
+        '''@brief Internal function used to generate Chebyshev extrapolation
+
+        The dominance ratio is estimated from successive residuals of plain
+        iterates and frozen over one cycle of extrapolations.
+        @return Accelerated iterate or None if a plain iterate is used
+        '''
+        del self._xs[:-2],self._gs[:-2]
+        res = norm(self._gs[-1]-self._xs[-1],1)
+        res_prev,self._res_prev = self._res_prev,res
+        if self._p==0:
+            # plain iterations until the dominance ratio estimate is available
+            if res_prev is None or not 0.0<res/res_prev<1.0:
+                return None
+            self._sigma = res/res_prev
+        elif self._p>=self._cycle or res>res_prev:
+            # restart the cycle with a plain iterate
+            self._p,self._res_prev = 0,None
+            return None
+        x,x_prev,gx = self._xs[-1],self._xs[-2],self._gs[-1]
+        self._p += 1
+        sigma = self._sigma
+        if self._p==1:
+            alpha,beta = 2./(2.-sigma),0.0
+        else:
+            gamma = np.arccosh(2./sigma-1.)
+            alpha = 4./sigma*np.cosh((self._p-1)*gamma)/np.cosh(self._p*gamma)
+            beta = (1.-sigma/2.)*alpha - 1.
+        return x + alpha*(gx-x) + beta*(x-x_prev)
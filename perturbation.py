@@ -0,0 +1,130 @@
+import numpy as np
+from elem import get_elem
+from incremental import diff_materials
+
+'''
+class used to estimate keff changes of perturbations with first-order
+perturbation theory from solved forward and adjoint eigenvalue problems
+'''
+class Perturbation(object):
+    def __init__(self, mat_cls, mesh_cls, fwd_cls, adj_cls):
+        '''@brief Constructor of perturbation class
+
+        Inner products of adjoint and forward fluxes are computed once per cell,
+        such that every perturbation costs sums over few cells or materials
+        without re-solves. For L*phi = F*phi/k, the change of 1/k is
+        d(1/k) = <phi*,(dL-dF/k)phi>/<phi*,F*phi>. For SAAF, the collision term
+        is integrated with angular fluxes in the first-order transport form. For
+        NDA, the diffusion operator without HO correction is used.
+        @param mat_cls Material library of the forward problem
+        @param mesh_cls Mesh of both problems
+        @param fwd_cls Solved forward SAAF or NDA instance
+        @param adj_cls Solved adjoint instance of the same equation
+        '''
+        assert fwd_cls.name()==adj_cls.name(), 'Forward and adjoint equations must match'
+        assert adj_cls.is_adjoint() and not fwd_cls.is_adjoint(), 'Adjoint solution is required'
+        self._name = fwd_cls.name()
+        self._keff = fwd_cls.get_keff()
+        self._n_grp = mat_cls.get('n_grps')
+        cells = mesh_cls.cells()
+        self._cell_mids = [cell.get('id') for cell in cells]
+        cell_idx = np.array([cell.global_idx() for cell in cells])
+        elem = get_elem(mesh_cls.cell_length())
+        grps = xrange(self._n_grp)
+        # vertex fluxes per cell: (n_grp,n_cell,4)
+        fwd = np.array([fwd_cls.get_sflxes(g)[cell_idx] for g in grps])
+        adj = np.array([adj_cls.get_sflxes(g)[cell_idx] for g in grps])
+        # <phi*_g,phi_gi> per cell: (n_cell,n_grp,n_grp)
+        self._mass_prods = np.einsum('gca,ab,hcb->cgh', adj, elem.mass(), fwd)
+        # products weighted by the removal-like xsecs per cell: (n_cell,n_grp)
+        if self._name=='nda':
+            # leakage term weighted by diffusion coefficients
+            self._coll_prods = np.einsum('gca,ab,gcb->cg', adj, elem.streaming(), fwd)
+        else:
+            # collision term with angular fluxes
+            self._coll_prods = np.zeros((len(cells),self._n_grp))
+            for g in grps:
+                aq = fwd_cls.aq_data(g)
+                assert adj_cls.aq_data(g)['n_dir']==aq['n_dir'], 'Sn orders must match'
+                for d,(aflx,aflx_adj) in enumerate(zip(fwd_cls.get_aflxes(g),
+                                                       adj_cls.get_aflxes(g))):
+                    self._coll_prods[:,g] += aq['wt'][d]*np.einsum(
+                    'ca,ab,cb->c', aflx_adj[cell_idx], elem.mass(), aflx[cell_idx])
+        # products summed per material for library perturbations
+        mids = np.array(self._cell_mids)
+        self._mat_prods = {mid:(self._mass_prods[mids==mid].sum(axis=0),
+                                self._coll_prods[mids==mid].sum(axis=0))
+                           for mid in set(self._cell_mids)}
+        # xsecs of the forward problem
+        self._xses = self._lib_xses(mat_cls)
+        # production <phi*,F*phi>
+        self._prod = sum(np.sum(self._xses[mid][2]*mass)
+                         for mid,(mass,coll) in self._mat_prods.items())
+
+    def _lib_xses(self, mat_cls):
+        '''@brief Internal function used to collect the xsecs of all materials
+        in a library in the form used by the inner products
+
+        @return Dictionary of tuples of the xsec weighting collision products,
+        the loss matrix and the fission matrix per material
+        '''
+        n_grp = self._n_grp
+        sigts,dcoefs,sigrs = mat_cls.get('sig_t'),mat_cls.get('diff_coef'),mat_cls.get('sig_r')
+        sigses,fiss_xsecs = mat_cls.get('sig_s'),mat_cls.get('chi_nu_sig_f')
+        xses = {}
+        for mid in mat_cls.ids():
+            fiss = fiss_xsecs.get(mid, np.zeros((n_grp,n_grp)))
+            if self._name=='nda':
+                # removal on the diagonal and scattering from other groups
+                loss = np.diag(sigrs[mid]) - (sigses[mid]-np.diag(np.diag(sigses[mid])))
+                xses[mid] = (dcoefs[mid],loss,fiss)
+            else:
+                # isotropic sources per steradian act on scalar fluxes
+                xses[mid] = (sigts[mid],-sigses[mid]/(4.0*np.pi),fiss/(4.0*np.pi))
+        return xses
+
+    def _dlam(self, dxs, mass, coll):
+        '''@brief Internal function used to compute the change of 1/k
+
+        @param dxs Tuple of xsec changes in the form of _lib_xses
+        @param mass Summed <phi*_g,phi_gi> of the perturbed cells
+        @param coll Summed collision or leakage products of the perturbed cells
+        '''
+        dcoll,dloss,dfiss = dxs
+        return (np.dot(dcoll, coll) + np.sum(dloss*mass) -
+                np.sum(dfiss*mass)/self._keff) / self._prod
+
+    def _dk(self, dlam):
+        '''@brief Internal function used to convert the change of 1/k to the
+        first-order change of keff
+        '''
+        return -self._keff**2*dlam
+
+    def layout_worth(self, mesh_cls):
+        '''@brief Function used to estimate the keff change of replacing
+        materials of cells, e.g. of a layout_dict variant with a control rod
+
+        @param mesh_cls Mesh with the same cells and changed materials
+        @return First-order change of keff
+        '''
+        cell_mids = [cell.get('id') for cell in mesh_cls.cells()]
+        dlam = 0.0
+        for c in diff_materials(self._cell_mids, cell_mids):
+            old,new = self._xses[self._cell_mids[c]],self._xses[cell_mids[c]]
+            dxs = tuple(x_new-x_old for x_new,x_old in zip(new,old))
+            dlam += self._dlam(dxs, self._mass_prods[c], self._coll_prods[c])
+        return self._dk(dlam)
+
+    def library_worth(self, mat_cls):
+        '''@brief Function used to estimate the keff change of perturbed
+        xsecs, e.g. for sensitivity studies
+
+        @param mat_cls Perturbed material library with the same material ids.
+        Derived xsecs must be consistent with the perturbed ones
+        @return First-order change of keff
+        '''
+        xses,dlam = self._lib_xses(mat_cls),0.0
+        for mid,(mass,coll) in self._mat_prods.items():
+            dxs = tuple(x_new-x_old for x_new,x_old in zip(xses[mid],self._xses[mid]))
+            dlam += self._dlam(dxs, mass, coll)
+        return self._dk(dlam)
@@ -0,0 +1,121 @@
+import os
+import glob
+import json
+import hashlib
+import numpy as np
+
+# problem keys not affecting the solution
+_IGNORED_KEYS = ('checkpoint_file','checkpoint_every','restart_file','n_workers',
+                 'cache_dir','cache_size','woodbury_max_rank','rom_tol',
+                 'rom_pod_tol')
+# problem keys defining the physics independent of discretization
+_PHYSICS_KEYS = ('layout','layout_dict','materials','groups','domain_upper',
+                 'tr_scatt')
+
+def _canonical(problem, keys):
+    '''@brief Internal function used to generate a canonical string of problem
+    entries in keys
+
+    Layout whitespace is normalized and material files are represented by the
+    hash of their contents.
+    '''
+    canon = {}
+    for k in keys:
+        v = problem[k]
+        if k=='layout':
+            v = ' '.join(v.split())
+        elif k=='materials':
+            v = [hashlib.sha256(open(f, 'rb').read()).hexdigest() for f in v]
+        canon[k] = v
+    return json.dumps(canon, sort_keys=True, default=repr)
+
+def problem_keys(problem):
+    '''@brief Function used to hash a problem dictionary
+
+    @param problem Problem dictionary
+    @return Tuple of physics key, shared by problems differing only in
+    discretization and solver options, and full key
+    '''
+    physics = filter(lambda k: k in problem, _PHYSICS_KEYS)
+    full = filter(lambda k: k not in _IGNORED_KEYS, problem.keys())
+    sha = lambda s: hashlib.sha256(s).hexdigest()[:32]
+    return sha(_canonical(problem, physics)),sha(_canonical(problem, full))
+
+'''
+class used to store solutions of problems on local disk with least recently
+used eviction
+'''
+class ResultCache(object):
+    def __init__(self, cache_dir, max_bytes=2**30):
+        '''@brief Constructor of result cache
+
+        @param cache_dir Directory of cached results
+        @param max_bytes Total size of cached results kept on disk
+        '''
+        self._dir = cache_dir
+        self._max_bytes = max_bytes
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    def _filename(self, physics, full):
+        return os.path.join(self._dir, '%s_%s.npz' % (physics,full))
+
+    def _load(self, filename):
+        '''@brief Internal function used to load a result and mark it as used
+        '''
+        with np.load(filename) as data:
+            result = {k:data[k] for k in data.files}
+        os.utime(filename, None)
+        return result
+
+    def get(self, problem):
+        '''@brief Function used to retrieve the result of the same problem
+
+        @param problem Problem dictionary
+        @return Result dictionary or None if not cached
+        '''
+        filename = self._filename(*problem_keys(problem))
+        if not os.path.exists(filename):
+            return None
+        return self._load(filename)
+
+    def get_partial(self, problem):
+        '''@brief Function used to retrieve the latest used result of a problem
+        with the same physics, e.g. on another mesh or Sn order, as initial guess
+
+        @param problem Problem dictionary
+        @return Result dictionary or None if not cached
+        '''
+        physics,full = problem_keys(problem)
+        filenames = glob.glob(self._filename(physics, '*'))
+        if not filenames:
+            return None
+        return self._load(max(filenames, key=os.path.getmtime))
+
+    def put(self, problem, result):
+        '''@brief Function used to store a result and evict least recently used
+        results beyond the size limit
+
+        @param problem Problem dictionary
+        @param result Dictionary of arrays and scalars
+        '''
+        filename = self._filename(*problem_keys(problem))
+        tmp = filename + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(f, **result)
+        os.rename(tmp, filename)
+        self._evict()
+
+    def _evict(self):
+        '''@brief Internal function used to remove least recently used results
+        until the total size is within the limit
+        '''
+        filenames = sorted(glob.glob(os.path.join(self._dir, '*.npz')),
+                           key=os.path.getmtime)
+        size = sum(os.path.getsize(f) for f in filenames)
+        # the latest result is always kept
+        for f in filenames[:-1]:
+            if size<=self._max_bytes:
+                break
+            size -= os.path.getsize(f)
+            os.remove(f)
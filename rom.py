@@ -0,0 +1,131 @@
+import numpy as np
+from scipy import linalg
+from numpy.linalg import norm
+import material
+import mesh
+from nda import NDA
+from eigen_iterations import Eigen
+
+def pod_basis(snapshots, pod_tol=1.0e-8):
+    '''@brief Function used to build a proper orthogonal decomposition basis
+
+    @param snapshots List of snapshot vectors
+    @param pod_tol Fraction of snapshot energy allowed to be discarded
+    @return Orthonormal basis as columns of an array
+    '''
+    mat = np.array([s/norm(s) for s in snapshots]).T
+    u,sig,vt = linalg.svd(mat, full_matrices=False)
+    energy = np.cumsum(sig**2)/np.sum(sig**2)
+    rank = np.searchsorted(energy, 1.0-pod_tol) + 1
+    return u[:,:min(rank,len(sig))]
+
+'''
+class used to answer keff and flux queries of layout_dict variants with
+diffusion operators projected onto a basis of solved fluxes
+'''
+class ROM(object):
+    def __init__(self, mat_cls, problem):
+        '''@brief Constructor of reduced-order model
+
+        NDA operators without HO correction are projected, as they are the ones
+        assembled as global matrices. Operators of variants are updated from the
+        base problem on changed cells only.
+        @param mat_cls Material library
+        @param problem Base problem dictionary
+        '''
+        self._mat_cls = mat_cls
+        self._problem = problem
+        # residual beyond which queries fall back to full solves
+        self._tol = problem.get('rom_tol', 2.0e-2)
+        self._pod_tol = problem.get('rom_pod_tol', 1.0e-8)
+        self._nda = NDA(mat_cls=mat_cls, mesh_cls=self._mesh(problem['layout_dict']),
+                        prob_dict=problem)
+        self._nda.assemble_bilinear_forms(correction=False)
+        self._n_dof,self._n_grp = self._nda.n_dof(),self._nda.n_grp()
+        self._snapshots = []
+        self._basis = None
+
+    def _mesh(self, layout_dict):
+        '''@brief Internal function used to build the mesh of a layout_dict
+        '''
+        mat_map = material.mat_map(lib=self._mat_cls, layout=self._problem['layout'],
+                                   layout_dict=layout_dict,
+                                   x_max=self._problem['domain_upper'],
+                                   n=self._problem['mesh_cells'])
+        return mesh.Mesh(self._problem['mesh_cells'], self._problem['domain_upper'], mat_map)
+
+    def _variant(self, layout_dict):
+        '''@brief Internal function used to switch NDA to a variant
+
+        @param layout_dict Entries of layout_dict to change
+        '''
+        self._nda.update_materials(self._mesh(dict(self._problem['layout_dict'],
+                                                   **layout_dict)))
+
+    def _full_solve(self):
+        '''@brief Internal function used to solve the current variant fully and
+        to add its fluxes to the snapshots
+
+        @return keff
+        '''
+        Eigen(self._problem).eigen_iterations(self._nda)
+        self.add_snapshot(self._nda)
+        return self._nda.get_keff()
+
+    def add_snapshot(self, equ_cls):
+        '''@brief Function used to add fluxes of a solved problem to snapshots
+
+        The basis is rebuilt before the next query.
+        @param equ_cls Solved equation class instance on the base mesh
+        '''
+        self._snapshots.append(np.concatenate([equ_cls.get_sflxes(g)
+                                               for g in xrange(self._n_grp)]))
+        self._basis = None
+
+    def train(self, layout_dicts):
+        '''@brief Function used to collect snapshots with full solves
+
+        @param layout_dicts List of entries of layout_dict to change
+        '''
+        for layout_dict in layout_dicts:
+            self._variant(layout_dict)
+            self._full_solve()
+
+    def query(self, layout_dict):
+        '''@brief Function used to estimate keff and fluxes of a variant
+
+        The Galerkin projection V^T*L*V x = V^T*F*V x/k is solved for the
+        largest k. The relative residual |L*phi-F*phi/k|/|F*phi/k| of the
+        prolonged flux estimates the error. If it exceeds 'rom_tol', the variant
+        is solved fully and added to the snapshots.
+        @param layout_dict Entries of layout_dict to change
+        @return Dictionary of keff, scalar fluxes per group, residual of the
+        reduced solution and whether a full solve was done
+        '''
+        assert self._snapshots, 'ROM has to be trained with full solves first'
+        self._variant(layout_dict)
+        if self._basis is None:
+            self._basis = pod_basis(self._snapshots, self._pod_tol)
+        basis = self._basis
+        loss,fiss = self._nda.block_matrices()
+        ks,xs = linalg.eig(basis.T.dot(fiss.dot(basis)), basis.T.dot(loss.dot(basis)))
+        # infinite eigenvalues of singular projected operators are skipped
+        i = np.argmax(np.where(np.isfinite(ks), ks.real, -np.inf))
+        keff,sflx = ks[i].real,basis.dot(xs[:,i].real)
+        sflx /= np.sum(sflx)
+        src = fiss.dot(sflx)/keff
+        res = norm(loss.dot(sflx)-src)/norm(src)
+        # NaN residuals of degenerate reduced solutions fall back as well
+        result = {'residual':res, 'full_solve':not res<=self._tol}
+        if result['full_solve']:
+            if np.isfinite(keff) and np.all(np.isfinite(sflx)):
+                # reduced solution is the initial guess of the full solve
+                for g in xrange(self._n_grp):
+                    self._nda.set_sflxes(g, sflx[g*self._n_dof:(g+1)*self._n_dof])
+                self._nda.set_keff(keff)
+            keff = self._full_solve()
+            sflx = self._snapshots[-1]
+        result.update({'keff':keff,
+                       'sflxes':{g:sflx[g*self._n_dof:(g+1)*self._n_dof]
+                                 for g in xrange(self._n_grp)}})
+        return result
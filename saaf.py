@@ -3,8 +3,13 @@ from scipy import sparse as sps
 from scipy.sparse import linalg as sla
 from itertools import product as pd
 from numpy.linalg import norm
-from elem import Elem
-from aq import AQ
+from elem import get_elem
+from aq import get_aq_data
+import incremental
+
+# mesh names boundaries by cell index (i,j), of which i runs along y, while aq
+# and elem data name boundaries by coordinates
+_BD_NAMES = {'x_min':'ymin','x_max':'ymax','y_min':'xmin','y_max':'xmax'}
 
 class SAAF(object):
     def __init__(self, mat_cls, mesh_cls, prob_dict):
@@ -17,10 +22,11 @@ class SAAF(object):
         self._keff = 1.0
         self._keff_prev = 1.0
         # preassembly-interpolation data
-        self._elem = Elem(self._cell_length)
+        self._elem = get_elem(self._cell_length)
         # material data
         self._n_grp = mat_cls.get('n_grps')
-        self._g_thr = mat_cls.get('g_thermal')
+        # first thermal group over all materials
+        self._g_thr = int(min(mat_cls.get('g_thermal').values()))
         self._sigts = mat_cls.get('sig_t')
         self._isigts = mat_cls.get('inv_sig_t')
         self._fiss_xsecs = mat_cls.get_per_str('chi_nu_sig_f')
@@ -30,12 +36,29 @@ class SAAF(object):
         self._mids = mat_cls.ids()
         # derived material data
         self._ksi_ua = mat_cls.get('ksi_ua')
+        self._dcoefs_ua = mat_cls.get('diff_coef_ua')
+        self._sigrs_ua = mat_cls.get('sig_r_ua')
+        # scattering xsecs integrated over angle, used in diffusion corrections
+        self._sigses_full = mat_cls.get('sig_s')
+        # adjoint problem: scattering and fission matrices are transposed, which
+        # couples every group to lower energy groups so all groups are iterated
+        self._adjoint = prob_dict.get('adjoint', False)
+        if self._adjoint:
+            self._fiss_xsecs,self._sigses,self._sigses_full = [
+            {mid:np.transpose(v) for mid,v in xs.items()}
+            for xs in (self._fiss_xsecs,self._sigses,self._sigses_full)]
+            self._g_thr = 0
         # problem type: is problem eigenvalue problem
-        # aq data in forms of dictionary
-        self._aq = AQ(prob_dict['sn_order']).get_aq_data()
-        self._n_dir = self._aq['n_dir']
+        self._is_eigen = prob_dict.get('is_eigen_problem', True)
+        # aq data in forms of dictionary per group. Groups may use different Sn
+        # orders from 'sn_orders', and groups with the same order share aq data
+        sn_orders = prob_dict.get('sn_orders') or [prob_dict['sn_order']]*self._n_grp
+        assert len(sn_orders)==self._n_grp, 'Sn order must be given for every group'
+        aqs = {sn:get_aq_data(sn) for sn in set(sn_orders)}
+        self._aqs = {g:aqs[sn] for g,sn in enumerate(sn_orders)}
+        self._n_dirs = {g:self._aqs[g]['n_dir'] for g in xrange(self._n_grp)}
         # total number of components in HO
-        self._n_tot = self._n_grp * self._n_dir
+        self._n_tot = sum(self._n_dirs.values())
         # get a component indexing mapping
         self._comp = dict()
         # component to group map
@@ -57,13 +80,35 @@ class SAAF(object):
         self._sflxes = {k:np.ones(self._n_dof) for k in xrange(self._n_grp)}
         # linear solver objects
         self._lu = {}
+        # largest low-rank correction of factorizations in material updates
+        self._max_rank = prob_dict.get('woodbury_max_rank', 32)
         # source iteration tol
         self._tol = 1.0e-7
+        self._tol_min = self._tol
+        # number of transport sweeps in source iterations of all groups
+        self._n_sweep = 0
+        # diffusion synthetic acceleration for source iteration
+        self._do_dsa = prob_dict.get('do_dsa', False)
+        self._dsa_lu = {}
+        # angular multigrid acceleration on a coarse angular quadrature
+        self._do_amg = prob_dict.get('do_amg', False)
+        assert not (self._do_dsa and self._do_amg), 'DSA and angular multigrid are exclusive'
+        if self._do_amg:
+            self._aq_amg = get_aq_data(prob_dict.get('amg_sn_order', 2))
+            assert self._aq_amg['n_dir']<min(self._n_dirs.values()), 'Coarse Sn order must be lower'
+        self._amg_mats,self._amg_lu = {},{}
+        # two-grid upscattering acceleration of thermal multigroup iterations
+        self._do_ua = prob_dict['do_ua']
+        assert not (self._adjoint and self._do_ua), 'UA is not available for adjoint problems'
+        self._ua_lu = None
         # fission source
         self._global_fiss_src = self._calculate_fiss_src()
         self._global_fiss_src_prev = self._global_fiss_src
         # assistance:
-        self._local_dof_pairs = pd(xrange(4),xrange(4))
+        self._local_dof_pairs = list(pd(xrange(4),xrange(4)))
+        # cell vertex indices and material ids for batched computations
+        self._cell_idx = np.array([cell.global_idx() for cell in mesh_cls.cells()])
+        self._cell_mids = [cell.get('id') for cell in mesh_cls.cells()]
 
     def _generate_component_map(self):
         '''@brief Internal function used to generate mappings between component,
@@ -71,7 +116,7 @@ class SAAF(object):
         '''
         ct = 0
         for g in xrange(self._n_grp):
-            for d in xrange(self._n_dir):
+            for d in xrange(self._n_dirs[g]):
                 self._comp[(g,d)] = ct
                 self._comp_grp[ct] = g
                 self._comp_dir[ct] = d
@@ -79,15 +124,26 @@ class SAAF(object):
 
     def _preassembly_rhs(self):
         for mid in self._mids:
-            sigts,isigts = self._sigts[mid],self._isigts[mid]
+            self._rhs_mats[mid] = dict()
             for g in xrange(self._n_grp):
-                for d in xrange(self._n_dir):
-                    ox,oy = self._aq['omega'][d]
-                    # streaming part of rhs
-                    rhs_mat = (ox*self._elem.dxvu()+oy*self._elem.dyvu())*isigts[g]
-                    # mass part of rhs
-                    rhs_mat += sigts[g]*self._elem.mass()
-                    self._rhs_mats[mid] = {(g,d):rhs_mat}
+                for d in xrange(self._n_dirs[g]):
+                    self._rhs_mats[mid][(g,d)] = self._local_rhs_mat(
+                    mid, g, self._aqs[g]['omega'][d])
+
+    def _local_rhs_mat(self, mid, g, omega):
+        '''@brief Internal function used to generate the local matrix applied to
+        isotropic sources at vertices for direction omega
+
+        @param mid Material id
+        @param g Group index
+        @param omega Direction vector
+        '''
+        ox,oy = omega
+        # streaming part of rhs
+        rhs_mat = (ox*self._elem.dxvu()+oy*self._elem.dyvu())*self._isigts[mid][g]
+        # mass part of rhs
+        rhs_mat += self._elem.mass()
+        return rhs_mat
 
     def name(self):
         return self._name
@@ -98,64 +154,132 @@ class SAAF(object):
         @param correction Boolean to determine if correction is needed. Only useful
         in NDA class
         '''
-        # retrieve all the material properties
         for i in xrange(self._n_tot):
             # get the group and direction indices
             g,d = self._comp_grp[i],self._comp_dir[i]
-            # get omega_i * omega_j combinations
-            oxox,oxoy,oyoy = self._aq['dir_prods'][d].values()
-            # dict containing lhs local matrices for all materials for component i
-            lhs_mats = dict()
-            for mid in self._mids:
-                sigt,isigt = self._sigts[mid][g],self._isigts[mid][g]
-                # streaming lhs
-                matx = isigt * (oxox*self._elem.dxdx() +
-                                oxoy*(self._elem.dxdy() + self._elem.dydx()) +
-                                oyoy*self._elem.dydy())
-                # collision matrix
-                matx += sigt * self._elem.mass()
-                lhs_mats[mid] = matx
-            # loop over cells for assembly
-            # sys_mat: temp variable for system matrix for one component
-            sys_mat = sps.lil_matrix((self._mesh.n_node(), self._mesh.n_node()))
-            for cell in self._mesh.cells():
-                # retrieving global indices and material id per cell
-                idx,mid = cell.global_idx(),cell.get('id')
-                # mapping local matrices to global
-                for ci,cj in self._local_dof_pairs:
-                    sys_mat[idx[ci],idx[cj]] += lhs_mats[mid][ci][cj]
-                # boundary part
-                if cell.bounds():
-                    # loop over
-                    for bd in cell.bounds().keys():
-                        if self._aq['bd_angle'][(bd,d)]>0:
-                            #outgoing boundary assembly: retrieving omega*n and boundary mass matrices
-                            odn,bd_mass = self._aq['bd_angle'][(bd,d)],self._elem.bdmt()[bd]
-                            # mapping local vertices to global
-                            for ci,cj in self._local_dof_pairs:
-                                if bd_mass[ci][cj]>1.0e-14:
-                                    sys_mat[idx[ci],idx[cj]] += odn*bd_mass[ci][cj]
-
-            # transform lil_matrix to csc_matrix for efficient computation
-            self._sys_mats[i] = sps.csc_matrix(sys_mat)
-
-    def assemble_fixed_linear_forms(self, sflxes_prev=None, nda_cls=None):
+            self._sys_mats[i] = self._assemble_component_matrix(g, d, self._aqs[g])
+
+    def _assemble_component_matrix(self, g, d, aq):
+        '''@brief Internal function used to assemble system matrix of Group g in
+        Direction d of angular quadrature aq
+
+        @param g Group index
+        @param d Direction index in aq
+        @param aq Angular quadrature data dictionary
+        @return csc_matrix of the component
+        '''
+        # dict containing lhs local matrices for all materials for the component
+        lhs_mats = self._local_lhs_mats(g, d, aq)
+        # loop over cells for assembly
+        # sys_mat: temp variable for system matrix for one component
+        sys_mat = sps.lil_matrix((self._mesh.n_node(), self._mesh.n_node()))
+        for cell in self._mesh.cells():
+            # retrieving global indices and material id per cell
+            idx,mid = cell.global_idx(),cell.get('id')
+            # mapping local matrices to global
+            for ci,cj in self._local_dof_pairs:
+                sys_mat[idx[ci],idx[cj]] += lhs_mats[mid][ci][cj]
+            # boundary part
+            if cell.bounds():
+                # loop over
+                for bd,tp in self._cell_bounds(cell):
+                    if aq['bd_angle'][(bd,d)]>0:
+                        #outgoing boundary assembly: retrieving omega*n and boundary mass matrices
+                        odn,bd_mass = aq['bd_angle'][(bd,d)],self._elem.bdmt()[bd]
+                        # mapping local vertices to global
+                        for ci,cj in self._local_dof_pairs:
+                            if bd_mass[ci][cj]>1.0e-14:
+                                sys_mat[idx[ci],idx[cj]] += odn*bd_mass[ci][cj]
+        # transform lil_matrix to csc_matrix for efficient computation
+        return sps.csc_matrix(sys_mat)
+
+    def _cell_bounds(self, cell):
+        '''@brief Internal function used to get boundaries of a cell named as in
+        aq and elem data
+
+        @param cell Mesh cell
+        @return List of tuples of boundary name and type
+        '''
+        return [(_BD_NAMES[bd],tp) for bd,tp in cell.bounds().items()]
+
+    def _local_lhs_mats(self, g, d, aq):
+        '''@brief Internal function used to generate local lhs matrices of all
+        materials for Group g in Direction d of angular quadrature aq
+
+        @return Dictionary of local matrices keyed by material id
+        '''
+        # get omega_i * omega_j combinations
+        prods = aq['dir_prods'][d]
+        oxox,oxoy,oyoy = prods['oxox'],prods['oxoy'],prods['oyoy']
+        lhs_mats = dict()
+        for mid in self._mids:
+            sigt,isigt = self._sigts[mid][g],self._isigts[mid][g]
+            # streaming lhs
+            matx = isigt * (oxox*self._elem.dxdx() +
+                            oxoy*(self._elem.dxdy() + self._elem.dydx()) +
+                            oyoy*self._elem.dydy())
+            # collision matrix
+            matx += sigt * self._elem.mass()
+            lhs_mats[mid] = matx
+        return lhs_mats
+
+    def update_materials(self, mesh_cls):
+        '''@brief Function used to change materials of a few cells, e.g. to insert
+        a control rod, without reassembling and refactorizing everything
+
+        Contributions of changed cells are replaced in system matrices, and
+        factorizations are corrected with low-rank updates up to
+        'woodbury_max_rank' touched dofs, beyond which they are refactorized.
+        Diffusion operators of DSA, angular multigrid and upscattering
+        acceleration are rebuilt when next used.
+        @param mesh_cls Mesh with the same cells and changed materials
+        '''
+        cell_mids = [cell.get('id') for cell in mesh_cls.cells()]
+        changed = incremental.diff_materials(self._cell_mids, cell_mids)
+        self._mesh = mesh_cls
+        old_mids,self._cell_mids = self._cell_mids,cell_mids
+        if len(changed):
+            for i in self._sys_mats.keys():
+                g,d = self._comp_grp[i],self._comp_dir[i]
+                lhs_mats = self._local_lhs_mats(g, d, self._aqs[g])
+                cell_mats = [lhs_mats[cell_mids[c]]-lhs_mats[old_mids[c]] for c in changed]
+                delta = incremental.cell_delta_matrix(self._cell_idx[changed], cell_mats,
+                                                      self._n_dof)
+                self._sys_mats[i] = self._sys_mats[i] + delta
+                if i in self._lu:
+                    lu = incremental.update_factorization(self._lu[i], delta,
+                                                          self._max_rank)
+                    if lu is None:
+                        del self._lu[i]
+                    else:
+                        self._lu[i] = lu
+            self._dsa_lu.clear()
+            self._amg_lu.clear()
+            self._amg_mats.clear()
+            self._ua_lu = None
+        # fission source is consistent with new materials for keff updates
+        self._global_fiss_src = self._calculate_fiss_src()
+
+    def assemble_fixed_linear_forms(self, sflxes_prev=None, nda_cls=None, keff=None):
         '''@brief a function used to assemble fixed source or fission source on the
         rhs for all components
 
         Generate fission source. If nda_cls is not None, sflxes_prev is ignored
+        @param keff keff used to scale fission source. Current keff is used if not
+        given
         '''
         if not nda_cls:
             assert sflxes_prev is not None, 'scalar flux must be provided'
+        keff = keff or self._keff
         # get properties per str scaled by keff
         for cp in xrange(self._n_tot):
             # re-init fixed rhs. This must be done at the beginning of calling this function
-            self._fixed_rhses[cp] = np.array(self._n_dof)
+            self._fixed_rhses[cp] = np.zeros(self._n_dof)
             # get group and direction indices
             g,d = self._comp_grp[cp],self._comp_dir[cp]
             for cell in self._mesh.cells():
                 idx,mid = cell.global_idx(),cell.get('id')
-                fiss_src,fiss_xsec = np.zeros(4),self._fiss_xsecs[mid][g]
+                fiss_src,fiss_xsec = np.zeros(4),self._fiss_xsecs[mid][g]/keff
                 # get fission source contribution from ingroups
                 for gi in filter(lambda j: fiss_xsec[j]>1.0e-14, xrange(self._n_grp)):
                     sflx_vtx = sflxes_prev[gi][idx] if not nda_cls else \
@@ -172,7 +296,8 @@ class SAAF(object):
         assert 0<=g<self._n_grp, 'Group index out of range'
         if nda_cls:
             assert nda_cls.name()=='nda', 'Correct NDA class must be filled in'
-        for d in xrange(self._n_dir):
+        aq = self._aqs[g]
+        for d in xrange(self._n_dirs[g]):
             cp = self._comp[(g,d)]
             # get fixed/fission source
             # NOTE: due to pass-by-reference feature in Python, we have to make
@@ -194,13 +319,13 @@ class SAAF(object):
                     scat_bd_src += sigs[g,gi]*np.dot(self._rhs_mats[mid][(g,d)], sflx_vtx)
                 # if it's boundary
                 if cell.bounds():
-                    for bd,tp in cell.bounds().items():
+                    for bd,tp in self._cell_bounds(cell):
                         # incident boundary with reflective setting
-                        if tp=='refl' and self._aq['bd_angle'][(bd,d)]<0.0:
-                            r_dir = self._aq['refl_dir'][(bd,d)]
-                            odn = abs(self._aq['bd_angle'][(bd,d)])
+                        if tp=='refl' and aq['bd_angle'][(bd,d)]<0.0:
+                            r_dir = aq['refl_dir'][(bd,d)]
+                            odn = abs(aq['bd_angle'][(bd,d)])
                             bd_mass = self._elem.bdmt()[bd]
-                            bd_aflx = self._aflxes[self._comp(g,r_dir)][idx]
+                            bd_aflx = self._aflxes[self._comp[(g,r_dir)]][idx]
                             scat_bd_src += odn*np.dot(bd_mass,bd_aflx)
                 self._sys_rhses[cp][idx] += scat_bd_src
 
@@ -212,7 +337,8 @@ class SAAF(object):
         assert nda_cls is not None and nda_cls.name()=='nda', 'NDA has to be passed in to call'
         # NOTE: this is not the most efficient way as there is no need to separating
         # the assembly process here
-        self.assemble_fixed_linear_forms(sflxes_prev=None,nda_cls=nda_cls)
+        self.assemble_fixed_linear_forms(sflxes_prev=None,nda_cls=nda_cls,
+                                         keff=nda_cls.get_keff())
         for g in xrange(self._n_grp):
             self._assemble_group_linear_forms(g=g, nda_cls=nda_cls)
 
@@ -222,12 +348,16 @@ class SAAF(object):
         This function is to be called along with NDA providing rhs
         '''
         self._assemble_linear_forms(nda_cls=nda_cls)
+        for g in xrange(self._n_grp):
+            self._sflxes[g] *= 0
         for i in xrange(self._n_tot):
             if i not in self._lu:
                 # factorization
-                self._lu[i] = sla.splu(self._sys_mats[comp[(g,d)]])
+                self._lu[i] = sla.splu(self._sys_mats[i])
             # direct solve for angular fluxes
             self._aflxes[i] = self._lu[i].solve(self._sys_rhses[i])
+            g,d = self._comp_grp[i],self._comp_dir[i]
+            self._sflxes[g] += self._aqs[g]['wt'][d] * self._aflxes[i]
 
     def solve_in_group(self, g):
         '''@brief Called to solve direction by direction inside Group g
@@ -243,16 +373,153 @@ class SAAF(object):
             # copy scalar flux
             np.copyto(sflx_ig_prev, self._sflxes[g])
             self._sflxes[g] *= 0
-            for d in xrange(self._n_dir):
-                # if not factorized, factorize the the HO matrices
+            # if not factorized, factorize the the HO matrices
+            self.factorize_group(g)
+            self._n_sweep += 1
+            for d in xrange(self._n_dirs[g]):
                 cp = self._comp[(g,d)]
-                if cp not in self._lu:
-                    self._lu[cp] = sla.splu(self._sys_mats[cp])
                 # solve direction d
                 self._aflxes[cp] = self._lu[cp].solve(self._sys_rhses[cp])
-                self._sflxes[g] += self._aq['wt'][d] * self._aflxes[cp]
+                self._sflxes[g] += self._aqs[g]['wt'][d] * self._aflxes[cp]
+            # accelerate source iteration with diffusion correction
+            if self._do_dsa:
+                self._dsa_correction(g, sflx_ig_prev)
+            elif self._do_amg:
+                self._amg_correction(g, sflx_ig_prev)
             # calculate difference for SI convergence
-            e = norm(sflx_old_ig - self._sflxes[g],1) / norm (self._sflxes[g],1)
+            e = norm(sflx_ig_prev - self._sflxes[g],1) / norm (self._sflxes[g],1)
+
+    def factorize_group(self, g):
+        '''@brief A function used to factorize HO matrices of Group g if not yet
+
+        @param g Group index
+        '''
+        for d in xrange(self._n_dirs[g]):
+            cp = self._comp[(g,d)]
+            if cp not in self._lu:
+                self._lu[cp] = sla.splu(self._sys_mats[cp])
+        if self._do_dsa and g not in self._dsa_lu:
+            self._dsa_lu[g] = sla.splu(self._assemble_dsa_matrix(g))
+        elif self._do_amg and g not in self._amg_lu:
+            self._preassembly_amg(g)
+
+    def _assemble_dsa_matrix(self, g):
+        '''@brief Internal function used to assemble the diffusion operator for
+        DSA in Group g
+
+        Reflective boundaries have no boundary term, while other boundaries are
+        vacuum with Marshak conditions.
+        @param g Group index
+        @return csc_matrix of the diffusion operator
+        '''
+        streaming,mass = self._elem.streaming(),self._elem.mass()
+        # within-group absorption: sig_t-sig_s(g->g)
+        diff_mats = {mid:(self._dcoefs[mid][g]*streaming +
+                          (self._sigts[mid][g]-self._sigses_full[mid][g,g])*mass)
+                     for mid in self._mids}
+        sys_mat = sps.lil_matrix((self._n_dof,self._n_dof))
+        for cell in self._mesh.cells():
+            idx,mid = cell.global_idx(),cell.get('id')
+            for ci,cj in self._local_dof_pairs:
+                sys_mat[idx[ci],idx[cj]] += diff_mats[mid][ci][cj]
+            for bd,tp in self._cell_bounds(cell):
+                if tp!='refl':
+                    bd_mass = self._elem.bdmt()[bd]
+                    for ci,cj in self._local_dof_pairs:
+                        sys_mat[idx[ci],idx[cj]] += 0.5*bd_mass[ci][cj]
+        return sps.csc_matrix(sys_mat)
+
+    def _dsa_correction(self, g, sflx_ig_prev):
+        '''@brief Internal function used to correct fluxes in Group g after
+        one transport sweep with diffusion synthetic acceleration
+
+        The diffusion equation is sourced by the within-group scattering residual.
+        Factorizations are cached per group as the operator does not change.
+        @param g Group index
+        @param sflx_ig_prev Scalar flux before the transport sweep
+        '''
+        mass = self._elem.mass()
+        dsflx = self._sflxes[g] - sflx_ig_prev
+        dsa_rhs = np.zeros(self._n_dof)
+        for cell in self._mesh.cells():
+            idx,mid = cell.global_idx(),cell.get('id')
+            sigs = self._sigses_full[mid][g,g]
+            if sigs>1.0e-14:
+                dsa_rhs[idx] += sigs*np.dot(mass,dsflx[idx])
+        self._correct_fluxes(g, self._dsa_lu[g].solve(dsa_rhs))
+
+    def _correct_fluxes(self, g, dsflx):
+        '''@brief Internal function used to add a scalar flux correction to
+        Group g
+
+        Angular fluxes receive the isotropic part of the correction, such that
+        incident fluxes on reflective boundaries in the next sweep are
+        consistent with the corrected scalar flux.
+        @param g Group index
+        @param dsflx Scalar flux correction
+        '''
+        self._sflxes[g] += dsflx
+        for d in xrange(self._n_dirs[g]):
+            self._aflxes[self._comp[(g,d)]] += dsflx/(4.0*np.pi)
+
+    def _preassembly_amg(self, g):
+        '''@brief Internal function used to assemble and factorize the transport
+        equation of source iteration errors on the coarse angular quadrature for
+        Group g
+
+        Coarse angular fluxes of all directions are coupled by within-group
+        scattering and by incident fluxes on reflective boundaries. They are
+        solved as one block system, such that the coarse problem is solved
+        exactly however close to one the scattering ratio is. The within-group
+        scattering operator per direction is kept as it generates the source of
+        the error equation.
+        @param g Group index
+        '''
+        aq = self._aq_amg
+        n_dir = aq['n_dir']
+        blocks = [[None]*n_dir for d in xrange(n_dir)]
+        for d in xrange(n_dir):
+            scat_op = sps.lil_matrix((self._n_dof,self._n_dof))
+            scat_mats = {mid:self._sigses[mid][g,g]*self._local_rhs_mat(mid, g, aq['omega'][d])
+                         for mid in self._mids}
+            # incident reflective boundary terms per reflected direction
+            refl_ops = {}
+            for cell in self._mesh.cells():
+                idx,mid = cell.global_idx(),cell.get('id')
+                for ci,cj in self._local_dof_pairs:
+                    scat_op[idx[ci],idx[cj]] += scat_mats[mid][ci][cj]
+                for bd,tp in self._cell_bounds(cell):
+                    if tp=='refl' and aq['bd_angle'][(bd,d)]<0.0:
+                        r_dir = aq['refl_dir'][(bd,d)]
+                        if r_dir not in refl_ops:
+                            refl_ops[r_dir] = sps.lil_matrix((self._n_dof,self._n_dof))
+                        odn,bd_mass = abs(aq['bd_angle'][(bd,d)]),self._elem.bdmt()[bd]
+                        for ci,cj in self._local_dof_pairs:
+                            refl_ops[r_dir][idx[ci],idx[cj]] += odn*bd_mass[ci][cj]
+            self._amg_mats[(g,d)] = sps.csc_matrix(scat_op)
+            for dd in xrange(n_dir):
+                blocks[d][dd] = -aq['wt'][dd]*self._amg_mats[(g,d)]
+            blocks[d][d] = blocks[d][d] + self._assemble_component_matrix(g, d, aq)
+            for r_dir,refl_op in refl_ops.items():
+                blocks[d][r_dir] = blocks[d][r_dir] - sps.csc_matrix(refl_op)
+        self._amg_lu[g] = sla.splu(sps.bmat(blocks, format='csc'))
+
+    def _amg_correction(self, g, sflx_ig_prev):
+        '''@brief Internal function used to correct fluxes in Group g after one
+        transport sweep with angular multigrid
+
+        The transport equation for the source iteration error is solved on the
+        coarse angular quadrature, sourced by the within-group scattering
+        residual, and the isotropic correction is prolonged back to the fine
+        quadrature.
+        @param g Group index
+        @param sflx_ig_prev Scalar flux before the transport sweep
+        '''
+        aq = self._aq_amg
+        dsflx = self._sflxes[g] - sflx_ig_prev
+        rhs = np.concatenate([self._amg_mats[(g,d)].dot(dsflx) for d in xrange(aq['n_dir'])])
+        aflxes = self._amg_lu[g].solve(rhs).reshape(aq['n_dir'],self._n_dof)
+        self._correct_fluxes(g, sum(aq['wt'][d]*aflxes[d] for d in xrange(aq['n_dir'])))
 
     #NOTE: this function has to be removed if abstract class is implemented
     def update_sflxes(self, sflxes_old, g):
@@ -264,7 +531,7 @@ class SAAF(object):
         np.copyto(sflxes_old[g], self._sflxes[g])
 
     def calculate_keff(self):
-        assert not self._is_eigen, 'only be called in eigenvalue problems'
+        assert self._is_eigen, 'only be called in eigenvalue problems'
         # update the previous fission source and previous keff
         self._global_fiss_src_prev,self._keff_prev = self._global_fiss_src,self._keff
         # calculate the new fission source
@@ -297,38 +564,124 @@ class SAAF(object):
         # return the l1 norm relative difference
         return norm((self._sflxes[g]-sflxes_old[g]),1) / norm(self._sflxes[g],1)
 
+    def calculate_nda_corrections(self, do_ua=False):
+        '''@brief Function used to calculate NDA drift vectors for all cells, groups
+        and quadrature points at once
+
+        @param do_ua Boolean to determine if corrections for upscattering
+        acceleration are calculated
+        @return Dictionary with 'x_comp' and 'y_comp' arrays of shape
+        (n_cell,n_grp,n_qp), and 'x_ua' and 'y_ua' of shape (n_cell,n_qp) if do_ua
+        '''
+        return self._nda_corrections(self._cell_idx, self._cell_mids, do_ua)
+
     def calculate_nda_cell_correction(self, mat_id, idx, do_ua=False):
-        # TODO: address the "9"
-        corrs = {'x_comp':np.zeros((self._n_grp,9)), 'y_comp':np.zeros((self._n_grp,9))}
-        for g in xrange(self._n_grp):
-            dcoef = self._dcoefs[mat_id][g]
-            isgit = self._isigts[mat_id][g]
-            # retrive grad_aflx for all directions at quadrature points
-            grad_aflxes_qp = {
-            d:self._elem.get_grad_at_qps(self._aflxes[self._comp(g,d)][idx])
-            for d in self._n_dir}
-            sflxes_qp = self._elem.get_sol_at_qps(self._sflxes[g][idx])
-            grad_sflx_qp = self._elem.get_grad_at_qps(self._sflxes[g][idx])
-            # calculate correction for x and y components
-            corx,cory = np.zeros(len(sflxes_qp)),np.zeros(len(sflxes_qp))
-            for i in len(sflxes_qp):
-                # transport current
-                tc = np.zeros(2)
-                for d in xrange(self._n_dir):
-                    # NOTE: 'wt_tensor' is equal to w*OmegaOmega, a 2x2 matrix
-                    tc += np.dot(self._aq['wt_tensor'][d],grad_aflxes_qp[d][i])
-                # minus diffusion current
-                mdc = dcoef*grad_sflx_qp
-                # corrections
-                corx[i],cory[i] = (isgit*tc+mdc)/sflxes_qp[i]
-            # wrap corrections to corrs
-            corrs['x_comp'][g],corrs['y_comp'][g] = corx,cory
+        '''@brief Function used to calculate NDA drift vectors in one cell
+
+        @param mat_id Material id of the cell
+        @param idx Global indices of the cell vertices
+        @return Dictionary with 'x_comp' and 'y_comp' arrays of shape (n_grp,n_qp),
+        and 'x_ua' and 'y_ua' of shape (n_qp) if do_ua
+        '''
+        corrs = self._nda_corrections(np.array([idx]), [mat_id], do_ua)
+        return {k:v[0] for k,v in corrs.items()}
+
+    def _nda_corrections(self, cell_idx, cell_mids, do_ua):
+        '''@brief Internal function used to calculate NDA drift vectors for a batch
+        of cells
+
+        @param cell_idx Array of global vertex indices of shape (n_cell,4)
+        @param cell_mids List of material ids of the cells
+        @param do_ua Boolean to determine if ua corrections are calculated
+        '''
+        bas = self._elem.basis_at_qps()
+        dx,dy = self._elem.grad_basis_at_qps()
+        # material properties per cell and group: (n_cell,n_grp,1)
+        dcoefs = np.array([self._dcoefs[mid] for mid in cell_mids])[:,:,np.newaxis]
+        isigts = np.array([self._isigts[mid] for mid in cell_mids])[:,:,np.newaxis]
+        # scalar fluxes at cell vertices: (n_grp,n_cell,4)
+        sflxes = np.array([self._sflxes[g] for g in xrange(self._n_grp)])[:,cell_idx]
+        # gradient is linear in vertex values, so weight tensors are applied to
+        # vertex values before interpolation: (n_cell,n_grp,2,2,4)
+        wt_aflxes = np.stack([self._wt_aflxes(g, cell_idx) for g in xrange(self._n_grp)],
+                             axis=1)
+        # transport current: sum over directions of wt_tensor*grad(aflx)
+        tcx = (np.einsum('qv,cgv->cgq', dx, wt_aflxes[:,:,0,0]) +
+               np.einsum('qv,cgv->cgq', dy, wt_aflxes[:,:,0,1]))
+        tcy = (np.einsum('qv,cgv->cgq', dx, wt_aflxes[:,:,1,0]) +
+               np.einsum('qv,cgv->cgq', dy, wt_aflxes[:,:,1,1]))
+        # scalar flux and its gradient at quadrature points: (n_cell,n_grp,n_qp)
+        sflxes_qp = np.einsum('qv,gcv->cgq', bas, sflxes)
+        sflxes_dx = np.einsum('qv,gcv->cgq', dx, sflxes)
+        sflxes_dy = np.einsum('qv,gcv->cgq', dy, sflxes)
+        # corrections: transport current minus diffusion current over scalar flux,
+        # with the sign of the correction matrices, in which the transport
+        # current is -isigt*tc and the diffusion current is -dcoef*grad(sflx)
+        corrs = {'x_comp':(isigts*tcx-dcoefs*sflxes_dx)/sflxes_qp,
+                 'y_comp':(isigts*tcy-dcoefs*sflxes_dy)/sflxes_qp}
         # do upscattering acceleration
         if do_ua:
-            corrs['x_ua'] = np.dot(self._ksi_ua[mat_id],corrs['x_comp'][self._g_thr:,])
-            corrs['y_ua'] = np.dot(self._ksi_ua[mat_id],corrs['y_comp'][self._g_thr:,])
+            ksi_ua = np.array([self._ksi_ua[mid] for mid in cell_mids])
+            corrs['x_ua'] = np.einsum('cg,cgq->cq', ksi_ua, corrs['x_comp'][:,self._g_thr:])
+            corrs['y_ua'] = np.einsum('cg,cgq->cq', ksi_ua, corrs['y_comp'][:,self._g_thr:])
         return corrs
 
+    def _wt_aflxes(self, g, cell_idx):
+        '''@brief Internal function used to sum angular fluxes of Group g at cell
+        vertices weighted by w*OmegaOmega, a 2x2 matrix per direction
+
+        @return Array of shape (n_cell,2,2,4)
+        '''
+        aq = self._aqs[g]
+        wt_tensors = np.array([aq['wt_tensor'][d] for d in xrange(aq['n_dir'])])
+        aflxes = np.array([self._aflxes[self._comp[(g,d)]]
+                           for d in xrange(aq['n_dir'])])[:,cell_idx]
+        return np.einsum('dij,dcv->cijv', wt_tensors, aflxes)
+
+    def set_sflxes(self, g, sflx):
+        '''@brief Function used to overwrite the scalar flux of Group g
+
+        @param g Target group number
+        @param sflx Scalar flux values
+        '''
+        np.copyto(self._sflxes[g], sflx)
+
+    def get_group_state(self, g):
+        '''@brief Function used to retrieve the solution of Group g, e.g. to pass
+        it between processes
+
+        @param g Target group number
+        @return Dictionary containing scalar and angular fluxes of Group g
+        '''
+        return {'sflx':self._sflxes[g],
+                'aflxes':{d:self._aflxes[self._comp[(g,d)]] for d in xrange(self._n_dirs[g])}}
+
+    def get_aflxes(self, g):
+        '''@brief Function used to retrieve angular fluxes of Group g
+
+        In adjoint problems, the equation in direction omega is the forward-form
+        equation in direction -omega with transposed scattering and fission, so
+        adjoint angular fluxes are solutions of reversed directions.
+        @param g Target group number
+        @return List of angular fluxes per direction of aq_data(g)
+        '''
+        rev = self._aqs[g]['rev_dir']
+        return [self._aflxes[self._comp[(g,rev[d] if self._adjoint else d)]]
+                for d in xrange(self._n_dirs[g])]
+
+    def is_adjoint(self):
+        return self._adjoint
+
+    def set_group_state(self, g, state):
+        '''@brief Function used to overwrite the solution of Group g
+
+        @param g Target group number
+        @param state Dictionary in the format returned by get_group_state
+        '''
+        np.copyto(self._sflxes[g], state['sflx'])
+        for d,aflx in state['aflxes'].items():
+            np.copyto(self._aflxes[self._comp[(g,d)]], aflx)
+
     def get_sflxes(self, g):
         '''@brief Function called outside to retrieve the scalar flux value for Group g
 
@@ -336,6 +689,14 @@ class SAAF(object):
         '''
         return self._sflxes[g]
 
+    def aq_data(self, g):
+        '''@brief Function used to retrieve angular quadrature data of Group g
+
+        @param g Target group number
+        @return aq data dictionary
+        '''
+        return self._aqs[g]
+
     def get_keff(self):
         '''@brief A function used to retrieve keff
 
@@ -343,8 +704,147 @@ class SAAF(object):
         '''
         return self._keff
 
+    def set_keff(self, keff):
+        '''@brief Function used to overwrite keff, e.g. after coarse mesh
+        acceleration, and to update the fission source accordingly
+
+        @param keff Target keff
+        '''
+        self._keff = keff
+        self._global_fiss_src = self._calculate_fiss_src()
+
+    def calculate_currents(self, g):
+        '''@brief Function used to calculate vertex values of net currents for
+        Group g from angular fluxes
+
+        @param g Target group number
+        @return Tuple of x and y components of the net current
+        '''
+        aq,cur = self._aqs[g],np.zeros((2,self._n_dof))
+        for d in xrange(self._n_dirs[g]):
+            cur += np.outer(aq['wt'][d]*aq['omega'][d], self._aflxes[self._comp[(g,d)]])
+        return cur[0],cur[1]
+
+    def set_initial_guess(self, sflxes, keff, aflxes=None):
+        '''@brief Function used to initialize the solution, e.g. from a diffusion
+        solve or a coarser mesh
+
+        @param sflxes Dictionary of scalar fluxes of all groups
+        @param keff Initial keff
+        @param aflxes Dictionary of angular fluxes with (group,direction) keys.
+        Angular fluxes are initialized to be isotropic if not given
+        '''
+        for g in xrange(self._n_grp):
+            np.copyto(self._sflxes[g], sflxes[g])
+            for d in xrange(self._n_dirs[g]):
+                aflx = sflxes[g]/(4.0*np.pi) if aflxes is None else aflxes[(g,d)]
+                np.copyto(self._aflxes[self._comp[(g,d)]], aflx)
+        self.set_keff(keff)
+        self._keff_prev = keff
+
+    def scale_fluxes(self, g, factor):
+        '''@brief Function used to rescale scalar and angular fluxes of Group g
+        vertex by vertex
+
+        @param g Target group number
+        @param factor Vertex scaling factors
+        '''
+        self._sflxes[g] *= factor
+        for d in xrange(self._n_dirs[g]):
+            self._aflxes[self._comp[(g,d)]] *= factor
+
+    def _preassembly_ua(self):
+        '''@brief Internal function used to factorize the one-group diffusion
+        operator for upscattering acceleration and to map ksi_ua to vertices
+
+        Boundary conditions are as in DSA. Vertex values of ksi_ua are averaged
+        over cells sharing the vertex.
+        '''
+        streaming,mass = self._elem.streaming(),self._elem.mass()
+        sys_mat = sps.lil_matrix((self._n_dof,self._n_dof))
+        ksi_sum,ct = np.zeros((self._n_grp-self._g_thr,self._n_dof)),np.zeros(self._n_dof)
+        for cell in self._mesh.cells():
+            idx,mid = cell.global_idx(),cell.get('id')
+            diff_mat = self._dcoefs_ua[mid]*streaming + self._sigrs_ua[mid]*mass
+            for ci,cj in self._local_dof_pairs:
+                sys_mat[idx[ci],idx[cj]] += diff_mat[ci][cj]
+            for bd,tp in self._cell_bounds(cell):
+                if tp!='refl':
+                    bd_mass = self._elem.bdmt()[bd]
+                    for ci,cj in self._local_dof_pairs:
+                        sys_mat[idx[ci],idx[cj]] += 0.5*bd_mass[ci][cj]
+            for i in idx:
+                ksi_sum[:,i] += self._ksi_ua[mid]
+                ct[i] += 1
+        self._ua_lu = sla.splu(sps.csc_matrix(sys_mat))
+        self._ksi_ua_vtx = ksi_sum/ct
+
+    def solve_ua(self, sflxes_old):
+        '''@brief A function used to solve the one-group diffusion equation for
+        the error of thermal scalar fluxes after a thermal sweep
+
+        The equation is sourced by the upscattering residual of the sweep.
+        @param sflxes_old Thermal scalar fluxes before the latest thermal sweep
+        '''
+        if self._ua_lu is None:
+            self._preassembly_ua()
+        mass = self._elem.mass()
+        ua_rhs = np.zeros(self._n_dof)
+        for cell in self._mesh.cells():
+            idx,mid = cell.global_idx(),cell.get('id')
+            sigs = self._sigses_full[mid]
+            scat_src_ua = np.zeros(4)
+            for g in xrange(self._g_thr,self._n_grp-1):
+                for gi in filter(lambda x: sigs[g,x]>1.0e-14, xrange(g+1,self._n_grp)):
+                    dsflx_vtx = self._sflxes[gi][idx]-sflxes_old[gi][idx]
+                    scat_src_ua += sigs[g,gi]*np.dot(mass,dsflx_vtx)
+            ua_rhs[idx] += scat_src_ua
+        self._sflx_ua = self._ua_lu.solve(ua_rhs)
+
+    def update_ua(self):
+        '''@brief A function used to update thermal fluxes with the error solved
+        in upscattering acceleration
+
+        Errors are distributed over groups with ksi_ua. Angular fluxes receive
+        the isotropic part of the correction.
+        '''
+        for g in xrange(self._g_thr,self._n_grp):
+            dsflx = self._ksi_ua_vtx[g-self._g_thr]*self._sflx_ua
+            self._sflxes[g] += dsflx
+            for d in xrange(self._n_dirs[g]):
+                self._aflxes[self._comp[(g,d)]] += dsflx/(4.0*np.pi)
+
+    def do_ua(self):
+        return self._do_ua
+
+    def scatter_coupling(self):
+        '''@brief A function used to estimate scattering coupling between groups
+
+        @return Array with entry (g,gi) being the maximum of sig_s(gi->g)/sig_t(g)
+        over all materials
+        '''
+        return np.amax([self._sigses_full[mid]*self._isigts[mid][:,np.newaxis]
+                        for mid in self._mids], axis=0)
+
+    def set_tol(self, tol):
+        '''@brief A function used to set source iteration tolerance
+
+        @param tol Tolerance. It is not allowed to be tighter than default
+        '''
+        self._tol = max(tol, self._tol_min)
+
+    def n_sweeps(self):
+        '''@brief Function used to retrieve the number of transport sweeps
+
+        @return Number of source iterations summed over all groups
+        '''
+        return self._n_sweep
+
     def n_dof(self):
         return self._mesh.n_node()
 
     def n_grp(self):
         return self._n_grp
+
+    def g_thr(self):
+        return self._g_thr
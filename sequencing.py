@@ -0,0 +1,165 @@
+import numpy as np
+import material
+import mesh
+from saaf import SAAF
+from eigen_iterations import Eigen
+
+'''
+functions used to solve eigenvalue problems on a sequence of nested meshes and
+increasing Sn orders
+'''
+def mesh_hierarchy(mesh_cells, n_layout, n_levels):
+    '''@brief Function used to generate cells per side from coarse to fine
+    meshes, each level halving the cells of the next finer one
+
+    @param mesh_cells Cells per side of the finest mesh
+    @param n_layout Size of the material layout, which all meshes are refining
+    @param n_levels Maximum number of levels
+    @return List of cells per side, coarsest first
+    '''
+    assert mesh_cells%n_layout==0, 'Mesh must be a refinement of layout'
+    levels = [mesh_cells]
+    while len(levels)<n_levels and levels[0]%2==0 and (levels[0]/2)%n_layout==0:
+        levels.insert(0, levels[0]/2)
+    return levels
+
+def prolong(vals, n_crs, n_fine):
+    '''@brief Function used to bilinearly interpolate vertex values from a
+    coarse mesh to a fine mesh over the same square domain
+
+    @param vals Vertex values on the coarse mesh ordered by row then column
+    @param n_crs Cells per side of the coarse mesh
+    @param n_fine Cells per side of the fine mesh
+    @return Vertex values on the fine mesh
+    '''
+    crs = np.linspace(0., 1., n_crs+1)
+    fine = np.linspace(0., 1., n_fine+1)
+    vals = np.reshape(vals, (n_crs+1,n_crs+1))
+    # interpolate along x in every coarse row, then along y in every fine column
+    rows = np.array([np.interp(fine, crs, row) for row in vals])
+    return np.array([np.interp(fine, crs, col) for col in rows.T]).T.ravel()
+
+def sn_hierarchy(sn_order, n_levels):
+    '''@brief Function used to generate Sn orders from low to high, each level
+    about halving the order of the next higher one
+
+    @param sn_order Target Sn order
+    @param n_levels Maximum number of levels
+    @return List of even Sn orders, lowest first
+    '''
+    levels = [sn_order]
+    while len(levels)<n_levels and levels[0]>2:
+        levels.insert(0, (levels[0]/2+1)/2*2)
+    return levels
+
+def p1_aflx(sflx, cur, omega):
+    '''@brief Function used to rebuild angular flux in direction omega from
+    scalar flux and current with a P1 expansion
+
+    @param sflx Scalar flux
+    @param cur Tuple of x and y components of current
+    @param omega Direction vector
+    @return Angular flux (phi+3*omega.J)/(4*pi)
+    '''
+    return (sflx + 3.0*(omega[0]*cur[0] + omega[1]*cur[1]))/(4.0*np.pi)
+
+def _transfer(ho_prev, ho_cls, n_prev, n):
+    '''@brief Internal function used to initialize ho_cls with the solution of
+    ho_prev from a coarser mesh and/or a lower Sn order
+    '''
+    n_grp = ho_prev.n_grp()
+    aflxes = {}
+    for g in xrange(n_grp):
+        state = ho_prev.get_group_state(g)['aflxes']
+        aflxes[g] = [state[d] for d in xrange(len(state))]
+    _initialize(ho_cls, n_prev, n, ho_prev.get_keff(),
+                [ho_prev.get_sflxes(g) for g in xrange(n_grp)], aflxes,
+                [ho_prev.calculate_currents(g) for g in xrange(n_grp)])
+
+def _initialize(ho_cls, n_prev, n, keff, sflxes, aflxes, currents):
+    '''@brief Internal function used to initialize ho_cls with a solution on a
+    mesh with n_prev cells per side
+
+    Scalar fluxes and currents are prolonged in space. Angular fluxes are
+    prolonged direction by direction if both quadratures are the same, or
+    rebuilt from scalar flux and current otherwise.
+    @param sflxes Scalar fluxes per group
+    @param aflxes Dictionary of lists of angular fluxes per group. If None,
+    angular fluxes are isotropic
+    @param currents Tuples of x and y current components per group
+    '''
+    if aflxes is None:
+        ho_cls.set_initial_guess({g:prolong(sflxes[g], n_prev, n)
+                                  for g in xrange(len(sflxes))}, keff)
+        return
+    sflxes_new,aflxes_new = {},{}
+    for g in xrange(len(sflxes)):
+        aq = ho_cls.aq_data(g)
+        sflxes_new[g] = prolong(sflxes[g], n_prev, n)
+        if len(aflxes[g])==aq['n_dir']:
+            for d,aflx in enumerate(aflxes[g]):
+                aflxes_new[(g,d)] = prolong(aflx, n_prev, n)
+        else:
+            cur = [prolong(comp, n_prev, n) for comp in currents[g]]
+            for d in xrange(aq['n_dir']):
+                aflxes_new[(g,d)] = p1_aflx(sflxes_new[g], cur, aq['omega'][d])
+    ho_cls.set_initial_guess(sflxes_new, keff, aflxes=aflxes_new)
+
+def restore(ho_cls, snapshot, n):
+    '''@brief Function used to initialize a SAAF instance from a snapshot, which
+    may come from a different mesh or Sn order
+
+    Snapshots of NDA hold no angular fluxes. Only their scalar fluxes are
+    restored and angular fluxes are isotropic.
+    @param ho_cls SAAF instance
+    @param snapshot Snapshot dictionary written in eigen iterations
+    @param n Cells per side of the mesh of ho_cls
+    '''
+    sflxes = np.asarray(snapshot['sflxes'])
+    n_prev = int(round(np.sqrt(sflxes.shape[1]))) - 1
+    aflxes,currents = None,None
+    if 'aflxes_0' in snapshot:
+        aflxes = {g:snapshot['aflxes_%d' % g] for g in xrange(len(sflxes))}
+        currents = snapshot['currents']
+    _initialize(ho_cls, n_prev, n, float(snapshot['keff']), sflxes, aflxes,
+                currents)
+
+def solve_sequence(problem, mat_lib, n_levels=1, sn_levels=1):
+    '''@brief Function used to solve a SAAF eigenvalue problem on a sequence of
+    coarse problems
+
+    Sn orders are raised on the coarsest mesh first, after which the mesh is
+    refined with the target Sn order. Every level is initialized with the
+    solution of the previous one.
+    @param problem Problem dictionary
+    @param mat_lib Material library
+    @param n_levels Maximum number of mesh levels
+    @param sn_levels Maximum number of Sn levels
+    @return SAAF instance on the finest mesh with target Sn order and number
+    of outer iterations of all levels
+    '''
+    assert not problem['do_nda'], 'Sequencing is only for standalone SAAF'
+    n_layout = len(material.mat_map(lib=mat_lib, layout=problem['layout'],
+                                    layout_dict=problem['layout_dict'],
+                                    x_max=problem['domain_upper'],
+                                    n=problem['mesh_cells']).layout)
+    mesh_levels = mesh_hierarchy(problem['mesh_cells'], n_layout, n_levels)
+    sn_levels = sn_hierarchy(problem['sn_order'], sn_levels)
+    levels = ([(mesh_levels[0],sn) for sn in sn_levels[:-1]] +
+              [(n,sn_levels[-1]) for n in mesh_levels])
+    ho_cls,n_prev,n_iter = None,None,0
+    for n,sn in levels:
+        mat_map = material.mat_map(lib=mat_lib, layout=problem['layout'],
+                                   layout_dict=problem['layout_dict'],
+                                   x_max=problem['domain_upper'], n=n)
+        mesh_cls = mesh.Mesh(n, problem['domain_upper'], mat_map)
+        # per-group Sn orders only apply to the target level
+        prob_dict = problem if sn==sn_levels[-1] else dict(problem, sn_order=sn, sn_orders=None)
+        ho_prev,ho_cls = ho_cls,SAAF(mat_cls=mat_lib, mesh_cls=mesh_cls, prob_dict=prob_dict)
+        if ho_prev:
+            _transfer(ho_prev, ho_cls, n_prev, n)
+        eigen_cls = Eigen(prob_dict)
+        eigen_cls.do_iterations(ho_cls=ho_cls)
+        n_iter += eigen_cls.n_iterations()
+        n_prev = n
+    return ho_cls,n_iter
@@ -0,0 +1,89 @@
+import material
+import mesh
+import checkpoint
+from eigen_iterations import Eigen
+from nda import NDA
+from saaf import SAAF
+from cmfd import CMFD
+from sequencing import solve_sequence, restore
+from result_cache import ResultCache
+
+'''
+functions used to solve a problem dictionary, shared by run.py and sweeps
+'''
+def solve(problem, mat_lib, init=None):
+    '''@brief Function used to solve the problem
+
+    @param problem Problem dictionary
+    @param mat_lib Material library of the problem
+    @param init Snapshot used as initial guess for standalone SAAF, if any
+    @return Dictionary of keff and fluxes in snapshot format. The iteration
+    count is the number of outer iterations of all eigenvalue solves
+    '''
+    # do we do NDA
+    do_nda = problem['do_nda']
+    assert not (do_nda and (init is not None or problem.get('restart_file'))), \
+        'Restart is only available for standalone SAAF'
+    n_levels,sn_levels = problem.get('mesh_levels', 1),problem.get('sn_levels', 1)
+    if not do_nda and (n_levels>1 or sn_levels>1):
+        # solve on coarse meshes and low Sn orders for initial guesses
+        ho_cls,n_iter = solve_sequence(problem, mat_lib, n_levels=n_levels,
+                                       sn_levels=sn_levels)
+        return checkpoint.snapshot(ho_cls, n_iter)
+    # build material mapping and mesh
+    mat_map = material.mat_map(lib=mat_lib, layout=problem['layout'],
+                               layout_dict=problem['layout_dict'],
+                               x_max=problem['domain_upper'],
+                               n=problem['mesh_cells'])
+    mesh_cls = mesh.Mesh(problem['mesh_cells'], problem['domain_upper'], mat_map)
+    # Eigen class construction
+    eigen_cls = Eigen(problem)
+    # construct HO solver
+    ho_cls = SAAF(mat_cls=mat_lib, mesh_cls=mesh_cls, prob_dict=problem)
+    if do_nda:
+        # construct NDA solver
+        nda_cls = NDA(mat_cls=mat_lib, mesh_cls=mesh_cls, prob_dict=problem)
+        # eigen solving
+        eigen_cls.do_iterations(ho_cls=ho_cls, nda_cls=nda_cls)
+        result = checkpoint.snapshot(ho_cls, eigen_cls.n_iterations())
+        # keff of HOLO calculations is found by NDA
+        result['keff'] = float(nda_cls.get_keff())
+        return result
+    if problem.get('restart_file'):
+        # resume from a snapshot, possibly of another mesh or Sn order
+        init = checkpoint.load(problem['restart_file'])
+    if init is not None:
+        restore(ho_cls, init, problem['mesh_cells'])
+    elif problem.get('warm_start', False):
+        # initial guess from multigroup diffusion
+        eigen_cls.warm_start(ho_cls=ho_cls,
+                             nda_cls=NDA(mat_cls=mat_lib, mesh_cls=mesh_cls, prob_dict=problem))
+    # construct coarse mesh accelerator on the material layout
+    cmfd_cls = None
+    if problem.get('do_cmfd', False):
+        cmfd_cls = CMFD(mat_cls=mat_lib, mesh_cls=mesh_cls, map_cls=mat_map)
+    # eigen solving
+    eigen_cls.do_iterations(ho_cls=ho_cls, nda_cls=None, cmfd_cls=cmfd_cls)
+    return checkpoint.snapshot(ho_cls, eigen_cls.n_iterations())
+
+def run(problem, mat_lib):
+    '''@brief Function used to solve the problem or retrieve its cached result
+
+    @param problem Problem dictionary
+    @param mat_lib Material library of the problem
+    @return Dictionary of keff and fluxes in snapshot format
+    '''
+    cache,init = None,None
+    if problem.get('cache_dir'):
+        cache = ResultCache(problem['cache_dir'],
+                            max_bytes=problem.get('cache_size', 2**30))
+        result = cache.get(problem)
+        if result is not None:
+            return checkpoint.unpack(result)
+        if not problem['do_nda']:
+            # same physics on another mesh or Sn order gives an initial guess
+            init = cache.get_partial(problem)
+    result = solve(problem, mat_lib, init)
+    if cache:
+        cache.put(problem, result)
+    return result
@@ -0,0 +1,111 @@
+import sys
+import json
+import time
+import traceback
+import multiprocessing
+import material
+from aq import get_aq_data
+from elem import get_elem
+from solver import solve
+
+# problem keys naming files that cases of a sweep must not share
+_PER_RUN_KEYS = ('checkpoint_file','restart_file','cache_dir')
+# material libraries shared by worker processes, built before forking
+_mat_libs = {}
+
+'''
+functions used to solve a base problem with a list of overrides on a process pool
+'''
+def merge(base, override):
+    '''@brief Function used to apply an override to a base problem
+
+    Entries of 'layout_dict' in the override update those of the base problem
+    such that a single material can be swapped, e.g. a guide tube for a control
+    rod. Other entries replace the base entries.
+    @param base Base problem dictionary
+    @param override Dictionary of problem entries to change
+    @return New problem dictionary
+    '''
+    problem = dict(base, **override)
+    if 'layout_dict' in override:
+        problem['layout_dict'] = dict(base['layout_dict'], **override['layout_dict'])
+    for k in _PER_RUN_KEYS:
+        problem.pop(k, None)
+    if problem.get('mg_mode')=='jacobi':
+        # pool workers cannot start pools of their own; converged solutions
+        # of both modes are the same
+        problem['mg_mode'] = 'gauss_seidel'
+    return problem
+
+def _lib_key(problem):
+    return (problem['groups'], tuple(problem['materials']), problem.get('tr_scatt', False))
+
+def _mat_lib(problem):
+    '''@brief Internal function used to get the material library of a problem,
+    parsed once per set of material files
+    '''
+    key = _lib_key(problem)
+    if key not in _mat_libs:
+        _mat_libs[key] = material.mat_lib(n_grps=problem['groups'],
+                                          files=problem['materials'],
+                                          tr_scatt=problem.get('tr_scatt', False))
+    return _mat_libs[key]
+
+def _prepare(problem):
+    '''@brief Internal function used to build read-only data of a problem in the
+    parent process such that workers share it
+    '''
+    _mat_lib(problem)
+    for sn in problem.get('sn_orders') or [problem['sn_order']]:
+        get_aq_data(sn)
+    if problem.get('do_amg', False):
+        get_aq_data(problem.get('amg_sn_order', 2))
+    get_elem(float(problem['domain_upper'])/float(problem['mesh_cells']))
+
+def _run_case(args):
+    '''@brief Internal function used to solve one case in a worker process
+
+    @param args Tuple of case index and problem dictionary
+    @return Result dictionary
+    '''
+    i,problem = args
+    result = {'case':i}
+    try:
+        t0 = time.time()
+        solution = solve(problem, _mat_lib(problem))
+        result.update({'keff':solution['keff'],
+                       'time':time.time()-t0,
+                       'iterations':solution['iteration']})
+    except Exception:
+        result['error'] = traceback.format_exc()
+    return result
+
+def sweep(base, overrides, n_workers=None, out=sys.stdout):
+    '''@brief Function used to solve a base problem with every override
+
+    Material libraries, angular quadratures and elements are built once before
+    workers are forked. Results are written as JSON lines in the order cases
+    finish, each with the case index, override, keff, wall time in seconds and
+    number of outer iterations, or the traceback if the case failed.
+    @param base Base problem dictionary
+    @param overrides List of dictionaries of problem entries to change
+    @param n_workers Number of processes. Defaults to the number of CPUs
+    @param out File-like object the results are written to
+    @return List of results ordered by case index
+    '''
+    problems = [merge(base, override) for override in overrides]
+    for problem in problems:
+        _prepare(problem)
+    pool = multiprocessing.Pool(processes=min(n_workers or multiprocessing.cpu_count(),
+                                              len(problems)))
+    results = [None]*len(problems)
+    try:
+        for result in pool.imap_unordered(_run_case, enumerate(problems)):
+            result['override'] = overrides[result['case']]
+            out.write(json.dumps(result, default=repr) + '\n')
+            out.flush()
+            results[result['case']] = result
+    finally:
+        pool.close()
+        pool.join()
+    return results
@@ -0,0 +1,89 @@
+from nose.tools import *
+from checkpoint import Checkpoint, load, unpack, snapshot
+from result_cache import ResultCache
+from saaf import SAAF
+import problems
+import numpy as np
+import os
+import shutil
+import tempfile
+
+class TestCheckpoint:
+    # Tests to verify snapshots are written in background and loaded back
+
+    def setup(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'snapshot.npz')
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def test_roundtrip(self):
+        ckpt = Checkpoint(self.filename)
+        sflxes = np.random.rand(2, 9)
+        ckpt.save({'keff':1.1, 'iteration':3, 'sflxes':sflxes})
+        ckpt.flush()
+        snapshot = load(self.filename)
+        eq_(float(snapshot['keff']), 1.1, "keff")
+        eq_(int(snapshot['iteration']), 3, "iteration")
+        assert_true(np.allclose(snapshot['sflxes'], sflxes))
+        ok_(not os.path.exists(self.filename + '.tmp'), "no temporary file left")
+
+    def test_latest_snapshot(self):
+        """ Arrays are copied when queued and the latest snapshot is kept """
+        ckpt = Checkpoint(self.filename)
+        sflxes = np.zeros(4)
+        for it in xrange(5):
+            sflxes += 1.0
+            ckpt.save({'iteration':it, 'sflxes':sflxes})
+        ckpt.flush()
+        snapshot = load(self.filename)
+        eq_(int(snapshot['iteration']), 4, "latest iteration")
+        assert_true(np.allclose(snapshot['sflxes'], 5.0))
+
+    def test_write_error(self):
+        """ Write errors are raised from flush and snapshots still get written """
+        ckpt = Checkpoint(os.path.join(self.dir, 'missing', 'snapshot.npz'))
+        ckpt.save({'iteration':0})
+        ckpt.save({'iteration':1})
+        assert_raises(IOError, ckpt.flush)
+        os.mkdir(os.path.join(self.dir, 'missing'))
+        ckpt.save({'iteration':2})
+        ckpt.flush()
+        snapshot = load(os.path.join(self.dir, 'missing', 'snapshot.npz'))
+        eq_(int(snapshot['iteration']), 2, "iteration after error")
+
+    def test_stop(self):
+        """ Stop writes queued snapshots and ends the writer thread """
+        ckpt = Checkpoint(self.filename)
+        ckpt.save({'iteration':0})
+        writer = ckpt._writer
+        ckpt.stop()
+        ok_(not writer.is_alive(), "writer thread stopped")
+        eq_(int(load(self.filename)['iteration']), 0, "queued snapshot written")
+        # a later snapshot starts a new writer
+        ckpt.save({'iteration':1})
+        ckpt.stop()
+        eq_(int(load(self.filename)['iteration']), 1, "snapshot after stop")
+
+    def test_stored_types(self):
+        """ Stored snapshots are loaded back with the types of snapshot """
+        prob_dict = problems.problem(mesh_cells=2, sn_order=2)
+        lib,_,mesh_cls = problems.build(prob_dict)
+        state = snapshot(SAAF(lib, mesh_cls, prob_dict), 2)
+        cache = ResultCache(os.path.join(self.dir, 'cache'))
+        cache.put(prob_dict, state)
+        ckpt = Checkpoint(self.filename)
+        ckpt.save(state)
+        ckpt.stop()
+        for stored in (load(self.filename), unpack(cache.get(prob_dict))):
+            eq_(sorted(stored.keys()), sorted(state.keys()))
+            for k,v in state.items():
+                eq_(type(stored[k]), type(v), k)
+                if isinstance(v, list):
+                    eq_(type(stored[k][0]), type(v[0]), k)
+                assert_true(np.allclose(stored[k], v))
+
+    def test_cadence(self):
+        ckpt = Checkpoint(self.filename, every=3)
+        eq_([it for it in xrange(1, 10) if ckpt.due(it)], [3, 6, 9])
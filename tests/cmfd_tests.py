@@ -0,0 +1,28 @@
+from nose.tools import *
+from saaf import SAAF
+from cmfd import CMFD
+from eigen_iterations import Eigen
+import problems
+
+class TestCMFD:
+    # Tests to verify CMFD acceleration of SAAF eigen iterations
+
+    def setup(self):
+        # asymmetric layout such that the fission source shape is iterated
+        self.problem = problems.problem(mesh_cells=2, sn_order=2, do_dsa=True,
+                                        layout=" f m / f f ", domain_upper=8.0)
+        self.lib,self.mat_map,self.mesh = problems.build(self.problem)
+
+    def solve(self, do_cmfd):
+        '''Solve SAAF eigenvalue problem and return keff and outer iterations'''
+        saaf,eigen = SAAF(self.lib, self.mesh, self.problem),Eigen(self.problem)
+        cmfd = CMFD(self.lib, self.mesh, self.mat_map) if do_cmfd else None
+        eigen.do_iterations(saaf, cmfd_cls=cmfd)
+        return saaf.get_keff(),eigen.n_iterations()
+
+    def test_saaf(self):
+        """ CMFD gives SAAF keff with fewer outer iterations """
+        keff,n_iter = self.solve(False)
+        keff_cmfd,n_iter_cmfd = self.solve(True)
+        assert_almost_equal(keff_cmfd/keff, 1.0, places=5)
+        ok_(n_iter_cmfd<n_iter, "CMFD outer iterations")
@@ -0,0 +1,106 @@
+from nose.tools import *
+import numpy as np
+from numpy.linalg import norm
+from scipy import linalg
+from nda import NDA
+from saaf import SAAF
+from eigen_iterations import Eigen
+import problems
+
+class TestEigen:
+    # Tests to verify eigenvalue iterations on the 4-group problem
+
+    def setup(self):
+        self.problem = problems.problem(do_nda=True)
+        self.lib,_,self.mesh = problems.build(self.problem)
+
+    def test_holo(self):
+        """ HOLO iterations give keff of standalone SAAF """
+        prob_dict = problems.problem(do_nda=True, mesh_cells=2, sn_order=2)
+        lib,_,mesh_cls = problems.build(prob_dict)
+        nda,saaf = NDA(lib, mesh_cls, prob_dict),SAAF(lib, mesh_cls, prob_dict)
+        Eigen(prob_dict).do_iterations(saaf, nda)
+        prob_dict = dict(prob_dict, do_nda=False, do_dsa=True)
+        ho = SAAF(lib, problems.build(prob_dict)[2], prob_dict)
+        Eigen(prob_dict).do_iterations(ho)
+        assert_almost_equal(nda.get_keff()/ho.get_keff(), 1.0, places=5)
+
+    def solve(self, **kwargs):
+        '''Solve NDA eigenvalue problem and return NDA instance'''
+        prob_dict = dict(self.problem, **kwargs)
+        nda = NDA(self.lib, self.mesh, prob_dict)
+        nda.assemble_bilinear_forms(correction=False)
+        Eigen(prob_dict).eigen_iterations(nda)
+        return nda
+
+    def test_wielandt(self):
+        """ Wielandt shifted iterations give reference keff """
+        nda = self.solve(wielandt=True)
+        assert_almost_equal(nda.get_keff()/problems.reference_keff(nda), 1.0, places=5)
+
+    @raises(AssertionError)
+    def test_wielandt_saaf(self):
+        prob_dict = dict(self.problem, do_nda=False, wielandt=True)
+        Eigen(prob_dict).eigen_iterations(SAAF(self.lib, self.mesh, prob_dict))
+
+    def test_arnoldi(self):
+        """ Arnoldi method gives keff of power iterations """
+        nda = self.solve(eigen_solver='arnoldi')
+        assert_almost_equal(nda.get_keff()/self.solve().get_keff(), 1.0, places=5)
+        assert_almost_equal(nda.get_keff()/problems.reference_keff(nda), 1.0, places=6)
+
+    def test_arnoldi_modes(self):
+        """ Higher modes of Arnoldi method are normalized eigenvectors """
+        prob_dict = dict(self.problem, eigen_solver='arnoldi', n_modes=3)
+        nda = NDA(self.lib, self.mesh, prob_dict)
+        nda.assemble_bilinear_forms(correction=False)
+        eigen = Eigen(prob_dict)
+        eigen.eigen_iterations(nda)
+        loss,fiss = nda.block_matrices()
+        ks = linalg.eigvals(fiss.toarray(), loss.toarray())
+        ks = sorted(ks[np.isfinite(ks)].real, reverse=True)
+        modes = eigen.get_modes()
+        eq_(len(modes), 3)
+        for i,(keff,mode) in enumerate(modes):
+            sflx = np.concatenate([mode[g] for g in xrange(4)])
+            assert_almost_equal(keff/ks[i], 1.0, places=6)
+            assert_true(np.allclose(keff*loss.dot(sflx), fiss.dot(sflx), atol=1.0e-6*norm(sflx)))
+            if i==0:
+                assert_almost_equal(sflx.sum(), 1.0)
+            else:
+                assert_almost_equal(norm(sflx), 1.0)
+                ok_(sflx[np.argmax(abs(sflx))]>0, "sign of mode %d" % i)
+        assert_true(np.allclose(nda.get_sflxes(0), modes[0][1][0]))
+
+    def test_arnoldi_saaf(self):
+        """ Arnoldi method gives keff of power iterations with SAAF """
+        prob_dict = problems.problem(mesh_cells=2, sn_order=2, do_dsa=True)
+        lib,_,mesh_cls = problems.build(prob_dict)
+        keffs = []
+        for solver in ['power', 'arnoldi']:
+            saaf = SAAF(lib, mesh_cls, dict(prob_dict, eigen_solver=solver))
+            Eigen(dict(prob_dict, eigen_solver=solver)).do_iterations(saaf)
+            keffs.append(saaf.get_keff())
+        assert_almost_equal(keffs[1]/keffs[0], 1.0, places=5)
+        # angular fluxes belong to the fundamental mode
+        for g in xrange(4):
+            wt,aflxes = saaf.aq_data(g)['wt'],saaf.get_group_state(g)['aflxes']
+            sflx = sum(wt[d]*aflxes[d] for d in xrange(len(wt)))
+            assert_true(np.allclose(sflx, saaf.get_sflxes(g), rtol=1.0e-6))
+
+    def test_warm_start(self):
+        """ SAAF warm-started from diffusion gives keff of a cold start """
+        prob_dict = problems.problem(mesh_cells=2, sn_order=2, do_dsa=True,
+                                     layout=" f m / f f ", domain_upper=8.0)
+        lib,_,mesh_cls = problems.build(prob_dict)
+        keffs,n_iters = [],[]
+        for warm in [False, True]:
+            saaf,eigen = SAAF(lib, mesh_cls, prob_dict),Eigen(prob_dict)
+            if warm:
+                eigen.warm_start(saaf, NDA(lib, mesh_cls, prob_dict))
+            n_iter = eigen.n_iterations()
+            eigen.do_iterations(saaf)
+            keffs.append(saaf.get_keff())
+            n_iters.append(eigen.n_iterations()-n_iter)
+        assert_almost_equal(keffs[1]/keffs[0], 1.0, places=5)
+        ok_(n_iters[1]<n_iters[0], "warm start outer iterations")
@@ -0,0 +1,107 @@
+from nose.tools import *
+from incremental import diff_materials, cell_delta_matrix, update_factorization
+from scipy import sparse as sps
+from scipy.sparse import linalg as sla
+from saaf import SAAF
+from nda import NDA
+from eigen_iterations import Eigen
+import problems
+import material
+import mesh
+import numpy as np
+
+class TestIncremental:
+    # Tests to verify low-rank updates of factorizations
+
+    def setup(self):
+        n = 30
+        self.mat = sps.csc_matrix(sps.diags([-1.,4.,-1.], [-1,0,1], shape=(n,n)))
+        self.delta = cell_delta_matrix(np.array([[3,4,8,9]]), 0.5*np.eye(4)[np.newaxis], n)
+        self.rhs = np.arange(n, dtype=float)
+
+    def test_diff_materials(self):
+        """ Only cells with changed materials are found """
+        eq_(list(diff_materials(['a','b','c'], ['a','d','c'])), [1])
+
+    def test_woodbury_solve(self):
+        """ Corrected factorization solves the changed system """
+        lu = update_factorization(sla.splu(self.mat), self.delta, 4)
+        sol = sla.spsolve(self.mat+self.delta, self.rhs)
+        ok_(np.allclose(lu.solve(self.rhs), sol))
+
+    def test_repeated_updates(self):
+        """ Repeated changes correct the original factorization """
+        lu = update_factorization(sla.splu(self.mat), self.delta, 4)
+        lu = update_factorization(lu, -self.delta, 4)
+        ok_(np.allclose(lu.solve(self.rhs), sla.spsolve(self.mat, self.rhs)))
+
+    def test_refactorize_beyond_rank(self):
+        """ Changes touching too many dofs require refactorization """
+        eq_(update_factorization(sla.splu(self.mat), self.delta, 3), None)
+
+class TestUpdateMaterials:
+    # Tests to verify material updates of SAAF and NDA against fresh assemblies
+
+    def setup(self):
+        # corner pin cell switches from moderator to fuel
+        self.problem = problems.problem(mesh_cells=4, sn_order=2, do_dsa=True,
+                                        layout=" f m / m c ",
+                                        layout_dict={'f':'test_fuel', 'm':'test_mod',
+                                                     'c':'test_mod'})
+        self.lib = problems.build(self.problem)[0]
+
+    def mesh(self, mat):
+        '''Mesh with reflective boundaries and material mat in the corner'''
+        mat_map = material.mat_map(lib=self.lib, layout=self.problem['layout'],
+                                   layout_dict=dict(self.problem['layout_dict'], c=mat),
+                                   x_max=self.problem['domain_upper'],
+                                   n=self.problem['mesh_cells'])
+        mesh_cls = mesh.Mesh(self.problem['mesh_cells'], self.problem['domain_upper'], mat_map)
+        for cell in mesh_cls.cells():
+            for bd in cell.bounds().keys():
+                cell.bounds(bd, 'refl')
+        return mesh_cls
+
+    def solve(self, equ_cls, prob_dict):
+        '''Eigen solve from flat fluxes and unit keff, returning keff'''
+        for g in xrange(equ_cls.n_grp()):
+            equ_cls.set_sflxes(g, np.ones(equ_cls.n_dof()))
+        if equ_cls.name()=='saaf':
+            equ_cls.set_initial_guess({g:np.ones(equ_cls.n_dof())
+                                       for g in xrange(equ_cls.n_grp())}, 1.0)
+        else:
+            equ_cls.set_keff(1.0)
+        Eigen(prob_dict).eigen_iterations(equ_cls)
+        return equ_cls.get_keff()
+
+    def test_saaf(self):
+        """ SAAF material updates give keff of a fresh assembly """
+        # low-rank corrections and refactorization
+        for max_rank in (32, 4):
+            prob_dict = dict(self.problem, woodbury_max_rank=max_rank)
+            saaf = SAAF(self.lib, self.mesh('test_mod'), prob_dict)
+            saaf.assemble_bilinear_forms()
+            self.solve(saaf, prob_dict)
+            saaf.update_materials(self.mesh('test_fuel'))
+            fresh = SAAF(self.lib, self.mesh('test_fuel'), prob_dict)
+            fresh.assemble_bilinear_forms()
+            keff = self.solve(fresh, prob_dict)
+            assert_almost_equal(self.solve(saaf, prob_dict)/keff, 1.0, places=8)
+
+    def test_nda(self):
+        """ NDA material updates give keff of a fresh assembly """
+        for max_rank in (32, 4):
+            prob_dict = dict(self.problem, do_nda=True, do_ua=True,
+                             woodbury_max_rank=max_rank)
+            nda = NDA(self.lib, self.mesh('test_mod'), prob_dict)
+            nda.assemble_bilinear_forms(correction=False)
+            self.solve(nda, prob_dict)
+            nda.update_materials(self.mesh('test_fuel'))
+            fresh = NDA(self.lib, self.mesh('test_fuel'), prob_dict)
+            fresh.assemble_bilinear_forms(correction=False)
+            for key in range(4)+['ua']:
+                ok_(abs(nda._sys_mats[key]-fresh._sys_mats[key]).max()<1.0e-12,
+                    "matrix %s" % key)
+            keff = self.solve(fresh, prob_dict)
+            assert_almost_equal(self.solve(nda, prob_dict)/keff, 1.0, places=8)
+            assert_almost_equal(keff/problems.reference_keff(fresh), 1.0, places=5)
@@ -0,0 +1,110 @@
+from nose.tools import *
+import multiprocessing
+import numpy as np
+from scipy import sparse as sps
+from scipy.sparse import linalg as sla
+from nda import NDA
+from saaf import SAAF
+from elem import get_elem
+import incremental
+from eigen_iterations import Eigen
+from mg_iterations import MG
+import problems
+
+class TestMG:
+    # Tests to verify multigroup iteration options reproduce keff
+
+    def setup(self):
+        self.problem = problems.problem(do_nda=True)
+        self.lib,_,self.mesh = problems.build(self.problem)
+        nda = NDA(self.lib, self.mesh, self.problem)
+        nda.assemble_bilinear_forms(correction=False)
+        self.keff = problems.reference_keff(nda)
+
+    def solve(self, **kwargs):
+        '''Solve eigenvalue problem with NDA and return keff'''
+        prob_dict = dict(self.problem, **kwargs)
+        nda = NDA(self.lib, self.mesh, prob_dict)
+        nda.assemble_bilinear_forms(correction=False)
+        Eigen(prob_dict).eigen_iterations(nda)
+        return nda.get_keff()
+
+    def test_plain(self):
+        """ Gauss-Seidel multigroup iterations give reference keff """
+        assert_almost_equal(self.solve()/self.keff, 1.0, places=5)
+
+    def test_inexact(self):
+        """ Inexact multigroup tolerances give reference keff """
+        assert_almost_equal(self.solve(inexact=True)/self.keff, 1.0, places=5)
+
+    def test_selective(self):
+        """ Skipping thermal groups with unchanged sources gives reference keff """
+        assert_almost_equal(self.solve(mg_selective=True)/self.keff, 1.0, places=5)
+
+    def test_jacobi(self):
+        """ Jacobi-in-energy thermal iterations give Gauss-Seidel keff """
+        keff_gs = self.solve()
+        assert_almost_equal(self.solve(mg_mode='jacobi', n_workers=2)/keff_gs, 1.0, places=5)
+
+    def test_jacobi_pool_closed(self):
+        """ Jacobi worker pool is closed when multigroup iterations fail """
+        class FailingNDA(NDA):
+            def calculate_sflx_diff(self, sflxes_old, g):
+                raise RuntimeError('failed')
+        prob_dict = dict(self.problem, mg_mode='jacobi', n_workers=2)
+        nda = FailingNDA(self.lib, self.mesh, prob_dict)
+        nda.assemble_bilinear_forms(correction=False)
+        nda.assemble_fixed_linear_forms()
+        assert_raises(RuntimeError, MG(prob_dict).mg_iterations, nda)
+        eq_(multiprocessing.active_children(), [])
+
+    def test_ua(self):
+        """ Upscattering acceleration gives keff without acceleration """
+        keff = self.solve()
+        assert_almost_equal(self.solve(do_ua=True)/keff, 1.0, places=5)
+
+    def test_ua_solves(self):
+        """ Upscattering acceleration reduces thermal group solves """
+        class CountingNDA(NDA):
+            n_solves = 0
+            def solve_in_group(self, g):
+                self.n_solves += 1
+                NDA.solve_in_group(self, g)
+        n_solves = {}
+        for do_ua in [False, True]:
+            prob_dict = dict(self.problem, do_ua=do_ua)
+            nda = CountingNDA(self.lib, self.mesh, prob_dict)
+            nda.assemble_bilinear_forms(correction=False)
+            nda.assemble_fixed_linear_forms()
+            mg = MG(prob_dict)
+            mg.set_tol_min(1.0e-10)
+            mg.mg_iterations(nda)
+            n_solves[do_ua] = nda.n_solves
+        ok_(n_solves[True]*2<n_solves[False], "UA group solves")
+
+    def test_gmres(self):
+        """ GMRES over thermal groups gives reference keff """
+        assert_almost_equal(self.solve(mg_mode='gmres')/self.keff, 1.0, places=5)
+
+    def test_fixed_sources(self):
+        """ Batched fixed source solves match individual solves """
+        nda = NDA(self.lib, self.mesh, self.problem)
+        nda.assemble_bilinear_forms(correction=False)
+        n_dof = nda.n_dof()
+        loss,fiss = nda.block_matrices()
+        cells = self.mesh.cells()
+        mass = incremental.cell_delta_matrix(
+        np.array([cell.global_idx() for cell in cells]),
+        np.tile(get_elem(self.mesh.cell_length()).mass(), (len(cells),1,1)), n_dof)
+        sources = np.random.RandomState(0).rand(3,4,n_dof)
+        for with_fission in [False, True]:
+            sflxes = MG(self.problem).do_fixed_sources(nda, sources, with_fission)
+            op = sps.csc_matrix(loss-fiss if with_fission else loss)
+            for src,sflx in zip(sources,sflxes):
+                rhs = np.concatenate([mass.dot(src[g]) for g in xrange(4)])
+                assert_true(np.allclose(sflx.ravel(), sla.spsolve(op, rhs)))
+
+    @raises(AssertionError)
+    def test_fixed_sources_saaf(self):
+        saaf = SAAF(self.lib, self.mesh, self.problem)
+        MG(self.problem).do_fixed_sources(saaf, np.ones((1,4,saaf.n_dof())))
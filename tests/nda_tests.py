@@ -0,0 +1,59 @@
+from nose.tools import *
+from nda import NDA
+from saaf import SAAF
+from eigen_iterations import Eigen
+import problems
+import numpy as np
+
+class TestNDA:
+    # Tests to verify NDA assembly and solves on the 4-group problem
+
+    def setup(self):
+        self.problem = problems.problem(do_nda=True, do_ua=True)
+        self.lib,_,self.mesh = problems.build(self.problem)
+
+    def saaf_state(self, seed):
+        '''SAAF with random positive fluxes providing NDA corrections'''
+        rand = np.random.RandomState(seed)
+        saaf = SAAF(self.lib, self.mesh, self.problem)
+        n_dof,n_dir = saaf.n_dof(),self.problem['sn_order']*(self.problem['sn_order']+2)/2
+        aflxes = {(g,d):1.0+rand.rand(n_dof) for g in xrange(4) for d in xrange(n_dir)}
+        sflxes = {g:sum(aflxes[(g,d)] for d in xrange(n_dir)) for g in xrange(4)}
+        for g in xrange(4):
+            saaf._sflxes[g] = sflxes[g]
+            for d in xrange(n_dir):
+                saaf._aflxes[saaf._comp[(g,d)]] = aflxes[(g,d)]
+        return saaf
+
+    def test_reassembly(self):
+        """ In-place reassembly and refactorization match a fresh assembly """
+        nda = NDA(self.lib, self.mesh, self.problem)
+        nda.assemble_bilinear_forms(ho_cls=self.saaf_state(0), correction=True)
+        nda.assemble_fixed_linear_forms()
+        for g in xrange(4):
+            nda.solve_in_group(g)
+        saaf = self.saaf_state(1)
+        nda.assemble_bilinear_forms(ho_cls=saaf, correction=True)
+        fresh = NDA(self.lib, self.mesh, self.problem)
+        fresh.assemble_bilinear_forms(ho_cls=saaf, correction=True)
+        for key in range(4)+['ua']:
+            ok_(abs(nda._sys_mats[key]-fresh._sys_mats[key]).max()<1.0e-14, "matrix %s" % key)
+        rhs = np.random.RandomState(2).rand(nda.n_dof())
+        for key in range(4):
+            nda.factorize_group(key)
+            fresh.factorize_group(key)
+            assert_true(np.allclose(nda._lu[key].solve(rhs), fresh._lu[key].solve(rhs)))
+
+    def test_block_thermal(self):
+        """ Coupled thermal block solves give keff of group iterations """
+        keffs = []
+        for kwargs in [{}, {'nda_block_thermal':True},
+                       {'nda_block_thermal':True, 'nda_block_solver':'gmres'}]:
+            prob_dict = dict(self.problem, do_ua=False, **kwargs)
+            nda = NDA(self.lib, self.mesh, prob_dict)
+            nda.assemble_bilinear_forms(correction=False)
+            Eigen(prob_dict).eigen_iterations(nda)
+            keffs.append(nda.get_keff())
+        ref = problems.reference_keff(nda)
+        for keff in keffs:
+            assert_almost_equal(keff/ref, 1.0, places=5)
@@ -0,0 +1,34 @@
+from nose.tools import *
+from nda import NDA
+from saaf import SAAF
+from eigen_iterations import Eigen
+import problems
+
+class TestOuterAccel:
+    # Tests to verify outer iteration extrapolations reproduce keff
+
+    def setup(self):
+        self.problem = problems.problem(do_nda=True)
+        self.lib,_,self.mesh = problems.build(self.problem)
+
+    def test_nda(self):
+        """ Extrapolated NDA eigen iterations give reference keff """
+        for accel in ['anderson', 'aitken', 'chebyshev']:
+            prob_dict = dict(self.problem, outer_accel=accel)
+            nda = NDA(self.lib, self.mesh, prob_dict)
+            nda.assemble_bilinear_forms(correction=False)
+            Eigen(prob_dict).eigen_iterations(nda)
+            assert_almost_equal(nda.get_keff()/problems.reference_keff(nda), 1.0, places=5)
+
+    def test_saaf(self):
+        """ Extrapolated SAAF eigen iterations give keff without extrapolation """
+        prob_dict = problems.problem(mesh_cells=2, sn_order=2, do_dsa=True,
+                                     layout=" f m / f f ", domain_upper=8.0)
+        lib,_,mesh_cls = problems.build(prob_dict)
+        keffs = {}
+        for accel in [None, 'anderson', 'aitken', 'chebyshev']:
+            saaf = SAAF(lib, mesh_cls, dict(prob_dict, outer_accel=accel))
+            Eigen(dict(prob_dict, outer_accel=accel)).do_iterations(saaf)
+            keffs[accel] = saaf.get_keff()
+        for accel in ['anderson', 'aitken', 'chebyshev']:
+            assert_almost_equal(keffs[accel]/keffs[None], 1.0, places=5)
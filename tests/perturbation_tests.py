@@ -0,0 +1,59 @@
+from nose.tools import *
+from nda import NDA
+from saaf import SAAF
+from eigen_iterations import Eigen
+from perturbation import Perturbation
+import problems
+
+def perturbed_lib(prob_dict, mat_id, eps):
+    '''Material library with sig_t of mat_id scaled by 1+eps and consistent
+    derived xsecs'''
+    lib = problems.build(prob_dict)[0]
+    for mat in lib.mats:
+        if mat.gen['id']==mat_id:
+            mat.xsec['sig_t'] = mat.xsec['sig_t']*(1.0+eps)
+            mat.__derive_xsec__()
+            mat.__derive_sig_t__()
+    return lib
+
+class TestPerturbation:
+    # Tests to verify adjoint solves and first-order keff changes
+
+    def nda_keff(self, lib, mesh_cls, prob_dict):
+        '''Solve NDA eigenvalue problem and return the solved instance'''
+        nda = NDA(lib, mesh_cls, prob_dict)
+        nda.assemble_bilinear_forms(correction=False)
+        Eigen(prob_dict).eigen_iterations(nda)
+        return nda
+
+    def test_nda(self):
+        """ NDA adjoint keff and first-order change of a sig_t perturbation """
+        prob_dict = problems.problem(do_nda=True)
+        lib,_,mesh_cls = problems.build(prob_dict)
+        fwd = self.nda_keff(lib, mesh_cls, prob_dict)
+        adj = self.nda_keff(lib, mesh_cls, dict(prob_dict, adjoint=True))
+        assert_almost_equal(adj.get_keff()/fwd.get_keff(), 1.0, places=5)
+        lib_p = perturbed_lib(prob_dict, 'test_fuel', 5.0e-5)
+        nda_p = NDA(lib_p, mesh_cls, prob_dict)
+        nda_p.assemble_bilinear_forms(correction=False)
+        dk = problems.reference_keff(nda_p) - problems.reference_keff(fwd)
+        dk_pt = Perturbation(lib, mesh_cls, fwd, adj).library_worth(lib_p)
+        ok_(abs(dk)>1.0e-7, "perturbation changes keff")
+        assert_almost_equal(dk_pt/dk, 1.0, places=3)
+
+    def test_saaf(self):
+        """ SAAF first-order change pairs adjoint and forward directions """
+        # vacuum boundaries make angular fluxes anisotropic
+        prob_dict = problems.problem(mesh_cells=2, sn_order=2, do_dsa=True)
+        lib,_,mesh_cls = problems.build(prob_dict, refl=False)
+        fwd,adj = SAAF(lib, mesh_cls, prob_dict),SAAF(lib, mesh_cls, dict(prob_dict, adjoint=True))
+        Eigen(prob_dict).do_iterations(fwd)
+        Eigen(prob_dict).do_iterations(adj)
+        # adjoint equations are not the discrete adjoint of SAAF
+        assert_almost_equal(adj.get_keff()/fwd.get_keff(), 1.0, places=2)
+        lib_p = perturbed_lib(prob_dict, 'test_fuel', 1.0e-2)
+        saaf_p = SAAF(lib_p, mesh_cls, prob_dict)
+        Eigen(prob_dict).do_iterations(saaf_p)
+        dk = saaf_p.get_keff() - fwd.get_keff()
+        dk_pt = Perturbation(lib, mesh_cls, fwd, adj).library_worth(lib_p)
+        ok_(abs(dk_pt/dk-1.0)<0.1, "first-order change")
@@ -0,0 +1,63 @@
+'''
+small problems shared by solver tests
+'''
+import numpy as np
+from scipy import linalg
+import material
+import mesh
+
+_loc = './tests/testData/materials/'
+
+# 4-group fuel and moderator with upscattering into the group below g_thermal
+MATS_4GRPS = [_loc + f for f in ['test_fuel_4grps.xml', 'test_mod_4grps.xml']]
+# 2-group highly scattering fuel
+MATS_SCAT = [_loc + 'test_scat_2grps.xml']
+
+LAYOUT = """ f m
+             m f """
+LAYOUT_DICT = {'f': 'test_fuel', 'm': 'test_mod'}
+
+def problem(**kwargs):
+    '''@brief Function used to build a small problem dictionary on the 4-group
+    materials
+
+    @param kwargs Problem entries replacing the defaults
+    @return Problem dictionary
+    '''
+    prob_dict = {'sn_order': 4, 'do_nda': False, 'do_ua': False,
+                 'mesh_cells': 4, 'groups': 4, 'domain_upper': 4.0,
+                 'materials': MATS_4GRPS, 'layout': LAYOUT,
+                 'layout_dict': LAYOUT_DICT, 'tr_scatt': True}
+    prob_dict.update(kwargs)
+    return prob_dict
+
+def build(prob_dict, refl=True):
+    '''@brief Function used to build material library, material map and mesh of
+    a problem
+
+    @param refl Boolean to set all boundaries reflective, consistently with NDA
+    @return Tuple of material library, material map and mesh
+    '''
+    lib = material.mat_lib(n_grps=prob_dict['groups'], files=prob_dict['materials'],
+                           tr_scatt=prob_dict['tr_scatt'])
+    mat_map = material.mat_map(lib=lib, layout=prob_dict['layout'],
+                               layout_dict=prob_dict['layout_dict'],
+                               x_max=prob_dict['domain_upper'],
+                               n=prob_dict['mesh_cells'])
+    mesh_cls = mesh.Mesh(prob_dict['mesh_cells'], prob_dict['domain_upper'], mat_map)
+    if refl:
+        for cell in mesh_cls.cells():
+            for bd in cell.bounds().keys():
+                cell.bounds(bd, 'refl')
+    return lib,mat_map,mesh_cls
+
+def reference_keff(nda_cls):
+    '''@brief Function used to compute keff of assembled NDA matrices with a
+    dense generalized eigenvalue solve
+
+    @param nda_cls NDA instance with assembled bilinear forms
+    @return keff
+    '''
+    loss,fiss = nda_cls.block_matrices()
+    ks = linalg.eigvals(fiss.toarray(), loss.toarray())
+    return max(ks[np.isfinite(ks)].real)
@@ -0,0 +1,66 @@
+from nose.tools import *
+from result_cache import ResultCache, problem_keys
+import numpy as np
+import os
+import shutil
+import tempfile
+
+class TestResultCache:
+    # Tests to verify problem hashing and cached result storage
+
+    def setup(self):
+        self.dir = tempfile.mkdtemp()
+        self.mat = os.path.join(self.dir, 'mat.xml')
+        with open(self.mat, 'w') as f:
+            f.write('<material/>')
+        self.problem = {'layout':' 1 2\n 2 1 ', 'layout_dict':{'1':'a', '2':'b'},
+                        'materials':[self.mat], 'groups':2, 'domain_upper':10,
+                        'sn_order':4, 'mesh_cells':4, 'n_workers':2}
+        self.cache = ResultCache(os.path.join(self.dir, 'cache'))
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def test_canonical_keys(self):
+        """ Key ignores layout whitespace and non-physical options """
+        other = dict(self.problem, layout='1 2 2 1', n_workers=8)
+        eq_(problem_keys(self.problem), problem_keys(other))
+
+    def test_keys_change(self):
+        physics,full = problem_keys(self.problem)
+        finer = problem_keys(dict(self.problem, mesh_cells=8))
+        eq_(finer[0], physics, "same physics on another mesh")
+        ok_(finer[1]!=full, "different problem")
+        with open(self.mat, 'w') as f:
+            f.write('<material id="changed"/>')
+        ok_(problem_keys(self.problem)[0]!=physics, "material contents are hashed")
+
+    def test_get_put(self):
+        ok_(self.cache.get(self.problem) is None, "empty cache")
+        self.cache.put(self.problem, {'keff':1.2, 'sflxes':np.ones((2,25))})
+        result = self.cache.get(self.problem)
+        eq_(float(result['keff']), 1.2)
+        assert_true(np.allclose(result['sflxes'], 1.0))
+
+    def test_partial(self):
+        self.cache.put(self.problem, {'keff':1.2})
+        ok_(self.cache.get(dict(self.problem, sn_order=8)) is None, "no full hit")
+        eq_(float(self.cache.get_partial(dict(self.problem, sn_order=8))['keff']), 1.2)
+        ok_(self.cache.get_partial(dict(self.problem, groups=3)) is None,
+            "different physics")
+
+    def test_eviction(self):
+        """ Least recently used results are evicted beyond size limit """
+        result = {'sflxes':np.random.rand(100)}
+        problems = [dict(self.problem, mesh_cells=n) for n in [4, 8, 12]]
+        self.cache.put(problems[0], result)
+        size = os.path.getsize(self.cache._filename(*problem_keys(problems[0])))
+        cache = ResultCache(self.cache._dir, max_bytes=2*size+size/2)
+        cache.put(problems[1], result)
+        # make problems[0] the most recently used
+        os.utime(cache._filename(*problem_keys(problems[1])), (0, 0))
+        cache.get(problems[0])
+        cache.put(problems[2], result)
+        ok_(cache.get(problems[0]) is not None, "recently used kept")
+        ok_(cache.get(problems[1]) is None, "least recently used evicted")
+        ok_(cache.get(problems[2]) is not None, "latest kept")
@@ -0,0 +1,66 @@
+from nose.tools import *
+from rom import pod_basis, ROM
+import problems
+import numpy as np
+
+class TestROM:
+    # Tests to verify reduced-order basis construction
+
+    def setup(self):
+        x = np.linspace(0., 1., 50)
+        self.modes = [np.sin(np.pi*x), np.sin(2*np.pi*x)]
+        self.snapshots = [self.modes[0], self.modes[0]+0.5*self.modes[1],
+                          3.0*self.modes[1], self.modes[0]-self.modes[1]]
+
+    def test_pod_rank(self):
+        """ Basis spans snapshots with the rank of the snapshot space """
+        basis = pod_basis(self.snapshots)
+        eq_(basis.shape, (50,2))
+        ok_(np.allclose(basis.T.dot(basis), np.eye(2)))
+        for s in self.snapshots:
+            ok_(np.allclose(basis.dot(basis.T.dot(s)), s))
+
+    def test_pod_truncation(self):
+        """ Small contributions are discarded with loose tolerance """
+        snapshots = [self.modes[0], self.modes[0]+1.0e-4*self.modes[1]]
+        eq_(pod_basis(snapshots, pod_tol=1.0e-4).shape, (50,1))
+
+class TestROMQuery:
+    # Tests to verify reduced-order queries and their fallback to full solves
+
+    def setup(self):
+        # corner pin cell is swapped by variants
+        self.problem = problems.problem(do_nda=True, layout=" f m / m c ",
+                                        layout_dict={'f':'test_fuel', 'm':'test_mod',
+                                                     'c':'test_mod'})
+        self.lib = problems.build(self.problem)[0]
+        self.variants = [{'c':'test_mod'}, {'c':'test_fuel'}]
+
+    def rom(self, **kwargs):
+        '''ROM trained on both variants'''
+        rom = ROM(self.lib, dict(self.problem, **kwargs))
+        rom.train(self.variants)
+        return rom
+
+    def test_query(self):
+        """ Queries of trained variants are answered by the reduced model """
+        full = self.rom(rom_tol=0.0).query(self.variants[1])
+        ok_(full['full_solve'], "zero tolerance falls back to a full solve")
+        result = self.rom().query(self.variants[1])
+        ok_(not result['full_solve'], "reduced solution")
+        ok_(result['residual']<1.0e-3, "residual")
+        assert_almost_equal(result['keff']/full['keff'], 1.0, places=4)
+        for g in xrange(self.problem['groups']):
+            assert_true(np.allclose(result['sflxes'][g], full['sflxes'][g], rtol=1.0e-3))
+
+    def test_query_nan(self):
+        """ Degenerate reduced solutions fall back to full solves """
+        rom = self.rom()
+        keff = rom.query(self.variants[1])['keff']
+        # zero basis gives NaN eigenvalues of the projected operators
+        rom._basis = np.zeros_like(rom._basis)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = rom.query(self.variants[1])
+        ok_(np.isnan(result['residual']), "NaN residual")
+        ok_(result['full_solve'], "full solve")
+        assert_almost_equal(result['keff']/keff, 1.0, places=4)
@@ -0,0 +1,108 @@
+from nose.tools import *
+from saaf import SAAF
+from eigen_iterations import Eigen
+import problems
+import numpy as np
+
+class TestSAAF:
+    # Tests to verify SAAF solves on small problems
+
+    def setup(self):
+        # infinite medium of the highly scattering material
+        self.problem = problems.problem(groups=2, materials=problems.MATS_SCAT,
+                                        layout='f', layout_dict={'f':'test_scat'},
+                                        mesh_cells=2)
+        self.lib = problems.build(self.problem)[0]
+        sigt,sigs = self.lib.get('sig_t','test_scat'),self.lib.get('sig_s','test_scat')
+        self.loss = np.diag(sigt) - sigs
+        self.fiss = self.lib.get('chi_nu_sig_f','test_scat')
+
+    def solve_groups(self, refl=True, **kwargs):
+        '''Solve all groups once with fission source of unit fluxes'''
+        prob_dict = dict(self.problem, **kwargs)
+        saaf = SAAF(self.lib, problems.build(prob_dict, refl=refl)[2], prob_dict)
+        saaf.assemble_bilinear_forms()
+        saaf.assemble_fixed_linear_forms(
+        sflxes_prev={g:np.ones(saaf.n_dof()) for g in xrange(2)})
+        for g in xrange(2):
+            saaf.solve_in_group(g)
+        return saaf
+
+    def test_infinite_medium(self):
+        """ Group solves with reflective boundaries give infinite medium fluxes """
+        sflxes = np.linalg.solve(self.loss, self.fiss.dot(np.ones(2)))
+        for kwargs in [{}, {'do_dsa':True}]:
+            saaf = self.solve_groups(**kwargs)
+            for g in xrange(2):
+                assert_true(np.allclose(saaf.get_sflxes(g), sflxes[g], rtol=1.0e-4))
+
+    def test_dsa_sweeps(self):
+        """ DSA reduces source iterations of highly scattering problems """
+        for refl in [True, False]:
+            si = self.solve_groups(refl=refl)
+            dsa = self.solve_groups(refl=refl, do_dsa=True)
+            ok_(dsa.n_sweeps()*5<si.n_sweeps(), "DSA sweeps")
+            for g in xrange(2):
+                assert_true(np.allclose(dsa.get_sflxes(g), si.get_sflxes(g), rtol=1.0e-4))
+
+    def test_vacuum_symmetry(self):
+        """ Fluxes with vacuum boundaries are symmetric on a symmetric mesh """
+        prob_dict = dict(self.problem, mesh_cells=4)
+        saaf = SAAF(self.lib, problems.build(prob_dict, refl=False)[2], prob_dict)
+        saaf.assemble_bilinear_forms()
+        saaf.assemble_fixed_linear_forms(sflxes_prev={g:np.ones(25) for g in xrange(2)})
+        saaf.solve_in_group(0)
+        sflx = saaf.get_sflxes(0).reshape(5,5)
+        assert_true(np.allclose(sflx, sflx.T))
+        assert_true(np.allclose(sflx, sflx[::-1,::-1]))
+        ok_(sflx[0,0]<sflx[2,2], "leakage at boundaries")
+
+    def test_kinf(self):
+        """ Eigenvalue of infinite medium """
+        kinf = max(abs(np.linalg.eigvals(np.linalg.solve(self.loss, self.fiss))))
+        prob_dict = dict(self.problem, do_dsa=True)
+        saaf = SAAF(self.lib, problems.build(prob_dict)[2], prob_dict)
+        Eigen(prob_dict).do_iterations(ho_cls=saaf)
+        assert_almost_equal(saaf.get_keff(), kinf, places=5)
+
+    def test_amg_sweeps(self):
+        """ Angular multigrid reduces source iterations of highly scattering problems """
+        for refl in [True, False]:
+            si = self.solve_groups(refl=refl)
+            amg = self.solve_groups(refl=refl, do_amg=True)
+            ok_(amg.n_sweeps()*5<si.n_sweeps(), "AMG sweeps")
+            for g in xrange(2):
+                assert_true(np.allclose(amg.get_sflxes(g), si.get_sflxes(g), rtol=1.0e-4))
+
+    def test_inexact(self):
+        """ Inexact source iteration tolerances give infinite medium eigenvalue """
+        kinf = max(abs(np.linalg.eigvals(np.linalg.solve(self.loss, self.fiss))))
+        prob_dict = dict(self.problem, do_dsa=True, inexact=True)
+        saaf = SAAF(self.lib, problems.build(prob_dict)[2], prob_dict)
+        Eigen(prob_dict).do_iterations(ho_cls=saaf)
+        assert_almost_equal(saaf.get_keff(), kinf, places=5)
+
+    def test_sn_orders(self):
+        """ Group-dependent Sn orders are consistent with uniform orders """
+        keffs = {}
+        for kwargs in [{'sn_order':2}, {'sn_order':2, 'sn_orders':[2,2,2,2]},
+                       {'sn_order':4}, {'sn_order':4, 'sn_orders':[4,4,2,2]}]:
+            prob_dict = problems.problem(mesh_cells=2, do_dsa=True, **kwargs)
+            lib,_,mesh_cls = problems.build(prob_dict, refl=False)
+            saaf = SAAF(lib, mesh_cls, prob_dict)
+            Eigen(prob_dict).do_iterations(saaf)
+            keffs[str(kwargs.get('sn_orders', kwargs['sn_order']))] = saaf.get_keff()
+        assert_almost_equal(keffs['[2, 2, 2, 2]']/keffs['2'], 1.0, places=6)
+        ok_(keffs['2']<keffs['[4, 4, 2, 2]']<keffs['4'], "mixed orders between S2 and S4")
+
+    def test_ua_sweeps(self):
+        """ Upscattering acceleration reduces sweeps, also with vacuum boundaries """
+        for refl in [True, False]:
+            saafs = {}
+            for do_ua in [False, True]:
+                prob_dict = problems.problem(sn_order=2, do_ua=do_ua)
+                lib,_,mesh_cls = problems.build(prob_dict, refl=refl)
+                saafs[do_ua] = SAAF(lib, mesh_cls, prob_dict)
+                Eigen(prob_dict).do_iterations(saafs[do_ua])
+            ok_(saafs[True].n_sweeps()<saafs[False].n_sweeps(), "UA sweeps")
+            assert_almost_equal(saafs[True].get_keff()/saafs[False].get_keff(), 1.0, places=5)
@@ -0,0 +1,93 @@
+from nose.tools import *
+from sequencing import mesh_hierarchy, sn_hierarchy, prolong, p1_aflx, solve_sequence, \
+    restore
+from checkpoint import snapshot
+from aq import AQ
+from saaf import SAAF
+from nda import NDA
+from eigen_iterations import Eigen
+import problems
+import numpy as np
+
+class TestSequencing:
+    # Tests to verify hierarchies and transfers between sequencing levels
+
+    def test_hierarchy(self):
+        eq_(mesh_hierarchy(68, 17, 3), [17, 34, 68], "halved levels")
+        eq_(mesh_hierarchy(68, 17, 2), [34, 68], "limited levels")
+        eq_(mesh_hierarchy(34, 17, 5), [17, 34], "layout limits levels")
+        eq_(mesh_hierarchy(17, 17, 3), [17], "single level")
+
+    @raises(AssertionError)
+    def test_hierarchy_bad_mesh(self):
+        mesh_hierarchy(30, 17, 2)
+
+    def test_prolong_bilinear(self):
+        """ Bilinear functions are reproduced exactly """
+        f = lambda x,y: 1.0 + 2.0*x - 3.0*y + 0.5*x*y
+        def nodal(n):
+            pts = np.linspace(0., 1., n+1)
+            # rows are y, columns are x
+            return np.array([f(x,y) for y in pts for x in pts])
+        assert_true(np.allclose(prolong(nodal(3), 3, 6), nodal(6)))
+        assert_true(np.allclose(prolong(nodal(2), 2, 5), nodal(5)))
+
+    def test_prolong_identity(self):
+        vals = np.random.rand(25)
+        assert_true(np.allclose(prolong(vals, 4, 4), vals))
+
+    def test_sn_hierarchy(self):
+        eq_(sn_hierarchy(8, 3), [2, 4, 8], "halved orders")
+        eq_(sn_hierarchy(6, 5), [2, 4, 6], "even orders")
+        eq_(sn_hierarchy(16, 2), [8, 16], "limited levels")
+        eq_(sn_hierarchy(2, 3), [2], "lowest order")
+
+    def test_p1_moments(self):
+        """ Rebuilt angular fluxes preserve scalar flux and current """
+        sflx,cur = np.array([2.0, 1.0]),(np.array([0.1, -0.2]), np.array([0.3, 0.0]))
+        for sn in [2, 4, 6]:
+            aq = AQ(sn).get_aq_data()
+            aflxes = [p1_aflx(sflx, cur, aq['omega'][d]) for d in xrange(aq['n_dir'])]
+            assert_true(np.allclose(sum(aq['wt'][d]*aflxes[d] for d in xrange(aq['n_dir'])),
+                                    sflx))
+            for i in xrange(2):
+                assert_true(np.allclose(sum(aq['wt'][d]*aq['omega'][d][i]*aflxes[d]
+                                            for d in xrange(aq['n_dir'])), cur[i]))
+
+    def solve(self, prob_dict, **kwargs):
+        """Solve sequenced and direct SAAF eigenvalue problems with vacuum
+        boundaries and return both keffs"""
+        lib,_,mesh_cls = problems.build(prob_dict, refl=False)
+        saaf = SAAF(lib, mesh_cls, prob_dict)
+        Eigen(prob_dict).do_iterations(saaf)
+        return solve_sequence(prob_dict, lib, **kwargs)[0].get_keff(),saaf.get_keff()
+
+    def test_mesh_sequence(self):
+        """ Mesh sequencing gives keff of a direct solve """
+        prob_dict = problems.problem(mesh_cells=4, sn_order=2, do_dsa=True)
+        keff_seq,keff = self.solve(prob_dict, n_levels=2)
+        assert_almost_equal(keff_seq/keff, 1.0, places=5)
+
+    def test_sn_sequence(self):
+        """ Sn order sequencing gives keff of a direct solve """
+        prob_dict = problems.problem(mesh_cells=2, sn_order=4, do_dsa=True)
+        keff_seq,keff = self.solve(prob_dict, sn_levels=2)
+        assert_almost_equal(keff_seq/keff, 1.0, places=5)
+
+    def test_restore_nda(self):
+        """ NDA snapshots restore scalar fluxes with isotropic angular fluxes """
+        prob_dict = problems.problem(mesh_cells=2, sn_order=2)
+        lib,_,mesh_cls = problems.build(prob_dict)
+        nda = NDA(lib, mesh_cls, prob_dict)
+        nda.assemble_bilinear_forms(correction=False)
+        Eigen(prob_dict).eigen_iterations(nda)
+        prob_dict['mesh_cells'] = 4
+        lib,_,mesh_cls = problems.build(prob_dict)
+        saaf = SAAF(lib, mesh_cls, prob_dict)
+        restore(saaf, snapshot(nda), 4)
+        eq_(saaf.get_keff(), nda.get_keff(), "keff")
+        for g in xrange(saaf.n_grp()):
+            sflx = prolong(nda.get_sflxes(g), 2, 4)
+            assert_true(np.allclose(saaf.get_sflxes(g), sflx))
+            for aflx in saaf.get_group_state(g)['aflxes'].values():
+                assert_true(np.allclose(aflx, sflx/(4.0*np.pi)))
@@ -0,0 +1,30 @@
+from nose.tools import *
+from solver import solve, run
+import problems
+import numpy as np
+import shutil
+import tempfile
+
+class TestSolver:
+    # Tests to verify problems are solved and cached results are retrieved
+
+    def setup(self):
+        self.dir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.dir)
+
+    def test_cached_holo(self):
+        """ Cached HOLO results keep NDA keff and the types of a fresh solve """
+        prob_dict = problems.problem(mesh_cells=2, sn_order=2, do_nda=True)
+        lib = problems.build(prob_dict)[0]
+        keff = solve(prob_dict, lib)['keff']
+        ok_(abs(keff-1.0)>1e-3, "keff is solved")
+        prob_dict['cache_dir'] = self.dir
+        result = run(prob_dict, lib)
+        eq_(result['keff'], keff, "keff of HOLO calculation")
+        cached = run(prob_dict, lib)
+        eq_(sorted(cached.keys()), sorted(result.keys()))
+        for k,v in result.items():
+            eq_(type(cached[k]), type(v), k)
+            assert_true(np.allclose(cached[k], v))
@@ -0,0 +1,43 @@
+from nose.tools import *
+from sweep import merge, sweep
+from StringIO import StringIO
+import problems
+import json
+
+class TestSweep:
+    # Tests to verify overrides of a base problem
+
+    def setup(self):
+        self.base = {'layout':'1 2\n2 1', 'layout_dict':{'1':'uo2', '2':'gt'},
+                     'sn_order':4, 'mesh_cells':4, 'mg_mode':'gauss_seidel',
+                     'checkpoint_file':'ckpt.npz'}
+
+    def test_layout_dict_update(self):
+        """ Override of layout_dict swaps single materials """
+        problem = merge(self.base, {'layout_dict':{'2':'cr'}, 'sn_order':8})
+        eq_(problem['layout_dict'], {'1':'uo2', '2':'cr'})
+        eq_(problem['sn_order'], 8)
+        eq_(self.base['layout_dict']['2'], 'gt')
+
+    def test_per_run_keys(self):
+        """ Cases do not share checkpoint files nor pools of jacobi workers """
+        problem = merge(dict(self.base, mg_mode='jacobi'), {})
+        ok_('checkpoint_file' not in problem)
+        eq_(problem['mg_mode'], 'gauss_seidel')
+
+    def test_sweep(self):
+        """ Cases are solved like run.py solves them and written as JSON lines """
+        # asymmetric layout such that the fission source shape is iterated
+        base = problems.problem(mesh_cells=4, sn_order=2, do_dsa=True,
+                                layout=" f m / f f ", domain_upper=8.0)
+        overrides = [{}, {'do_cmfd':True}]
+        out = StringIO()
+        results = sweep(base, overrides, n_workers=2, out=out)
+        lines = [json.loads(line) for line in out.getvalue().splitlines()]
+        eq_(sorted(line['case'] for line in lines), [0, 1])
+        for line in lines:
+            ok_('error' not in line, line.get('error'))
+            eq_(line['override'], overrides[line['case']])
+            eq_(line, results[line['case']])
+        assert_almost_equal(results[1]['keff']/results[0]['keff'], 1.0, places=5)
+        ok_(results[1]['iterations']<results[0]['iterations'], "CMFD outer iterations")